@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Relation item count and index-based access through insertions
+    and removals (see ttslab.hrg)...
+
+    Run from the repository root with:
+
+        python -m unittest discover tests
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import random
+import unittest
+try:
+    import cPickle as pickle #Py2
+except ImportError:
+    import pickle
+
+import ttslab.hrg as hrg
+
+def walk(relation):
+    items = []
+    item = relation.head_item
+    while item is not None:
+        items.append(item)
+        item = item.next_item
+    return items
+
+
+class TestRelation(unittest.TestCase):
+
+    def assertConsistent(self, relation):
+        items = walk(relation)
+        self.assertEqual(len(relation), len(items))
+        self.assertEqual(list(relation), items)
+        for i in range(len(items)):
+            self.assertIs(relation[i], items[i])
+            self.assertIs(relation[i - len(items)], items[i])
+        self.assertEqual(relation[1:len(items) // 2], items[1:len(items) // 2])
+        self.assertEqual(relation[::-1], items[::-1])
+        self.assertRaises(IndexError, lambda: relation[len(items)])
+
+    def test_empty(self):
+        relation = hrg.Utterance().new_relation("A")
+        self.assertEqual(len(relation), 0)
+        self.assertRaises(IndexError, lambda: relation[0])
+        self.assertEqual(relation[:], [])
+
+    def test_append_prepend(self):
+        relation = hrg.Utterance().new_relation("A")
+        first = relation.append_item()
+        last = first.append_item()
+        middle = last.prepend_item()
+        head = first.prepend_item()
+        self.assertConsistent(relation)
+        self.assertEqual(relation[:], [head, first, middle, last])
+
+    def test_remove(self):
+        relation = hrg.Utterance().new_relation("A")
+        items = [relation.append_item() for i in range(5)]
+        self.assertConsistent(relation)
+        items[2].remove()
+        self.assertConsistent(relation)
+        items[0].remove()
+        items[4].remove()
+        self.assertConsistent(relation)
+        self.assertEqual(relation[:], [items[1], items[3]])
+
+    def test_daughters(self):
+        utt = hrg.Utterance()
+        relation = utt.new_relation("A")
+        parent = relation.append_item()
+        daughters = [parent.add_daughter() for i in range(3)]
+        daughters[1].append_item()
+        self.assertConsistent(relation)
+        self.assertEqual(len(relation), 1)
+        daughters[0].remove()
+        parent.remove()
+        self.assertConsistent(relation)
+        self.assertEqual(len(relation), 0)
+
+    def test_shared_items(self):
+        utt = hrg.Utterance()
+        rel_a = utt.new_relation("A")
+        rel_b = utt.new_relation("B")
+        items = [rel_a.append_item() for i in range(4)]
+        for item in items[1:]:
+            rel_b.append_item(item)
+        self.assertConsistent(rel_b)
+        items[2].remove_content()
+        self.assertConsistent(rel_a)
+        self.assertConsistent(rel_b)
+        self.assertEqual(len(rel_a), 3)
+        self.assertEqual(len(rel_b), 2)
+
+    def test_random_edits(self):
+        for seed in range(5):
+            rng = random.Random(seed)
+            utt = hrg.Utterance()
+            rel_a = utt.new_relation("A")
+            rel_b = utt.new_relation("B")
+            for i in range(500):
+                op = rng.randint(0, 6)
+                items = list(rel_a)
+                if op == 0 or not items:
+                    rel_a.append_item()
+                elif op == 1:
+                    rng.choice(items).append_item()
+                elif op == 2:
+                    rng.choice(items).prepend_item()
+                elif op == 3:
+                    daughter = rng.choice(items).add_daughter()
+                    if rng.random() < 0.5:
+                        daughter.append_item()
+                    else:
+                        daughter.prepend_item()
+                elif op == 4:
+                    item = rng.choice(items)
+                    if item.get_item_in_relation("B") is None:
+                        rel_b.append_item(item)
+                elif op == 5:
+                    item = rng.choice(items)
+                    daughters = item.get_daughters()
+                    if daughters and rng.random() < 0.5:
+                        rng.choice(daughters).remove()
+                    else:
+                        item.remove()
+                else:
+                    rng.choice(items).remove_content()
+                if i % 10 == 0:
+                    rel_a[len(rel_a) // 2:] #index built, then invalidated by the next edit
+                self.assertConsistent(rel_a)
+                self.assertConsistent(rel_b)
+            for relation in pickle.loads(pickle.dumps(utt, protocol=2)).relations.values():
+                self.assertConsistent(relation)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Columnar HTS labels (see ttslab.synthesizers.hts_labels_columnar)
+    against the item-wise label functions for all label variants, on
+    synthetic utterances...
+
+    Run from the repository root with:
+
+        python -m unittest discover tests
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import random
+import unittest
+
+import ttslab.hrg as hrg
+import ttslab.synthesizers.hts
+from ttslab.synthesizers import hts_labels_columnar
+
+CONSONANTS = ["p", "t", "k", "b", "d", "g", "m", "n", "s", "f", "l", "r"]
+VOWELS = ["a", "e", "i", "o", "u"]
+SILPHONE = "pau"
+PHONES = dict([(ph, set(["consonant"])) for ph in CONSONANTS] +
+              [(ph, set(["vowel"])) for ph in VOWELS] +
+              [(SILPHONE, set(["pause"]))])
+PHONEMAP = dict((ph, ph) for ph in PHONES)
+
+class Voice(object):
+    """ Just the attributes used by label functions...
+    """
+    phones = PHONES
+    phonemap = PHONEMAP
+
+def make_utterance(nwords, phraselen, seed):
+    """ Utterance with the relations created by DefaultVoice up to
+        "text-to-segments" (optional features left out at random)...
+    """
+    rng = random.Random(seed)
+    utt = hrg.Utterance()
+    word_rel = utt.new_relation("Word")
+    syl_rel = utt.new_relation("Syllable")
+    sylstruct_rel = utt.new_relation("SylStructure")
+    seg_rel = utt.new_relation("Segment")
+    phrase_rel = utt.new_relation("Phrase")
+    for i in range(nwords):
+        if i % phraselen == 0:
+            phrase_item = phrase_rel.append_item()
+            phrase_item["name"] = "BB"
+            if rng.random() < 0.5:
+                phrase_item["tobi"] = rng.choice(["L-L%", "H-H%"])
+        word_item = word_rel.append_item()
+        word_item["name"] = "word%s" % i
+        word_item["gpos"] = rng.choice(["c", "nc"])
+        word_item["prom"] = rng.choice(["0", "1"])
+        phrase_item.add_daughter(word_item)
+        word_item_in_sylstruct = sylstruct_rel.append_item(word_item)
+        for j in range(rng.randint(1, 4)):
+            syl_item = syl_rel.append_item()
+            syl_item["name"] = "syl"
+            syl_item["tone"] = rng.choice(["0", "1"])
+            syl_item["stress"] = rng.choice(["0", "1"])
+            if rng.random() < 0.3:
+                syl_item["accent"] = "1"
+            syl_item_in_sylstruct = word_item_in_sylstruct.add_daughter(syl_item)
+            for phone in [rng.choice(CONSONANTS), rng.choice(VOWELS)][:rng.randint(1, 2)]:
+                seg_item = seg_rel.append_item()
+                seg_item["name"] = phone
+                syl_item_in_sylstruct.add_daughter(seg_item)
+    #pauses as in phrasify_segments:
+    seg_rel.head_item.prepend_item()["name"] = SILPHONE
+    for phrase_item in phrase_rel:
+        last_seg = phrase_item.last_daughter.get_item_in_relation("SylStructure").last_daughter.last_daughter.get_item_in_relation("Segment")
+        last_seg.append_item()["name"] = SILPHONE
+    return utt
+
+UTTERANCES = [(1, 1, 1), (2, 1, 2), (3, 8, 3), (40, 5, 4), (120, 8, 5)] #(nwords, phraselen, seed)
+
+
+class TestColumnarLabels(unittest.TestCase):
+
+    def test_variants(self):
+        for variant in sorted(hts_labels_columnar.VARIANTS):
+            for args in UTTERANCES:
+                utt = make_utterance(*args)
+                self.assertEqual(hts_labels_columnar.columnar_labels(utt, PHONES, PHONEMAP, variant),
+                                 hts_labels_columnar.itemwise_labels(utt, PHONES, PHONEMAP, variant),
+                                 "%s %s" % (variant, args))
+
+    def test_synthesizer_feats(self):
+        synth = ttslab.synthesizers.hts.Synthesizer()
+        for args in UTTERANCES:
+            utt = make_utterance(*args)
+            synth.COLUMNAR_LABELS = False
+            itemwise = synth.feats(Voice(), utt, None)["hts_label"]
+            synth.COLUMNAR_LABELS = True
+            self.assertEqual(synth.feats(Voice(), utt, None)["hts_label"], itemwise)
+
+
+if __name__ == "__main__":
+    unittest.main()
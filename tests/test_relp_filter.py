@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" RELP synthesis filters (see
+    ttslab.synthesizers.unitselection.SYNTH_FILTERS) against the
+    pure-Python reference (relp_purepython.synth_filter_float)...
+
+    Run from the repository root with:
+
+        python -m unittest discover tests
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import unittest
+
+import numpy as np
+
+from ttslab.synthesizers.unitselection import SYNTH_FILTERS, SAMPLERATE
+from ttslab.synthesizers.relp_purepython import synth_filter_float
+
+ORDER = 16
+
+def stepup(reflcoefs):
+    """ Prediction polynomial (1, a1, ... ap) from reflection
+        coefficients...
+    """
+    a = np.array([1.0])
+    for k in reflcoefs:
+        a = np.concatenate((a, [0.0]))
+        a = a + k * a[::-1]
+    return a
+
+def make_lpcs(nframes, rng, order=ORDER):
+    """ Stable LPC frames as stored in "lpc-coefs" (values[:,1:] are
+        the predictor coefficients)...
+    """
+    reflcoefs = rng.uniform(-0.7, 0.7, order)
+    lpcs = []
+    for i in range(nframes):
+        reflcoefs = np.clip(reflcoefs + rng.uniform(-0.03, 0.03, order), -0.9, 0.9)
+        lpcs.append(np.concatenate(([1.0], -stepup(reflcoefs)[1:])))
+    return np.array(lpcs)
+
+
+class TestSynthFilters(unittest.TestCase):
+
+    def assertSameOutput(self, times, lpcs, residual):
+        reference = synth_filter_float(times, lpcs, residual, SAMPLERATE)
+        for name in sorted(SYNTH_FILTERS):
+            samples = SYNTH_FILTERS[name](times, lpcs, residual, SAMPLERATE)
+            self.assertEqual(len(samples), len(residual), name)
+            np.testing.assert_allclose(samples, reference, rtol=1e-9, atol=1e-6, err_msg=name)
+            self.assertTrue(np.array_equal(samples.astype(np.int16), reference.astype(np.int16)), name)
+
+    def test_frames(self):
+        rng = np.random.RandomState(1)
+        times = np.cumsum(rng.uniform(0.004, 0.01, 50))
+        residual = rng.randn(int(times[-1] * SAMPLERATE)) * 20.0
+        self.assertSameOutput(times, make_lpcs(len(times), rng), residual)
+
+    def test_single_frame(self):
+        rng = np.random.RandomState(2)
+        residual = rng.randn(400) * 20.0
+        self.assertSameOutput(np.array([0.01]), make_lpcs(1, rng), residual)
+
+    def test_frames_after_residual(self):
+        rng = np.random.RandomState(3)
+        times = np.cumsum(rng.uniform(0.004, 0.01, 20))
+        residual = rng.randn(int(times[len(times) // 2] * SAMPLERATE)) * 20.0 #later frames filter nothing
+        self.assertSameOutput(times, make_lpcs(len(times), rng), residual)
+
+    def test_short_spans(self):
+        rng = np.random.RandomState(4)
+        times = np.cumsum(rng.randint(1, ORDER, 40)) / SAMPLERATE #spans shorter than the filter order
+        residual = rng.randn(int(times[-1] * SAMPLERATE) + 10) * 20.0
+        self.assertSameOutput(times, make_lpcs(len(times), rng), residual)
+
+    def test_short_residual(self):
+        rng = np.random.RandomState(5)
+        times = np.array([0.0005, 0.001, 0.002])
+        for nsamples in [0, 1, ORDER - 1]:
+            self.assertSameOutput(times, make_lpcs(len(times), rng), rng.randn(nsamples) * 20.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
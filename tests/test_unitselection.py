@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Vectorized unit selection and concatenation (see
+    ttslab.synthesizers.unitselection) against the reference
+    implementations on a small synthetic halfphone catalogue...
+
+    Run from the repository root with:
+
+        python -m unittest discover tests
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import unittest
+
+import numpy as np
+
+import ttslab.synthesizers.unitselection as unitselection
+from ttslab.hrg import Utterance
+from ttslab.trackfile import Track
+
+from test_relp_filter import make_lpcs
+
+PHONES = ["pau", "a", "b", "i", "k", "s"]
+POSITIONS = ["initial", "medial", "final", None]
+NJOINCOEFS = 13
+
+def make_candidate(rng):
+    track = Track()
+    track.times = np.cumsum(rng.uniform(0.004, 0.01, rng.randint(1, 8)))
+    track.values = make_lpcs(len(track.times), rng)
+    residual = rng.randn(int(round(track.times[-1] * unitselection.SAMPLERATE)) + rng.randint(0, 80)) * 20.0
+    return {"left-joincoef": rng.randn(NJOINCOEFS),
+            "right-joincoef": rng.randn(NJOINCOEFS),
+            "num_syls": None if rng.rand() < 0.1 else int(rng.randint(1, 5)),
+            "position_in_syl": POSITIONS[rng.randint(len(POSITIONS))],
+            "position_in_word": POSITIONS[rng.randint(len(POSITIONS))],
+            "position_in_phrase": POSITIONS[rng.randint(len(POSITIONS))],
+            "context_nextsegment": PHONES[rng.randint(len(PHONES))],
+            "context_prevsegment": PHONES[rng.randint(len(PHONES))],
+            "lpc-coefs": track,
+            "residuals": residual.astype(np.int16)}
+
+def make_catalogue(ncands, rng):
+    return dict(("%s-%s" % (half, phone), [make_candidate(rng) for i in range(rng.randint(1, ncands + 1))])
+                for phone in PHONES for half in ["left", "right"])
+
+def make_utterance(nsegs, rng):
+    """ Utterance with target units (as added by Synthesizer.feats)...
+    """
+    utt = Utterance()
+    unit_rel = utt.new_relation("Unit")
+    phones = ["pau"] + [PHONES[rng.randint(1, len(PHONES))] for i in range(nsegs)] + ["pau"]
+    for i, phone in enumerate(phones):
+        for half in ["left", "right"]:
+            if (i == 0 and half == "left") or (i == len(phones) - 1 and half == "right"):
+                continue
+            unit_item = unit_rel.append_item()
+            unit_item["name"] = "%s-%s" % (half, phone)
+            unit_item["num_syls"] = None if rng.rand() < 0.1 else int(rng.randint(1, 5))
+            for featname in ["position_in_syl", "position_in_word", "position_in_phrase"]:
+                unit_item[featname] = POSITIONS[rng.randint(len(POSITIONS))]
+            unit_item["context_nextsegment"] = phones[i + 1] if i + 1 < len(phones) else None
+            unit_item["context_prevsegment"] = phones[i - 1] if i > 0 else None
+    return utt
+
+def selected(utt):
+    return [(id(u["selected_unit"]["candidate"]), u["selected_unit"]["prevcandidate"], u["selected_unit"]["total_score"])
+            for u in utt.get_relation("Unit")]
+
+
+class TestUnitSelection(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.synth = unitselection.Synthesizer()
+        self.synth.unitcatalogue = make_catalogue(30, rng)
+        self.synth._index_catalogue()
+        self.utts = [make_utterance(nsegs, rng) for nsegs in [1, 5, 20]]
+
+    def test_targetscores(self):
+        for utt in self.utts:
+            for unit_item in utt.get_relation("Unit"):
+                cands = self.synth.unitcatalogue[unit_item["name"]]
+                scores = self.synth._targetscores(unit_item, self.synth._candidates(unit_item["name"]))
+                np.testing.assert_allclose(scores, [self.synth._targetscore(unit_item, cand) for cand in cands])
+
+    def test_selectunits(self):
+        for synthparms in [None, {"prunenumcands": 5}, {"prunenumcands": 3, "prunescoredelta": 0.005}]:
+            for utt in self.utts:
+                ref = selected(self.synth._selectunits_reference(utt, synthparms))
+                self.assertEqual(selected(self.synth._selectunits(utt, synthparms)), ref)
+
+    def test_preselect_full_width(self):
+        maxcands = max(len(cands) for cands in self.synth.unitcatalogue.values())
+        for utt in self.utts:
+            ref = selected(self.synth._selectunits_reference(utt, None))
+            self.assertEqual(selected(self.synth._selectunits(utt, {"preselectnumcands": maxcands})), ref)
+        self.assertIsNone(self.synth._preselect(np.arange(5.0), 5))
+        self.assertIsNone(self.synth._preselect(np.arange(5.0), None))
+        self.assertEqual(self.synth._preselect(np.array([0.1, 0.5, 0.3, 0.5]), 2).tolist(), [1, 3])
+
+    def test_prune(self):
+        scores = np.array([0.5, 1.0, 0.995, 0.2, 0.999])
+        self.assertEqual(self.synth._prune(scores, 0.01, 100).tolist(), [1, 2, 4])
+        self.assertEqual(self.synth._prune(scores, 0.01, 2).tolist(), [1, 4]) #capped: decreasing score
+        self.assertEqual(self.synth._prune(scores, 1.0, 100).tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(self.synth._prune(np.array([0.995, 1.0, 0.9, 1.0]), 0.01, 2).tolist(), [1, 3]) #ties in order
+        self.assertEqual(self.synth._prune(np.ones(3), 0.0, 2).tolist(), []) #strictly within delta (as the reference)
+
+    def test_concatenation(self):
+        for utt in self.utts:
+            self.synth._selectunits(utt, None)
+            cands = [u["selected_unit"]["candidate"] for u in utt.get_relation("Unit")]
+            for a, b in zip(unitselection.concat_units_reference(cands), unitselection.concat_units(cands)):
+                self.assertTrue(np.array_equal(a, b))
+            self.synth.VECTORIZED = False
+            try:
+                reference = self.synth._concatunits(utt, None)["waveform"].samples
+            finally:
+                self.synth.VECTORIZED = True
+            self.assertTrue(np.array_equal(self.synth._concatunits(utt, None)["waveform"].samples, reference))
+
+    def test_overlap_add(self):
+        times = np.array([0.001, 0.002, 0.0025])
+        lengths = np.array([5, 4, 3])
+        windowed = np.arange(1.0, 13.0)
+        expected = np.zeros(unitselection.round_half_away(times[-1] * unitselection.SAMPLERATE) + 3)
+        for t, frame in zip(times, np.split(windowed, np.cumsum(lengths)[:-1])):
+            start = unitselection.round_half_away(t * unitselection.SAMPLERATE) - len(frame) // 2
+            expected[start:start + len(frame)] += frame
+        self.assertTrue(np.array_equal(unitselection.overlap_add(times, lengths, windowed), expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Compare compiled and linear rewrite rule application (output and
+    speed) on a word list, either for a synthetic ruleset or for
+    rules loaded from files (semicolon format)...
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import sys
+import time
+import codecs
+import random
+import argparse
+
+import ttslab.g2p as g2p
+from ttslab.g2p_rewrites import G2P_Rewrites, G2P_Rewrites_Semicolon, RewriteRule
+
+GRAPHEMES = "abcdefghijklmnopqrstuvwxyz"
+WCHAR = G2P_Rewrites.WHITESPACE_CHAR
+
+def make_g2p(nrules=5000, seed=1234, gnulls=None):
+    """ Random ruleset with contexts of up to 4 graphemes (including
+        the whitespace char) and a default rule for most graphemes...
+    """
+    rng = random.Random(seed)
+    g = G2P_Rewrites()
+    symbols = GRAPHEMES + WCHAR
+    for grapheme in GRAPHEMES[:-1]: #"z" has no default rule
+        g.ruleset[grapheme] = [RewriteRule(grapheme, "", "", grapheme.upper(), 0)]
+    for i in range(nrules):
+        grapheme = rng.choice(GRAPHEMES)
+        lc = "".join(rng.choice(symbols) for j in range(rng.randint(0, 4)))
+        rc = "".join(rng.choice(symbols) for j in range(rng.randint(0, 4)))
+        phoneme = rng.choice(["", grapheme + "1", grapheme + "2", grapheme.upper()])
+        g.ruleset.setdefault(grapheme, []).append(RewriteRule(grapheme, lc, rc, phoneme, len(lc) + len(rc)))
+    if gnulls is not None:
+        g.gnulls = gnulls
+    g.sort_rules()
+    return g
+
+def make_words(nwords=20000, seed=4321):
+    rng = random.Random(seed)
+    alphabet = GRAPHEMES[:-1] * 20 + "z" #occasional GraphemeNotDefined/NoRuleFound
+    return ["".join(rng.choice(alphabet) for j in range(rng.randint(1, 12))) for i in range(nwords)]
+
+def predict_all(func, words):
+    results = []
+    for word in words:
+        try:
+            results.append(func(word))
+        except (g2p.GraphemeNotDefined, g2p.NoRuleFound) as e:
+            results.append((type(e).__name__, unicode(e))) #Py2
+    return results
+
+def compare(g, words):
+    starttime = time.time()
+    ref = predict_all(g.predict_word_linear, words)
+    t_linear = time.time() - starttime
+    g.compile()
+    starttime = time.time()
+    out = predict_all(g.predict_word, words)
+    t_compiled = time.time() - starttime
+    assert ref == out
+    return t_linear, t_compiled
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--rulesfn', metavar='RULESFN', type=str, default=None, help="rules file (semicolon format)")
+    parser.add_argument('--gnullsfn', metavar='GNULLSFN', type=str, default=None, help="gnulls file (semicolon format)")
+    parser.add_argument('--wordsfn', metavar='WORDSFN', type=str, default=None, help="word list (one per line)")
+    parser.add_argument('--nrules', metavar='NRULES', type=int, default=5000, help="size of synthetic ruleset")
+    args = parser.parse_args()
+
+    if args.wordsfn:
+        with codecs.open(args.wordsfn, encoding="utf-8") as infh:
+            words = [line.strip() for line in infh if line.strip()]
+    else:
+        words = make_words()
+
+    if args.rulesfn:
+        g = G2P_Rewrites_Semicolon()
+        g.load_ruleset_semicolon(args.rulesfn)
+        if args.gnullsfn:
+            g.load_gnulls(args.gnullsfn)
+        tests = [("rules from file", g)]
+    else:
+        tests = [("no gnulls", make_g2p(args.nrules)),
+                 ("independent gnulls", make_g2p(args.nrules, gnulls={"uk": "u0k", "ne": "n0e", "ua": "u0a", "i#": "i0#"})),
+                 ("dependent gnulls", make_g2p(args.nrules, gnulls={"ab": "ba", "ba": "c", "a.c": "x"}))]
+
+    print("words: %s" % len(words))
+    for name, g in tests:
+        t_linear, t_compiled = compare(g, words)
+        print("%s (%s rules, single gnull pass: %s): linear %.4fs compiled %.4fs (x%.1f)" %
+              (name, sum(map(len, g.ruleset.values())), g.compiled.gnulls_re is not None,
+               t_linear, t_compiled, t_linear / t_compiled))
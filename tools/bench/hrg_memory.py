@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Memory use and speed of HRG structures for a corpus of synthetic
+    utterances (see labels.make_paragraph)...
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import os
+import gc
+import time
+import argparse
+try:
+    import cPickle as pickle #Py2
+except ImportError:
+    import pickle
+
+from labels import make_paragraph
+
+def rss():
+    """ Current resident set size in bytes (Linux)...
+    """
+    with open("/proc/self/statm") as infh:
+        return int(infh.read().split()[1]) * os.sysconf(str("SC_PAGE_SIZE"))
+
+def iterate(corpus):
+    n = 0
+    for utt in corpus:
+        for relation in utt.relations.values():
+            for item in relation:
+                n += 1
+    return n
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--nutts', metavar='NUTTS', type=int, default=500, help="number of utterances (100 words each)")
+    args = parser.parse_args()
+
+    nutts = args.nutts
+    gc.collect()
+    rss0 = rss()
+    starttime = time.time()
+    corpus = [make_paragraph(100, seed=i) for i in range(nutts)]
+    t_build = time.time() - starttime
+    gc.collect()
+    rss1 = rss()
+    starttime = time.time()
+    nitems = iterate(corpus)
+    t_iter = time.time() - starttime
+    starttime = time.time()
+    data = [pickle.dumps(utt, protocol=2) for utt in corpus]
+    t_dump = time.time() - starttime
+    starttime = time.time()
+    for s in data:
+        pickle.loads(s)
+    t_load = time.time() - starttime
+
+    print("utterances: %s items (top-level): %s" % (nutts, nitems))
+    print("memory: %.1f MB (%.0f bytes per item)" % ((rss1 - rss0) / 2**20, (rss1 - rss0) / nitems))
+    print("build: %.3fs iterate: %.3fs pickle: %.3fs unpickle: %.3fs (%.1f MB)" % (t_build, t_iter, t_dump, t_load,
+                                                                                   sum(map(len, data)) / 2**20))
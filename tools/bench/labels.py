@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Benchmark HTS label generation on a synthetic paragraph (no voice
+    resources needed): HRG traversal against the UtteranceIndex, and
+    item-wise against columnar labels (equivalence is tested in
+    tests/test_hts_labels.py)...
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import time
+import random
+import argparse
+
+import ttslab.hrg as hrg
+
+CONSONANTS = ["p", "t", "k", "b", "d", "g", "m", "n", "s", "f", "l", "r"]
+VOWELS = ["a", "e", "i", "o", "u"]
+SILPHONE = "pau"
+
+class FakeVoice(object):
+    """ Just the attributes used by label functions...
+    """
+    def __init__(self):
+        self.phones = dict([(ph, set(["consonant"])) for ph in CONSONANTS] +
+                           [(ph, set(["vowel"])) for ph in VOWELS] +
+                           [(SILPHONE, set(["pause"]))])
+        self.phonemap = dict((ph, ph) for ph in self.phones)
+
+def make_paragraph(nwords=200, phraselen=8, seed=1234):
+    """ Build an utterance with the relations created by
+        DefaultVoice up to "text-to-segments"...
+    """
+    rng = random.Random(seed)
+    utt = hrg.Utterance()
+    word_rel = utt.new_relation("Word")
+    syl_rel = utt.new_relation("Syllable")
+    sylstruct_rel = utt.new_relation("SylStructure")
+    seg_rel = utt.new_relation("Segment")
+    phrase_rel = utt.new_relation("Phrase")
+    for i in range(nwords):
+        if i % phraselen == 0:
+            phrase_item = phrase_rel.append_item()
+            phrase_item["name"] = "BB"
+            if rng.random() < 0.5:
+                phrase_item["tobi"] = rng.choice(["L-L%", "H-H%"])
+        word_item = word_rel.append_item()
+        word_item["name"] = "word%s" % i
+        word_item["gpos"] = rng.choice(["c", "nc"])
+        word_item["prom"] = rng.choice(["0", "1"])
+        phrase_item.add_daughter(word_item)
+        word_item_in_sylstruct = sylstruct_rel.append_item(word_item)
+        for j in range(rng.randint(1, 4)):
+            syl_item = syl_rel.append_item()
+            syl_item["name"] = "syl"
+            syl_item["tone"] = rng.choice(["0", "1"])
+            syl_item["stress"] = rng.choice(["0", "1"])
+            if rng.random() < 0.3:
+                syl_item["accent"] = "1"
+            syl_item_in_sylstruct = word_item_in_sylstruct.add_daughter(syl_item)
+            for phone in [rng.choice(CONSONANTS), rng.choice(VOWELS)]:
+                seg_item = seg_rel.append_item()
+                seg_item["name"] = phone
+                syl_item_in_sylstruct.add_daughter(seg_item)
+    #pauses as in phrasify_segments:
+    seg_rel.head_item.prepend_item()["name"] = SILPHONE
+    for phrase_item in phrase_rel:
+        last_seg = phrase_item.last_daughter.get_item_in_relation("SylStructure").last_daughter.last_daughter.get_item_in_relation("Segment")
+        last_seg.append_item()["name"] = SILPHONE
+    return utt
+
+class NullIndex(object):
+    """ Index that never answers: forces HRG traversal...
+    """
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+def time_labels(synth, voice, utt, reps):
+    times = []
+    for i in range(reps):
+        starttime = time.time()
+        synth.feats(voice, utt, None)
+        times.append(time.time() - starttime)
+    return min(times), utt["hts_label"]
+
+def time_variant(variant, voice, utt, reps):
+    """ Item-wise vs columnar labels for a label variant...
+    """
+    from ttslab.synthesizers import hts_labels_columnar
+    times = []
+    for func in [hts_labels_columnar.itemwise_labels, hts_labels_columnar.columnar_labels]:
+        t = []
+        for i in range(reps):
+            starttime = time.time()
+            lab = func(utt, voice.phones, voice.phonemap, variant)
+            t.append(time.time() - starttime)
+        times.append((min(t), lab))
+    return times
+
+if __name__ == "__main__":
+    import ttslab.synthesizers.hts
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--nwords', metavar='NWORDS', type=int, default=200, help="words in the paragraph")
+    parser.add_argument('--reps', metavar='REPS', type=int, default=3, help="repetitions (best time reported)")
+    args = parser.parse_args()
+
+    reps = args.reps
+    voice = FakeVoice()
+    utt = make_paragraph(args.nwords)
+    synth = ttslab.synthesizers.hts.Synthesizer()
+    print("words: %s segments: %s" % (args.nwords, len(utt.get_relation("Segment"))))
+
+    synth.COLUMNAR_LABELS = False
+    get_index = hrg.Utterance.get_index
+    hrg.Utterance.get_index = lambda self: NullIndex()
+    t_traverse, lab_traverse = time_labels(synth, voice, utt, reps)
+    hrg.Utterance.get_index = get_index
+    t_index, lab_index = time_labels(synth, voice, utt, reps)
+    print("HRG traversal: %.4fs" % t_traverse)
+    print("UtteranceIndex: %.4fs (x%.1f)%s" % (t_index, t_traverse / t_index,
+                                               "" if lab_traverse == lab_index else " LABELS DIFFER"))
+
+    for variant in ["default", "tone", "prom", "word"]:
+        (t_items, lab_items), (t_columnar, lab_columnar) = time_variant(variant, voice, utt, reps)
+        print("%s labels: item-wise %.4fs columnar %.4fs (x%.1f)%s" % (variant, t_items, t_columnar, t_items / t_columnar,
+                                                                       "" if lab_items == lab_columnar else " LABELS DIFFER"))
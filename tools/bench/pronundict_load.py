@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Time PronunciationDictionary text loaders (with and without
+    consistency check and parse cache) against the line-by-line
+    reference implementation on a synthetic lexicon...
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import os
+import time
+import codecs
+import shutil
+import tempfile
+import argparse
+from collections import defaultdict
+
+from ttslab.pronundict import PronunciationDictionary
+
+from pronundict_mmap import make_prond
+
+def reference_fromtextfile(fn, phonemap=None, nonestring="None"):
+    """ Previous implementation (without consistency check)...
+    """
+    prond = defaultdict(dict)
+    with codecs.open(fn, encoding="utf-8") as infh:
+        for line in infh:
+            fields = line.split()
+            word = fields[0]
+            tag = fields[1]
+            tones = fields[2]
+            if tones == nonestring:
+                tones = None
+            sylls = fields[3]
+            if sylls == nonestring:
+                sylls = None
+            phones = fields[4:]
+            if phonemap:
+                phones = [phonemap[p] for p in phones]
+            if tag != nonestring:
+                prond[word][tag] = [" ".join(phones), tones, sylls]
+                if None not in prond[word]:
+                    prond[word][None] = prond[word][tag]
+            else:
+                prond[word][None] = [" ".join(phones), tones, sylls]
+    return dict(prond)
+
+def reference_fromsimpletextfile(fn, phonemap=None):
+    prond = defaultdict(dict)
+    with codecs.open(fn, encoding="utf-8") as infh:
+        for line in infh:
+            fields = line.split()
+            word = fields[0]
+            phones = fields[1:]
+            if phonemap:
+                phones = [phonemap[p] for p in phones]
+            prond[word][None] = [" ".join(phones), None, None]
+    return dict(prond)
+
+def shared_entries(prond):
+    """ Number of tagged entries also used for None...
+    """
+    return sum(1 for entries in prond.values() for tag in entries if tag is not None and entries[tag] is entries.get(None))
+
+def timed(func, *args, **kwargs):
+    starttime = time.time()
+    result = func(*args, **kwargs)
+    return time.time() - starttime, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--nwords', metavar='NWORDS', type=int, default=200000, help="words in the synthetic lexicon")
+    parser.add_argument('--nprocs', metavar='NPROCS', type=int, default=4, help="processes for the parallel check")
+    args = parser.parse_args()
+
+    nwords = args.nwords
+    tempdir = tempfile.mkdtemp()
+    try:
+        textfn = os.path.join(tempdir, "dict.txt")
+        simplefn = os.path.join(tempdir, "dict.simple.txt")
+        cachefn = os.path.join(tempdir, "dict.cache")
+        PronunciationDictionary(make_prond(nwords)).totextfile(textfn)
+        with codecs.open(textfn, encoding="utf-8") as infh, codecs.open(simplefn, "w", encoding="utf-8") as outfh:
+            for line in infh:
+                fields = line.split()
+                outfh.write(" ".join([fields[0]] + fields[4:]) + "\n")
+        phonemap = dict((ph, ph.upper()) for ph in ["p", "t", "k", "b", "d", "g", "m", "n", "s", "f", "l", "r",
+                                                    "a", "e", "i", "o", "u", "@", "aI", "eI"])
+        print("entries: %s" % sum(1 for line in open(textfn)))
+        for pmap in [None, phonemap]:
+            t_ref, ref = timed(reference_fromtextfile, textfn, pmap)
+            t_nocheck, pd = timed(PronunciationDictionary().fromtextfile, textfn, pmap, check=False)
+            assert pd.prond == ref
+            t_check, pd = timed(PronunciationDictionary().fromtextfile, textfn, pmap)
+            t_par, pd = timed(PronunciationDictionary().fromtextfile, textfn, pmap, nprocs=args.nprocs)
+            t_save, pd = timed(PronunciationDictionary().fromtextfile, textfn, pmap, cachefn=cachefn)
+            t_cached, pd = timed(PronunciationDictionary().fromtextfile, textfn, pmap, cachefn=cachefn)
+            assert pd.prond == ref and shared_entries(pd.prond) == shared_entries(ref)
+            os.remove(cachefn)
+            print("fromtextfile (phonemap: %s): reference %.3fs new %.3fs, with check %.3fs (%s procs %.3fs), "
+                  "cache save %.3fs load %.3fs" % (pmap is not None, t_ref, t_nocheck, t_check, args.nprocs, t_par,
+                                                   t_save, t_cached))
+            t_ref, ref = timed(reference_fromsimpletextfile, simplefn, pmap)
+            t_new, pd = timed(PronunciationDictionary().fromsimpletextfile, simplefn, pmap)
+            assert pd.prond == ref
+            print("fromsimpletextfile (phonemap: %s): reference %.3fs new %.3fs" % (pmap is not None, t_ref, t_new))
+    finally:
+        shutil.rmtree(tempdir)
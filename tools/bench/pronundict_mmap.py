@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Compare PronunciationDictionary and MappedPronunciationDictionary
+    (lookups, load time and memory) for a synthetic lexicon or a
+    dictionary text file (see PronunciationDictionary.fromtextfile)...
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import os
+import gc
+import time
+import random
+import tempfile
+import argparse
+try:
+    import cPickle as pickle #Py2
+except ImportError:
+    import pickle
+
+from ttslab.pronundict import PronunciationDictionary, MappedPronunciationDictionary
+
+from hrg_memory import rss
+
+PHONES = ["p", "t", "k", "b", "d", "g", "m", "n", "s", "f", "l", "r", "a", "e", "i", "o", "u", "@", "aI", "eI"]
+TAGS = ["NOUN", "VERB", "ADJ"]
+
+def make_prond(nwords=100000, seed=1234):
+    """ Entries as created by fromtextfile: some with tags (first
+        tagged entry also used for None) and syllables/tones...
+    """
+    rng = random.Random(seed)
+    prond = {}
+    for i in range(nwords):
+        word = "".join(rng.choice("abcdefghijklmnopqrstuvwxyzé'") for j in range(rng.randint(2, 12))) + unicode(i) #Py2
+        sylls = [rng.randint(1, 3) for j in range(rng.randint(1, 4))]
+        phones = " ".join(rng.choice(PHONES) for j in range(sum(sylls)))
+        if rng.random() < 0.5:
+            entry = [phones, "".join(rng.choice("01") for s in sylls), "".join(map(str, sylls))]
+        else:
+            entry = [phones, None, None]
+        prond[word] = {None: entry}
+        if rng.random() < 0.2:
+            for tag in rng.sample(TAGS, rng.randint(1, 2)):
+                prond[word][tag] = [phones, entry[1], entry[2]]
+    return prond
+
+def queries(prond, n=50000, seed=4321):
+    rng = random.Random(seed)
+    words = list(prond)
+    return [(rng.choice(words) if rng.random() < 0.8 else "notaword%s" % i, rng.choice([None, None] + TAGS))
+            for i in range(n)]
+
+def lookup_all(pd, qs):
+    return [(pd.contains(w, t), w in pd, pd.lookup(w, t), pd.pron_lookup(w, t), pd.syll_lookup(w, t), pd.tone_lookup(w, t))
+            for w, t in qs]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--dictfn', metavar='DICTFN', type=str, default=None,
+                        help="dictionary text file (default: synthetic lexicon)")
+    parser.add_argument('--nwords', metavar='NWORDS', type=int, default=100000, help="words in the synthetic lexicon")
+    args = parser.parse_args()
+
+    if args.dictfn is not None:
+        pd = PronunciationDictionary().fromtextfile(args.dictfn)
+    else:
+        pd = PronunciationDictionary(make_prond(args.nwords))
+    fd, mappedfn = tempfile.mkstemp(suffix=".pd")
+    os.close(fd)
+    try:
+        pd.tomappedfile(mappedfn)
+        mpd = MappedPronunciationDictionary(mappedfn)
+        assert len(mpd) == len(pd.prond) and sorted(mpd) == sorted(pd)
+        assert mpd.prond == pd.prond
+        qs = queries(pd.prond)
+        times = []
+        for d in [pd, mpd]:
+            starttime = time.time()
+            results = lookup_all(d, qs)
+            times.append((time.time() - starttime, results))
+        assert times[0][1] == times[1][1]
+        print("words: %s file: %.1f MB" % (len(mpd), os.path.getsize(mappedfn) / 2**20))
+        print("%s queries: dict %.4fs mapped %.4fs" % (len(qs), times[0][0], times[1][0]))
+
+        for d in [pd, mpd]:
+            data = pickle.dumps(d, protocol=2)
+            del d
+            gc.collect()
+            rss0 = rss()
+            starttime = time.time()
+            d = pickle.loads(data)
+            t_load = time.time() - starttime
+            gc.collect()
+            print("%s: unpickle %.4fs, %.1f MB (pickle %.1f MB)" % (type(d).__name__, t_load, (rss() - rss0) / 2**20, len(data) / 2**20))
+            del d
+    finally:
+        os.remove(mappedfn)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Time len() (maintained Relation item count) against walking the
+    relation (count and indexing are tested in tests/test_hrg.py)...
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import time
+
+from labels import make_paragraph
+
+def walklen(relation):
+    c = 0
+    item = relation.head_item
+    while item is not None:
+        c += 1
+        item = item.next_item
+    return c
+
+if __name__ == "__main__":
+    utt = make_paragraph(1000)
+    relation = utt.get_relation("Segment")
+    for func in [walklen, len]:
+        starttime = time.time()
+        for i in range(1000):
+            func(relation)
+        print("%s (%s items) x1000: %.4fs" % (func.__name__, len(relation), time.time() - starttime))
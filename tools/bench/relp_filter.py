@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Compare RELP synthesis filters (see
+    ttslab.synthesizers.unitselection.SYNTH_FILTERS) on synthetic
+    slowly varying stable LPC frames and residual: output against the
+    pure-Python reference ("purepython": float feedback as the
+    compiled filter) and against the original 16-bit feedback filter
+    (relp_purepython.synth_filter, not registered: its output differs),
+    and speed (equivalence is tested in tests/test_relp_filter.py)...
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import time
+import argparse
+
+import numpy as np
+
+from ttslab.synthesizers.unitselection import SYNTH_FILTERS, SAMPLERATE
+from ttslab.synthesizers.relp_purepython import synth_filter as synth_filter_int16
+
+def stepup(reflcoefs):
+    """ Prediction polynomial (1, a1, ... ap) from reflection
+        coefficients...
+    """
+    a = np.array([1.0])
+    for k in reflcoefs:
+        a = np.concatenate((a, [0.0]))
+        a = a + k * a[::-1]
+    return a
+
+def make_track(duration, order=16, seed=1234):
+    """ Pitch-synchronous frame times, LPC frames (as stored in
+        "lpc-coefs": values[:,1:] are the predictor coefficients) and
+        residual...
+    """
+    rng = np.random.RandomState(seed)
+    times = np.cumsum(rng.uniform(0.004, 0.01, int(duration / 0.007)))
+    times = times[times < duration]
+    reflcoefs = rng.uniform(-0.7, 0.7, order)
+    lpcs = []
+    for i in range(len(times)):
+        reflcoefs = np.clip(reflcoefs + rng.uniform(-0.03, 0.03, order), -0.9, 0.9)
+        lpcs.append(np.concatenate(([1.0], -stepup(reflcoefs)[1:])))
+    residual = rng.randn(int(duration * SAMPLERATE)) * 20.0
+    residual[(times * SAMPLERATE).astype(int)] += 300.0 #pulses
+    return times, np.array(lpcs), residual
+
+def run(func, times, lpcs, residual, reps):
+    t = []
+    for i in range(reps):
+        starttime = time.time()
+        samples = func(times, lpcs, residual, SAMPLERATE)
+        t.append(time.time() - starttime)
+    return min(t), samples
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--duration', metavar='SECONDS', type=float, default=3.0, help="length of audio")
+    args = parser.parse_args()
+
+    times, lpcs, residual = make_track(args.duration)
+    print("%.1fs audio, %d frames" % (args.duration, len(times)))
+    t_int16, reference = run(synth_filter_int16, times, lpcs, residual, 1)
+    t_reference, reference_float = run(SYNTH_FILTERS["purepython"], times, lpcs, residual, 1)
+    print("purepython: %.3fs, with 16-bit feedback: %.3fs" % (t_reference, t_int16))
+    for name in sorted(SYNTH_FILTERS):
+        if name == "purepython":
+            continue
+        t, samples = run(SYNTH_FILTERS[name], times, lpcs, residual, 5)
+        diff = np.abs(samples.astype(np.int16).astype(np.int64) - reference.astype(np.int64))
+        print("%s: %.4fs (x%.0f)" % (name, t, t_reference / t))
+        print("  vs float feedback: max abs difference %.3g, 16-bit samples differing: %d" %
+              (np.abs(samples - reference_float).max(),
+               (samples.astype(np.int16) != reference_float.astype(np.int16)).sum()))
+        print("  vs 16-bit feedback: 16-bit samples differing: %d (max %d, signal max %d)" %
+              ((diff > 0).sum(), diff.max(), np.abs(reference).max()))
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Compare vectorized and reference unit selection (selected units
+    and speed) on synthetic paragraphs and a synthetic halfphone (and
+    word) unit catalogue, vectorized unit selection with join caches
+    (see ttslab.synthesizers.joincache) and vectorized and reference
+    concatenation of the selected units (also with precomputed residual
+    frames, see ttslab.synthesizers.residualframes), and both with the
+    catalogue converted to the columnar format (see
+    ttslab.synthesizers.unitcatalogue), and selection quality and speed
+    with search parameters in synthparms (beam and target
+    preselection, also with a join cache)...
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import os
+import time
+import shutil
+import tempfile
+import argparse
+
+import numpy as np
+
+import ttslab.synthesizers.unitselection as unitselection
+import ttslab.synthesizers.unitselection_word as unitselection_word
+from ttslab.synthesizers.joincache import JoinCache
+from ttslab.synthesizers.residualframes import ResidualFrames
+from ttslab.synthesizers.unitcatalogue import UNITCATALOGUE_EXT, UnitCatalogue
+from ttslab.trackfile import Track
+
+from labels import make_paragraph, CONSONANTS, VOWELS, SILPHONE
+from relp_filter import stepup
+
+POSITIONS = ["initial", "medial", "final", None]
+PHONES = CONSONANTS + VOWELS + [SILPHONE]
+NJOINCOEFS = 13
+LPC_ORDER = 16
+
+def make_lpc(rng):
+    """ LPC track (stable frames) and residual (int16, may end before
+        the last window) of a candidate...
+    """
+    track = Track()
+    track.times = np.cumsum(rng.uniform(0.004, 0.01, rng.randint(3, 12)))
+    reflcoefs = rng.uniform(-0.7, 0.7, LPC_ORDER)
+    track.values = np.array([np.concatenate(([1.0], -stepup(reflcoefs + rng.uniform(-0.05, 0.05, LPC_ORDER))[1:]))
+                             for t in track.times])
+    residual = rng.randn(int(round(track.times[-1] * unitselection.SAMPLERATE)) + rng.randint(0, 80)) * 20.0
+    return track, residual.astype(np.int16)
+
+def make_catalogue(ncands, seed=1, lpc=False):
+    """ Halfphone candidates with join coefficients and target
+        features (enough for unit selection), and LPC tracks and
+        residuals if "lpc"...
+    """
+    rng = np.random.RandomState(seed)
+    catalogue = {}
+    for phone in PHONES:
+        for half in ["left", "right"]:
+            catalogue["%s-%s" % (half, phone)] = [
+                {"left-joincoef": rng.randn(NJOINCOEFS),
+                 "right-joincoef": rng.randn(NJOINCOEFS),
+                 "num_syls": None if rng.rand() < 0.05 else int(rng.randint(1, 5)),
+                 "position_in_syl": POSITIONS[rng.randint(len(POSITIONS))],
+                 "position_in_word": POSITIONS[rng.randint(len(POSITIONS))],
+                 "position_in_phrase": POSITIONS[rng.randint(len(POSITIONS))],
+                 "context_nextsegment": PHONES[rng.randint(len(PHONES))] if rng.rand() < 0.95 else None,
+                 "context_prevsegment": PHONES[rng.randint(len(PHONES))] if rng.rand() < 0.95 else None}
+                for i in range(rng.randint(ncands // 2, ncands + 1))]
+    if lpc:
+        for cands in catalogue.values():
+            for cand in cands:
+                cand["lpc-coefs"], cand["residuals"] = make_lpc(rng)
+    return catalogue
+
+def make_word_catalogue(nwords, ncands, seed=2):
+    rng = np.random.RandomState(seed)
+    words = ["word%s" % i for i in range(nwords)]
+    return dict((word, [{"left-joincoef": rng.randn(NJOINCOEFS),
+                         "right-joincoef": rng.randn(NJOINCOEFS),
+                         "context_prevword": words[rng.randint(nwords)],
+                         "context_nextword": words[rng.randint(nwords)]}
+                        for i in range(rng.randint(1, ncands + 1))])
+                for word in words)
+
+def selected(utt):
+    return [(id(u["selected_unit"]["candidate"]), u["selected_unit"]["prevcandidate"], u["selected_unit"]["total_score"])
+            for u in utt.gr("Unit")]
+
+def select_all(func, utts, synthparms=None):
+    starttime = time.time()
+    results = [selected(func(utt, synthparms)) for utt in utts]
+    return time.time() - starttime, results
+
+def compare(synth, utts):
+    """ Returns times for reference and vectorized search and the
+        selected units...
+    """
+    t_reference, ref = select_all(synth._selectunits_reference, utts)
+    t_vectorized, out = select_all(synth._selectunits, utts)
+    assert ref == out
+    return t_reference, t_vectorized, out
+
+def agreement(ref, out):
+    """ Fraction of units with the same selected candidate...
+    """
+    pairs = [(r[0], o[0]) for refutt, oututt in zip(ref, out) for r, o in zip(refutt, oututt)]
+    return sum(r == o for r, o in pairs) / len(pairs)
+
+def compare_joincaches(synth, utts, ref, tempdir):
+    """ Precomputed (saved and loaded) caches for each dtype and a
+        lazily filled cache...
+    """
+    preselect_ref = select_all(synth._selectunits, utts, PRESELECT_SEARCHPARMS)[1]
+    for dtype in ["float64", "float32", "float16", "uint16"]:
+        fn = os.path.join(tempdir, "catalogue.joincache." + dtype)
+        starttime = time.time()
+        joincache = JoinCache(dtype=dtype)
+        joincache.precompute(synth)
+        joincache.save(fn)
+        t_precompute = time.time() - starttime
+        synth.joincache = JoinCache(fn=fn)
+        t_selection, out = select_all(synth._selectunits, utts)
+        if dtype == "float64":
+            assert out == ref
+        print("  precomputed %s (%d pairs, %.1f MB): precompute %.3fs selection %.3fs agreement %.4f" %
+              (dtype, len(synth.joincache), os.path.getsize(fn) / 2**20, t_precompute, t_selection, agreement(ref, out)))
+        if dtype == "float64": #only preselected rows are read (same units, scores may differ in the last bit)
+            t_selection, out = select_all(synth._selectunits, utts, PRESELECT_SEARCHPARMS)
+            assert [[r[:2] for r in utt] for utt in out] == [[r[:2] for r in utt] for utt in preselect_ref]
+            assert np.allclose([r[2] for utt in out for r in utt], [r[2] for utt in preselect_ref for r in utt])
+            print("  precomputed %s, preselectnumcands=%s: selection %.3fs" %
+                  (dtype, PRESELECT_SEARCHPARMS["preselectnumcands"], t_selection))
+    synth.joincache = JoinCache(dtype="float32", maxbytes=2**26)
+    for i in range(2):
+        t_selection, out = select_all(synth._selectunits, utts)
+        print("  lazy float32 (pass %d): selection %.3fs agreement %.4f hits %d misses %d" %
+              (i + 1, t_selection, agreement(ref, out), synth.joincache.hits, synth.joincache.misses))
+    synth.joincache = None
+
+def waveforms(synth, utts, vectorized=True):
+    synth.VECTORIZED = vectorized
+    try:
+        return [synth._concatunits(utt, None)["waveform"].samples for utt in utts]
+    finally:
+        synth.VECTORIZED = True
+
+def compare_concatenation(synth, utts):
+    """ Concatenated tracks and residuals, and waveforms...
+    """
+    cands = [[u["selected_unit"]["candidate"] for u in utt.gr("Unit")] for utt in utts]
+    times = []
+    for func in [unitselection.concat_units_reference, unitselection.concat_units]:
+        starttime = time.time()
+        results = [func(c) for c in cands]
+        times.append(time.time() - starttime)
+        if func is unitselection.concat_units:
+            for a, b in zip(reference, results):
+                assert all(np.array_equal(x, y) for x, y in zip(a, b))
+        reference = results
+    assert all(np.array_equal(a, b) for a, b in zip(waveforms(synth, utts, False), waveforms(synth, utts)))
+    print("  concatenation (%.1fs audio): reference %.3fs vectorized %.3fs (x%.1f)" %
+          (sum(len(r[2]) for r in reference) / unitselection.SAMPLERATE, times[0], times[1], times[0] / times[1]))
+    return cands, reference
+
+def compare_residualframes(synth, utts, cands, reference, tempdir):
+    """ Concatenation with precomputed residual frames (saved and
+        loaded) for each dtype...
+    """
+    for dtype in ["float64", "float32"]:
+        fn = os.path.join(tempdir, "catalogue.frames." + dtype)
+        starttime = time.time()
+        frames = ResidualFrames()
+        frames.build(synth.unitcatalogue, dtype=np.dtype(str(dtype)))
+        frames.save(fn)
+        t_build = time.time() - starttime
+        frames = ResidualFrames(fn=fn)
+        starttime = time.time()
+        frames.bind(synth.unitcatalogue)
+        t_bind = time.time() - starttime
+        starttime = time.time()
+        results = [unitselection.concat_units(c, frames) for c in cands]
+        t_concat = time.time() - starttime
+        maxdiff = max(np.abs(a[2] - b[2]).max() for a, b in zip(reference, results))
+        if dtype == "float64":
+            assert maxdiff == 0.0
+            synth.residualframes = frames
+            reference_waveforms = waveforms(synth, utts, False)
+            assert all(np.array_equal(a, b) for a, b in zip(waveforms(synth, utts), reference_waveforms))
+            synth.residualframes = None
+        print("  residual frames %s (%.1f MB): build %.3fs bind %.3fs concatenation %.3fs max difference %.3g" %
+              (dtype, os.path.getsize(fn) / 2**20, t_build, t_bind, t_concat, maxdiff))
+
+SEARCHPARMS = [{"prunenumcands": 50},
+               {"prunenumcands": 20, "prunescoredelta": 0.005},
+               {"preselectnumcands": 100},
+               {"preselectnumcands": 30},
+               {"preselectnumcands": 30, "prunenumcands": 20}]
+PRESELECT_SEARCHPARMS = {"preselectnumcands": 30}
+
+def compare_searchparms(synth, utts, ref, t_vectorized):
+    """ Selection with search parameters in synthparms: beam settings
+        must give the same units as the reference search, quality is
+        the final total score relative to the default search...
+    """
+    refscores = np.array([utt[-1][2] for utt in ref])
+    for synthparms in SEARCHPARMS:
+        t_selection, out = select_all(synth._selectunits, utts, synthparms)
+        if set(synthparms) <= set(["prunenumcands", "prunescoredelta"]):
+            assert select_all(synth._selectunits_reference, utts, synthparms)[1] == out
+        print("  %-70s selection %.3fs (x%.1f) agreement %.4f score %.4f" %
+              (", ".join("%s=%s" % item for item in sorted(synthparms.items())), t_selection,
+               t_vectorized / t_selection, agreement(ref, out), (np.array([utt[-1][2] for utt in out]) / refscores).mean()))
+    select_all(synth._selectunits, utts) #restore default selection
+
+def positions(catalogue, results):
+    """ Selected units as (unit type, index in catalogue list)...
+    """
+    ids = dict((id(cand), (unitname, i)) for unitname in catalogue for i, cand in enumerate(catalogue[unitname]))
+    return [[(ids[r[0]],) + r[1:] for r in utt] for utt in results]
+
+def compare_unitcatalogue(synth, utts, ref, tempdir):
+    """ Convert the catalogue (saved and loaded) and select and
+        concatenate with a new synthesizer (replaces the units of
+        "utts")...
+    """
+    lpc = "lpc-coefs" in synth.unitcatalogue.values()[0][0]
+    if lpc:
+        reference_waveforms = waveforms(synth, utts)
+    fn = os.path.join(tempdir, "catalogue.pickle")
+    starttime = time.time()
+    UnitCatalogue.fromcatalogue(synth.unitcatalogue).save(fn + UNITCATALOGUE_EXT)
+    t_convert = time.time() - starttime
+    starttime = time.time()
+    columnar = synth.__class__(unitcataloguefile=fn)
+    t_load = time.time() - starttime
+    for utt in utts:
+        columnar.feats(None, utt, None)
+    t_selection, out = select_all(columnar._selectunits, utts)
+    assert positions(columnar.unitcatalogue, out) == positions(synth.unitcatalogue, ref)
+    results = "selection %.3fs" % t_selection
+    if lpc:
+        starttime = time.time()
+        out = waveforms(columnar, utts)
+        results += " concatenation and synthesis %.3fs" % (time.time() - starttime)
+        assert all(np.array_equal(a, b) for a, b in zip(out, reference_waveforms))
+    print("  columnar catalogue (%.1f MB): convert %.3fs load and index %.3fs %s" %
+          (os.path.getsize(fn + UNITCATALOGUE_EXT) / 2**20, t_convert, t_load, results))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--nutts', metavar='NUTTS', type=int, default=10, help="number of paragraphs")
+    parser.add_argument('--nwords', metavar='NWORDS', type=int, default=20, help="words per paragraph")
+    parser.add_argument('--ncands', metavar='NCANDS', type=int, default=300, help="max candidates per unit type")
+    args = parser.parse_args()
+
+    utts = [make_paragraph(args.nwords, seed=i) for i in range(args.nutts)]
+    tests = [("halfphones", unitselection.Synthesizer(), make_catalogue(args.ncands, lpc=True)),
+             ("words", unitselection_word.Synthesizer(), make_word_catalogue(args.nwords, args.ncands))]
+    for name, synth, catalogue in tests:
+        synth.unitcatalogue = catalogue
+        starttime = time.time()
+        synth._index_catalogue()
+        t_index = time.time() - starttime
+        for utt in utts:
+            synth.feats(None, utt, None)
+        t_reference, t_vectorized, ref = compare(synth, utts)
+        print("%s (%s units): index %.3fs reference %.3fs vectorized %.3fs (x%.1f)" %
+              (name, sum(len(utt.gr("Unit")) for utt in utts), t_index, t_reference, t_vectorized,
+               t_reference / t_vectorized))
+        compare_searchparms(synth, utts, ref, t_vectorized)
+        tempdir = tempfile.mkdtemp()
+        try:
+            if name == "halfphones":
+                cands, reference = compare_concatenation(synth, utts)
+                compare_residualframes(synth, utts, cands, reference, tempdir)
+                compare_joincaches(synth, utts, ref, tempdir)
+            compare_unitcatalogue(synth, utts, ref, tempdir)
+        finally:
+            shutil.rmtree(tempdir)
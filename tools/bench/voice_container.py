@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Load time and memory of a synthetic voice (two large lexicons and
+    a morphological parser) as a single pickle and as a container
+    directory (see ttslab.voicecontainer), each measured in a fresh
+    process...
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import os
+import sys
+import time
+import json
+import shutil
+import tempfile
+import argparse
+import subprocess
+
+import ttslab
+import ttslab.voicecontainer
+from ttslab.lang.default import DefaultVoice
+from ttslab.pronundict import PronunciationDictionary
+from ttslab.morphparser import Morphparse
+import ttslab.synthesizers.hts
+
+from hrg_memory import rss
+from pronundict_mmap import make_prond
+from g2p_rewrites import make_g2p, GRAPHEMES
+
+TEXT = "the quick brown fox jumps over the lazy dog"
+
+class Phoneset(object):
+    """ Just what DefaultVoice uses up to "text-to-segments"...
+    """
+    def __init__(self):
+        self.features = {"silence_phone": "pau"}
+        self.phones = dict([(g.upper(), set(["vowel"] if g in "aeiou" else ["consonant"])) for g in GRAPHEMES] +
+                           [("pau", set(["pause"]))])
+        self.map = dict((ph, ph) for ph in self.phones)
+
+    def syllabify(self, phones):
+        return [phones[i:i+2] for i in range(0, len(phones), 2)]
+
+    def guess_syltonestress(self, word_item, syllables):
+        return "0" * len(syllables)
+
+class WordMorphparse(Morphparse):
+    """ Parses looked up in a table (not used by DefaultVoice, only
+        loaded)...
+    """
+    def __init__(self, parses):
+        self.parses = parses
+
+    def parse_word(self, word):
+        return self.parses.get(word, [word])
+
+def make_voice(nwords):
+    pronun = {}
+    words = []
+    for lang, seed in [("main", 1), ("englishZA", 2)]:
+        prond = make_prond(nwords, seed=seed)
+        words.extend(prond)
+        pronun[lang] = {"phoneset": Phoneset(),
+                        "g2p": make_g2p(2000, seed=seed),
+                        "pronundict": PronunciationDictionary(prond),
+                        "pronunaddendum": PronunciationDictionary()}
+    voice = DefaultVoice(pronun=pronun, synthesizer=ttslab.synthesizers.hts.Synthesizer())
+    voice.phones = pronun["main"]["phoneset"].phones
+    voice.phonemap = pronun["main"]["phoneset"].map
+    voice.morphparser = WordMorphparse(dict((word, ["<word>%s" % word, "<word><noun>%s" % word]) for word in words))
+    return voice
+
+def measure(location):
+    """ Run in a fresh process...
+    """
+    rss0 = rss()
+    starttime = time.time()
+    voice = ttslab.fromfile(location)
+    t_load = time.time() - starttime
+    rss1 = rss()
+    starttime = time.time()
+    segments = [seg["name"] for seg in voice.synthesize(TEXT, "text-to-segments").gr("Segment")]
+    t_first = time.time() - starttime
+    morphparser_loaded = type(object.__getattribute__(voice, "morphparser")) is not ttslab.voicecontainer.LazySection
+    rss2 = rss()
+    starttime = time.time()
+    parses = voice.morphparser.parse_word(next(iter(voice.morphparser.parses)))
+    t_morphparser = time.time() - starttime
+    return {"load": t_load, "first": t_first, "rss": (rss1 - rss0) / 2**20, "rss_after": (rss2 - rss0) / 2**20,
+            "segments": segments, "morphparser_loaded": morphparser_loaded, "morphparser": t_morphparser,
+            "rss_morphparser": (rss() - rss0) / 2**20, "parses": parses}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--nwords', metavar='NWORDS', type=int, default=100000, help="words per lexicon")
+    parser.add_argument('--measure', metavar='LOCATION', type=str, default=None,
+                        help="load voice and print measurements (JSON), used internally in a fresh process")
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        print(json.dumps(measure(args.measure)))
+        sys.exit(0)
+    tempdir = tempfile.mkdtemp()
+    try:
+        voice = make_voice(args.nwords)
+        voicefn = os.path.join(tempdir, "voice.pickle")
+        containerdir = os.path.join(tempdir, "voice.d")
+        ttslab.tofile(voice, voicefn)
+        ttslab.voicecontainer.tocontainer(voice, containerdir)
+        results = []
+        for location in [voicefn, containerdir]:
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--measure", location])
+            results.append(json.loads(output.decode("utf-8")))
+            print("%s: load %.3fs (%.1f MB), first utterance %.3fs (%.1f MB), morphparser %s then %.3fs (%.1f MB)" %
+                  (os.path.basename(location), results[-1]["load"], results[-1]["rss"],
+                   results[-1]["first"], results[-1]["rss_after"],
+                   "loaded" if results[-1]["morphparser_loaded"] else "not loaded", results[-1]["morphparser"],
+                   results[-1]["rss_morphparser"]))
+        assert results[0]["segments"] == results[1]["segments"]
+        assert results[0]["parses"] == results[1]["parses"]
+        assert not results[1]["morphparser_loaded"]
+    finally:
+        shutil.rmtree(tempdir)
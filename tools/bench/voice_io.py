@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Load time of a synthetic HTS voice (engine voice file and two
+    lexicons) and a synthetic unit-selection catalogue (LPC tracks and
+    residuals) written as plain pickles (protocol 2, as previously
+    written by ttslab.tofile) and with ttslab.serialization for each
+    available codec (and the catalogue converted to the columnar
+    format, see ttslab.synthesizers.unitcatalogue), each measured in a
+    fresh process...
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import os
+import sys
+import time
+import json
+import random
+import shutil
+import tempfile
+import argparse
+import subprocess
+from collections import Mapping
+try:
+    import cPickle as pickle #Py2
+except ImportError:
+    import pickle
+
+import numpy as np
+
+import ttslab
+import ttslab.serialization
+from ttslab.trackfile import Track
+from ttslab.synthesizers.unitcatalogue import UnitCatalogue, UNITCATALOGUE_EXT
+
+from hrg_memory import rss
+from voice_container import make_voice
+
+SAMPLERATE = 16000
+
+def make_htsvoice(nwords, seed=1):
+    voice = make_voice(nwords)
+    rng = random.Random(seed)
+    synth = object.__getattribute__(voice, "synthesizer")
+    synth.htsvoice_bin = bytes(bytearray(rng.getrandbits(8) for i in range(4 * 2**20)))
+    synth.mixfilter_bin = b"0.0\n" * 2**12
+    synth.pdfilter_bin = b"0.0\n" * 2**12
+    return voice
+
+def make_unitcatalogue(nunits, ncands, seed=1):
+    """ Candidates as built by the unit-selection voice build: join
+        coefficients, target features, LPC track and residual...
+    """
+    rng = np.random.RandomState(seed)
+    catalogue = {}
+    for i in range(nunits):
+        name = "%s-ph%s" % (["left", "right"][i % 2], i // 2)
+        cands = []
+        for j in range(ncands):
+            nframes = rng.randint(5, 15)
+            lpctrack = Track()
+            lpctrack.times = np.cumsum(rng.uniform(0.004, 0.008, nframes))
+            lpctrack.values = rng.randn(nframes, 17)
+            cands.append({"left-joincoef": rng.randn(13),
+                          "right-joincoef": rng.randn(13),
+                          "num_syls": rng.randint(1, 4),
+                          "position_in_syl": rng.randint(0, 3),
+                          "position_in_word": rng.randint(0, 3),
+                          "position_in_phrase": rng.randint(0, 3),
+                          "context_nextsegment": "ph%s" % rng.randint(40),
+                          "context_prevsegment": "ph%s" % rng.randint(40),
+                          "dur": lpctrack.times[-1],
+                          "lpc-coefs": lpctrack,
+                          "residuals": (rng.randn(int(lpctrack.times[-1] * SAMPLERATE) + 1) * 2**10).astype(np.int16)})
+        catalogue[name] = cands
+    return catalogue
+
+def checksum(obj):
+    """ Of the unit catalogue (touches all arrays) or voice...
+    """
+    if isinstance(obj, Mapping):
+        return float(sum(c["residuals"].sum() + c["lpc-coefs"].values.sum() + c["left-joincoef"].sum()
+                         for unitname in sorted(obj) for c in obj[unitname]))
+    return len(object.__getattribute__(obj, "synthesizer").htsvoice_bin)
+
+def measure(fn):
+    """ Run in a fresh process...
+    """
+    rss0 = rss()
+    starttime = time.time()
+    if fn.endswith(UNITCATALOGUE_EXT):
+        obj = UnitCatalogue(fn=fn)
+    else:
+        obj = ttslab.fromfile(fn)
+    t_load = time.time() - starttime
+    rss1 = rss()
+    starttime = time.time()
+    check = checksum(obj)
+    t_access = time.time() - starttime
+    return {"load": t_load, "access": t_access, "rss": (rss1 - rss0) / 2**20, "check": check}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--nwords', metavar='NWORDS', type=int, default=50000, help="lexicon size (HTS voice)")
+    parser.add_argument('--nunits', metavar='NUNITS', type=int, default=80, help="unit types (catalogue)")
+    parser.add_argument('--ncands', metavar='NCANDS', type=int, default=150, help="candidates per unit (catalogue)")
+    parser.add_argument('--measure', metavar='FN', type=str, default=None,
+                        help="load file and print measurements (JSON), used internally in a fresh process")
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        print(json.dumps(measure(args.measure)))
+        sys.exit(0)
+
+    tempdir = tempfile.mkdtemp()
+    try:
+        for name, obj in [("hts voice", make_htsvoice(args.nwords)),
+                          ("unit catalogue", make_unitcatalogue(args.nunits, args.ncands))]:
+            results = []
+            fn = os.path.join(tempdir, "pickle")
+            starttime = time.time()
+            with open(fn, "wb") as outfh:
+                pickle.dump(obj, outfh, protocol=2)
+            tests = [("pickle (protocol 2)", fn, time.time() - starttime)]
+            for codec in sorted(ttslab.serialization.CODECS):
+                fn = os.path.join(tempdir, codec)
+                starttime = time.time()
+                ttslab.tofile(obj, fn, codec=codec)
+                tests.append(("serialized (%s)" % codec, fn, time.time() - starttime))
+            if name == "unit catalogue":
+                fn = os.path.join(tempdir, "catalogue" + UNITCATALOGUE_EXT)
+                starttime = time.time()
+                UnitCatalogue.fromcatalogue(obj).save(fn)
+                tests.append(("columnar", fn, time.time() - starttime))
+            print("%s:" % name)
+            for desc, fn, t_write in tests:
+                output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--measure", fn])
+                results.append(json.loads(output.decode("utf-8")))
+                print("  %-22s %7.1f MB  write %.3fs  load %.3fs (%.1f MB)  access %.3fs" %
+                      (desc, os.path.getsize(fn) / 2**20, t_write, results[-1]["load"], results[-1]["rss"],
+                       results[-1]["access"]))
+            assert len(set(r["check"] for r in results)) == 1
+    finally:
+        shutil.rmtree(tempdir)
@@ -8,6 +8,7 @@ __author__ = "Daniel van Niekerk"
 __email__ = "dvn.demitasse@gmail.com"
 
 import os, sys
+import time
 import ConfigParser as configparser
 import socket
 import json
@@ -24,6 +25,15 @@ DEF_LOGLEVEL = 20
 END_OF_MESSAGE_STRING = b"<EoM>"
 DEFAULT_PORT = 22223
 
+def resident_mb():
+    """ Resident set size of this process in MB (Linux only)...
+    """
+    try:
+        with open("/proc/self/statm") as infh:
+            return int(infh.read().split()[1]) * os.sysconf(str("SC_PAGE_SIZE")) / 2**20
+    except (IOError, OSError):
+        return float("nan")
+
 class TTSServer(object):
     
     def __init__(self, voicename=None, lport=DEFAULT_PORT):
@@ -37,8 +47,9 @@ class TTSServer(object):
 
     def loadvoice(self, name, voice_location):
         log.info("Loading voice from file '%s'" % (voice_location))
-        self.voices[name] = ttslab.fromfile(voice_location)
-        log.info("Voice '%s' loaded." % (name))
+        starttime = time.time()
+        self.voices[name] = ttslab.fromfile(voice_location) #container directories are loaded lazily
+        log.info("Voice '%s' loaded (%.2fs, RSS %.1f MB)." % (name, time.time() - starttime, resident_mb()))
 
     def getvoicelist(self):
         return self.voices.keys()
@@ -6,7 +6,10 @@ from __future__ import unicode_literals, division, print_function #Py2
 __author__ = "Daniel van Niekerk"
 __email__ = "dvn.demitasse@gmail.com"
 
+import os
 import sys
+import threading
+from contextlib import contextmanager
 sys.setrecursionlimit(1000000)
 
 try:
@@ -24,10 +27,48 @@ def extend(cls, module_name):
     for funcname in funclist:
         setattr(cls, funcname, eval("getattr(%s, '%s')" % (module_name, funcname)))
 
+_loading = threading.local()
+
+def loaddir():
+    """Directory of the file (or voice container) being loaded by
+       fromfile, for resolving relative paths while unpickling (None
+       if not loading)...
+    """
+    return getattr(_loading, "dirname", None)
+
+@contextmanager
+def loading_from(dirname):
+    """Set loaddir() unless already set (by an enclosing load)...
+    """
+    if loaddir() is not None:
+        yield
+        return
+    _loading.dirname = os.path.abspath(dirname)
+    try:
+        yield
+    finally:
+        _loading.dirname = None
+
 def fromfile(fname):
-    with open(fname) as infh:
-        return pickle.load(infh)
+    """Load from serialized file (see ttslab.serialization), plain
+       pickle file or voice container directory (see
+       ttslab.voicecontainer)...
+    """
+    if os.path.isdir(fname):
+        import ttslab.voicecontainer
+        with loading_from(fname):
+            return ttslab.voicecontainer.fromcontainer(fname)
+    import ttslab.serialization
+    with loading_from(os.path.dirname(os.path.abspath(fname))):
+        if ttslab.serialization.isserialized(fname):
+            return ttslab.serialization.load(fname)
+        with open(fname, "rb") as infh:
+            return pickle.load(infh)
 
-def tofile(obj, fname):
-    with open(fname, "w") as outfh:
-        pickle.dump(obj, outfh, protocol=2)
+def tofile(obj, fname, codec=None):
+    """Write in the versioned format of ttslab.serialization (highest
+       pickle protocol, numpy arrays out-of-band, optionally
+       compressed)...
+    """
+    import ttslab.serialization
+    ttslab.serialization.dump(obj, fname, codec=codec)
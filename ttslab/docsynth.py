@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Synthesis of long documents: the text is split at sentence (or
+   phrase) boundaries and chunks are synthesized in parallel by a pool
+   of worker processes, each loading the voice pickle once. The
+   resulting waveforms and segment times are concatenated in order.
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import re
+import time
+import multiprocessing
+
+import numpy as np
+
+import ttslab
+from ttslab.hrg import Utterance
+from ttslab.waveform import Waveform
+
+SENTENCEBREAK_PUNCTS = set(".!?")
+PHRASEBREAK_PUNCTS = set("!?.,:;)")
+WHITESPACE_RE = re.compile(r"\s+", re.UNICODE)
+
+def split_text(text, breakpuncts=SENTENCEBREAK_PUNCTS, minwords=1):
+    """Split text into chunks at whitespace separated tokens ending in
+       one of `breakpuncts`, chunks contain at least `minwords`
+       tokens...
+    """
+    chunks = []
+    tokens = []
+    for token in WHITESPACE_RE.split(text.strip()):
+        if not token:
+            continue
+        tokens.append(token)
+        if token[-1] in breakpuncts and len(tokens) >= minwords:
+            chunks.append(" ".join(tokens))
+            tokens = []
+    if tokens:
+        chunks.append(" ".join(tokens))
+    return chunks
+
+
+#### Worker process:
+VOICE = None #loaded once per process by init_worker
+
+def init_worker(voicefn):
+    global VOICE
+    VOICE = ttslab.fromfile(voicefn)
+
+def synth_chunk(args):
+    """Synthesize one chunk and return only what is needed to
+       assemble the document (not the HRG structure)...
+    """
+    index, text, synthparms = args
+    starttime = time.time()
+    utt = VOICE.synthesize(text, "text-to-wave", synthparms)
+    segments = [(seg["name"], seg["start"], seg["end"]) for seg in utt.get_relation("Segment")]
+    return {"index": index,
+            "text": text,
+            "samples": utt["waveform"].samples,
+            "samplerate": utt["waveform"].samplerate,
+            "segments": segments,
+            "synthtime": time.time() - starttime}
+
+
+#### Document assembly:
+def assemble(chunkresults):
+    """Concatenate chunk results (in order of "index") into a single
+       Utterance with "waveform", a Segment relation with start and
+       end times (if available) and per-chunk information in "chunks"...
+    """
+    chunkresults = sorted(chunkresults, key=lambda x: x["index"])
+    utt = Utterance()
+    utt["inputtext"] = " ".join([r["text"] for r in chunkresults])
+    seg_rel = utt.new_relation("Segment")
+    chunks = []
+    offset = 0.0
+    samplerate = None
+    for r in chunkresults:
+        if samplerate is None:
+            samplerate = r["samplerate"]
+        assert r["samplerate"] == samplerate
+        for name, start, end in r["segments"]:
+            seg_item = seg_rel.append_item()
+            seg_item["name"] = name
+            if start is not None:
+                seg_item["start"] = offset + start
+            if end is not None:
+                seg_item["end"] = offset + end
+        duration = len(r["samples"]) / samplerate
+        chunks.append({"text": r["text"],
+                       "start": offset,
+                       "end": offset + duration,
+                       "synthtime": r["synthtime"]})
+        offset += duration
+    waveform = Waveform()
+    waveform.samples = np.concatenate([r["samples"] for r in chunkresults])
+    waveform.samplerate = samplerate
+    waveform.channels = 1
+    utt["waveform"] = waveform
+    utt["chunks"] = chunks
+    return utt
+
+def synthesize_document(voicefn, text, nprocs=None, synthparms=None, breakpuncts=SENTENCEBREAK_PUNCTS):
+    """Split `text` and synthesize chunks using `nprocs` worker
+       processes (defaults to the number of CPUs) each loading the
+       voice in `voicefn`. Returns an Utterance (see `assemble`)...
+    """
+    chunktexts = split_text(text, breakpuncts)
+    if not chunktexts:
+        raise ttslab.SynthesisError("No text to synthesize")
+    jobs = [(i, chunktext, synthparms) for i, chunktext in enumerate(chunktexts)]
+    starttime = time.time()
+    if nprocs == 1:
+        init_worker(voicefn)
+        results = [synth_chunk(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(nprocs, initializer=init_worker, initargs=(voicefn,))
+        try:
+            results = pool.map(synth_chunk, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    utt = assemble(results)
+    utt["synthtime"] = time.time() - starttime
+    return utt
+
+
+if __name__ == "__main__":
+    import sys, codecs, argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('voicefn', metavar='VOICEFN', type=str, help="Voice file (pickle format)")
+    parser.add_argument('textfn', metavar='TEXTFN', type=str, help="Input text file (UTF-8)")
+    parser.add_argument('wavfn', metavar='WAVFN', type=str, help="Output wave file")
+    parser.add_argument('--nprocs', dest='nprocs', type=int, default=None, help="Number of worker processes")
+    parser.add_argument('--phrases', dest='phrases', action='store_true', help="Split at phrase breaks instead of sentences")
+    parser.set_defaults(phrases=False)
+    args = parser.parse_args()
+
+    with codecs.open(args.textfn, encoding="utf-8") as infh:
+        text = infh.read()
+    if args.phrases:
+        breakpuncts = PHRASEBREAK_PUNCTS
+    else:
+        breakpuncts = SENTENCEBREAK_PUNCTS
+    utt = synthesize_document(args.voicefn, text, nprocs=args.nprocs, breakpuncts=breakpuncts)
+    utt["waveform"].write(args.wavfn)
+    for i, chunk in enumerate(utt["chunks"]):
+        line = "%s\t%.3f\t%.3f\t%.3f\t%s" % (i, chunk["start"], chunk["end"], chunk["synthtime"], chunk["text"])
+        print(line.encode("utf-8"), file=sys.stderr)
+    print("TOTAL: %.3fs audio in %.3fs" % (utt["chunks"][-1]["end"], utt["synthtime"]), file=sys.stderr)
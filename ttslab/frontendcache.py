@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Cache of front-end results for repeated prompts: utterances at the
+   "text-to-segments" and "text-to-feats" stage boundaries are stored
+   in serialized (pickled) form, keyed by voice, stage and the
+   standardized text, so that each hit gives a fresh Utterance. Least
+   recently used entries are evicted when the cache is full and
+   entries older than "ttl" seconds are discarded.
+
+   Enable for a DefaultVoice instance with:
+
+       voice.frontendcache = FrontendCache(maxsize=1024, ttl=3600)
+
+   The same cache may be shared by several voices.
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import time
+import uuid
+import weakref
+import threading
+from collections import OrderedDict
+try:
+    import cPickle as pickle #Py2
+except ImportError:
+    import pickle
+
+SEGMENTS_STAGE = "text-to-segments"
+FEATS_STAGE = "text-to-feats"
+
+#stages (latest first) that may be restored for each process:
+LOOKUP_STAGES = {"text-to-segments": [SEGMENTS_STAGE],
+                 "text-to-feats": [FEATS_STAGE, SEGMENTS_STAGE],
+                 "text-to-wave": [FEATS_STAGE, SEGMENTS_STAGE]}
+
+def synthparms_key(synthparms):
+    """Hashable representation of synthesis parameters...
+    """
+    if synthparms is None:
+        return None
+    if isinstance(synthparms, dict):
+        return repr(sorted(synthparms.items()))
+    return repr(synthparms)
+
+
+class FrontendCache(object):
+    """LRU cache (with optional time-to-live) of serialized
+       utterances...
+    """
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._init_cache()
+
+    def _init_cache(self):
+        self._entries = OrderedDict() #key -> (timestamp, serialized utt)
+        self._nbytes = 0
+        self._voiceids = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __getstate__(self):
+        """Only the configuration is pickled (e.g. with a voice), the
+           cache starts empty...
+        """
+        return {"maxsize": self.maxsize, "ttl": self.ttl}
+
+    def __setstate__(self, state):
+        self.maxsize = state["maxsize"]
+        self.ttl = state["ttl"]
+        self._init_cache()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def voice_id(self, voice):
+        """Identity of a voice instance (only valid while it exists)...
+        """
+        with self._lock:
+            voiceid = self._voiceids.get(voice)
+            if voiceid is None:
+                voiceid = uuid.uuid4().hex
+                self._voiceids[voice] = voiceid
+        return voiceid
+
+    def key(self, voice, stage, text, synthparms=None):
+        if stage == SEGMENTS_STAGE:
+            synthparms = None #not used up to this stage
+        return (self.voice_id(voice), stage, text, synthparms_key(synthparms))
+
+    def _remove(self, key):
+        timestamp, data = self._entries.pop(key)
+        self._nbytes -= len(data)
+
+    def _get(self, key, count=True):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and self.ttl is not None and time.time() - entry[0] > self.ttl:
+                self._nbytes -= len(entry[1])
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return None
+            self._entries[key] = entry #most recently used
+            if count:
+                self.hits += 1
+            return entry[1]
+
+    def get(self, key):
+        """Return serialized utterance or None (counted as hit or
+           miss)...
+        """
+        return self._get(key)
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time(), data)
+            self._nbytes += len(data)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def expire(self):
+        """Discard all entries older than ttl...
+        """
+        if self.ttl is None:
+            return
+        with self._lock:
+            now = time.time()
+            for key, (timestamp, data) in list(self._entries.items()):
+                if now - timestamp > self.ttl:
+                    self._remove(key)
+                    self.expirations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self):
+        return {"size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "nbytes": self._nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations}
+
+    #### Used by Voice.process:
+    def lookup(self, voice, utt, processname, synthparms=None):
+        """Find the latest cached stage for processname given utt with
+           standardized "text". Returns (stage, utt) with a restored
+           Utterance (features of utt are kept) or (None, utt). Counted
+           as one hit or miss...
+        """
+        stages = LOOKUP_STAGES.get(processname, [])
+        for stage in stages:
+            data = self._get(self.key(voice, stage, utt["text"], synthparms), count=False)
+            if data is not None:
+                with self._lock:
+                    self.hits += 1
+                cachedutt = pickle.loads(data)
+                cachedutt.features.update(utt.features)
+                return stage, cachedutt
+        if stages:
+            with self._lock:
+                self.misses += 1
+        return None, utt
+
+    def store(self, voice, utt, stage, synthparms=None):
+        self.put(self.key(voice, stage, utt["text"], synthparms),
+                 pickle.dumps(utt, protocol=2))
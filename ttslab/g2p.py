@@ -12,12 +12,53 @@ __email__ = "dvn.demitasse@gmail.com"
 import codecs
 import re
 
+STDIN_BATCHSIZE = 1000 #words predicted (and printed) together by the command line interfaces
+
 class NoRuleFound(Exception):
     pass
 
 class GraphemeNotDefined(Exception):
     pass
 
+def unique_words(words):
+    """ Words without duplicates (in order of first occurrence)...
+    """
+    seen = set()
+    return [word for word in words if not (word in seen or seen.add(word))]
+
+def map_unique(func, words, skip_errors=False):
+    """ Apply func once per unique word and return results (copied
+        phoneme lists) for all words. If skip_errors, words that
+        cannot be converted give None instead of raising...
+    """
+    words = list(words)
+    predicted = {}
+    for word in unique_words(words):
+        try:
+            predicted[word] = func(word)
+        except Exception:
+            if not skip_errors:
+                raise
+            predicted[word] = None
+    return [None if predicted[word] is None else list(predicted[word]) for word in words]
+
+def batched_words(infh, batchsize=STDIN_BATCHSIZE):
+    """ Words (stripped lines) read from "infh" (e.g. sys.stdin) in
+        lists of at most "batchsize", one at a time if "infh" is a
+        terminal...
+    """
+    if infh.isatty():
+        batchsize = 1
+    batch = []
+    for line in iter(infh.readline, b""): #Py2: not `for line in infh` (reads ahead)
+        batch.append(unicode(line, encoding="utf-8").strip())
+        if len(batch) >= batchsize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 class G2P(object):
     """Abstract class just to define the required interface...
     """
@@ -26,6 +67,13 @@ class G2P(object):
         """
         raise NotImplementedError
 
+    def predict_words(self, words, skip_errors=False):
+        """ Takes an iterable of strings and returns a list of phoneme
+            lists (each word is converted once). If skip_errors, words
+            that cannot be converted give None instead of raising...
+        """
+        return map_unique(self.predict_word, words, skip_errors)
+
     def __call__(self, word):
         return self.predict_word(word)
 
@@ -39,9 +87,10 @@ if __name__ == "__main__":
     with open(args.modelfn) as infh:
         g2p = pickle.load(infh)
 
-    for line in sys.stdin:
-        word = unicode(line, encoding="utf-8").strip()
-        try:
-            print("{} {}".format(word, " ".join(g2p.predict_word(word))).encode("utf-8"))
-        except Exception as e:
-            print("WARNING: '{}' not converted".format(word).encode("utf-8"), file=sys.stderr)
+    for words in batched_words(sys.stdin):
+        for word, phones in zip(words, g2p.predict_words(words, skip_errors=True)):
+            if phones is not None:
+                print("{} {}".format(word, " ".join(phones)).encode("utf-8"))
+            else:
+                print("WARNING: '{}' not converted".format(word).encode("utf-8"), file=sys.stderr)
+        sys.stdout.flush()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Memoizing wrapper for any G2P (or syllabifying G2PS) model: keeps
+   the most recently predicted pronunciations in a bounded LRU cache
+   which can be dumped to and reloaded from file, e.g. next to the
+   voice pickle so that a restarted server starts warm:
+
+       voice.pronun["main"]["g2p"] = CachedG2P(voice.pronun["main"]["g2p"],
+                                               cachefn="voice.pickle.g2pcache")
+       ...
+       voice.pronun["main"]["g2p"].dump()
+
+   When pickled (e.g. with a voice) only the wrapped model and
+   configuration are kept, the cache is reloaded from "cachefn" (if it
+   exists) when unpickled. A relative "cachefn" is then relative to
+   the directory of the voice file (see ttslab.loaddir). A cache file
+   that cannot be read is ignored (logged), the cache starts empty.
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+try:
+    import cPickle as pickle #Py2
+except ImportError:
+    import pickle
+
+import ttslab
+import ttslab.g2p as g2p
+
+CACHEFILE_VERSION = 1
+
+log = logging.getLogger(__name__)
+
+def model_fingerprint(model):
+    """Hash of the pickled model when wrapped (kept when pickled), a
+       dumped cache is only reloaded for the same model...
+    """
+    return hashlib.sha1(pickle.dumps(model, protocol=2)).hexdigest()
+
+def _freeze(pronun):
+    """Immutable copy of a list of phones or syllables (lists of
+       phones)...
+    """
+    return tuple(tuple(e) if isinstance(e, list) else e for e in pronun)
+
+def _thaw(pronun):
+    return [list(e) if isinstance(e, tuple) else e for e in pronun]
+
+
+class CachedG2P(g2p.G2P):
+    """LRU cache of pronunciations predicted by the wrapped model...
+    """
+    def __init__(self, model, maxsize=10000, cachefn=None):
+        self.model = model
+        self.maxsize = maxsize
+        self.cachefn = cachefn
+        self.cachepath = cachefn #cachefn resolved when unpickled
+        self.fingerprint = model_fingerprint(model)
+        self._init_cache()
+
+    def _init_cache(self):
+        self._entries = OrderedDict() #word -> frozen pronunciation
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+        return {"model": self.model,
+                "maxsize": self.maxsize,
+                "cachefn": self.cachefn,
+                "fingerprint": self.fingerprint}
+
+    def __setstate__(self, d):
+        self.model = d["model"]
+        self.maxsize = d["maxsize"]
+        self.cachefn = d["cachefn"]
+        self.fingerprint = d["fingerprint"]
+        self.cachepath = self.cachefn
+        if self.cachefn is not None and not os.path.isabs(self.cachefn) and ttslab.loaddir() is not None:
+            self.cachepath = os.path.join(ttslab.loaddir(), self.cachefn)
+        self._init_cache()
+        if self.cachepath is not None and os.path.exists(self.cachepath):
+            try:
+                self.load()
+            except (IOError, OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError) as e:
+                log.warning("Ignoring G2P cache file %s (%s)" % (self.cachepath, e))
+                self.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, word):
+        with self._lock:
+            pronun = self._entries.pop(word, None)
+            if pronun is None:
+                self.misses += 1
+                return None
+            self._entries[word] = pronun #most recently used
+            self.hits += 1
+            return pronun
+
+    def _put(self, word, pronun):
+        with self._lock:
+            self._entries.pop(word, None)
+            self._entries[word] = _freeze(pronun)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def predict_word(self, word):
+        pronun = self._get(word)
+        if pronun is None:
+            pronun = self.model.predict_word(word)
+            self._put(word, pronun)
+            return pronun
+        return _thaw(pronun)
+
+    def predict_words(self, words, skip_errors=False):
+        """Cache misses are predicted in one batch by the wrapped
+           model...
+        """
+        words = list(words)
+        predicted = {}
+        missing = []
+        for word in g2p.unique_words(words):
+            pronun = self._get(word)
+            if pronun is None:
+                missing.append(word)
+            else:
+                predicted[word] = pronun
+        if missing:
+            for word, pronun in zip(missing, self.model.predict_words(missing, skip_errors)):
+                if pronun is not None:
+                    self._put(word, pronun)
+                    pronun = _freeze(pronun)
+                predicted[word] = pronun
+        return [None if predicted[word] is None else _thaw(predicted[word]) for word in words]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions}
+
+    def dump(self, fn=None):
+        """Save cache entries (least recently used first), the file is
+           replaced atomically...
+        """
+        fn = fn or self.cachepath
+        with self._lock:
+            entries = list(self._entries.items())
+        fd, tmpfn = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(fn)))
+        try:
+            with os.fdopen(fd, "wb") as outfh:
+                pickle.dump((CACHEFILE_VERSION, self.fingerprint, entries), outfh, protocol=2)
+            os.rename(tmpfn, fn)
+        except:
+            if os.path.exists(tmpfn):
+                os.remove(tmpfn)
+            raise
+
+    def load(self, fn=None):
+        """Add entries from a dumped cache, returns False if the file
+           was dumped for a different model (or format)...
+        """
+        fn = fn or self.cachepath
+        with open(fn, "rb") as infh:
+            version, fingerprint, entries = pickle.load(infh)
+        if version != CACHEFILE_VERSION or fingerprint != self.fingerprint:
+            return False
+        with self._lock:
+            for word, pronun in entries[-self.maxsize:]:
+                self._entries.pop(word, None)
+                self._entries[word] = pronun
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return True
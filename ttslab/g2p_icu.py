@@ -16,6 +16,8 @@ import icu  # Debian/Ubuntu: apt-get install python-pyicu
 
 
 class G2P_ICURules(g2p.G2P):
+    BATCH_SEPARATOR = "\n" #predict_words transliterates words joined with this (set to None for one call per word)
+
     def __init__(self, phonesfn, rulesfn):
         with codecs.open(phonesfn, encoding="utf-8") as infh:
             phones = infh.read().split()
@@ -38,9 +40,25 @@ class G2P_ICURules(g2p.G2P):
         pronun = self.transliterator.transliterate(word)
         return [e.group(0) for e in self.phonesre.finditer(pronun)]
 
+    def predict_words(self, words, skip_errors=False):
+        """ Transliterate all unique words in one call (the rules
+            should not have contexts spanning BATCH_SEPARATOR)...
+        """
+        words = list(words)
+        sep = self.BATCH_SEPARATOR
+        uniquewords = g2p.unique_words(words)
+        if not sep or any(sep in word for word in uniquewords):
+            return g2p.map_unique(self.predict_word, words, skip_errors)
+        pronuns = self.transliterator.transliterate(sep.join(uniquewords)).split(sep)
+        if len(pronuns) != len(uniquewords):  #separator not preserved by rules
+            return g2p.map_unique(self.predict_word, words, skip_errors)
+        predicted = dict(zip(uniquewords, pronuns))
+        return [[e.group(0) for e in self.phonesre.finditer(predicted[word])] for word in words]
+
 
 if __name__ == "__main__":
     import sys
+    import ttslab.g2p_icu
 
     try:
         phonesfn = sys.argv[1]
@@ -49,7 +67,8 @@ if __name__ == "__main__":
         print("USAGE: g2p_icu.py PHONESFN RULESFN")
         sys.exit(1)
 
-    g2p = G2P_ICURules(phonesfn, rulesfn)
-    for line in sys.stdin:
-        word = unicode(line.strip(), encoding="utf-8")
-        print("{}\t{}".format(word, " ".join(g2p.predict_word(word))).encode("utf-8"))
+    g2p = ttslab.g2p_icu.G2P_ICURules(phonesfn, rulesfn)
+    for words in ttslab.g2p.batched_words(sys.stdin):
+        for word, phones in zip(words, g2p.predict_words(words)):
+            print("{}\t{}".format(word, " ".join(phones)).encode("utf-8"))
+        sys.stdout.flush()
@@ -36,6 +36,15 @@ class G2P_JSM(g2p.G2P):
             print("FATAL:", word.encode("utf-8"))
             raise
 
+    def predict_words(self, words, skip_errors=False):
+        """ One translation per unique word...
+        """
+        translator = self.translator
+        if self.gmap is not None:
+            gmap = self.gmap
+            return g2p.map_unique(lambda word: translator(word.translate(gmap)), words, skip_errors)
+        return g2p.map_unique(translator, words, skip_errors)
+
 
 if __name__ == "__main__":
     import sys, codecs, argparse, pickle
@@ -67,10 +76,10 @@ if __name__ == "__main__":
     if args.dumpmodel:
         print(pickle.dumps(g2p))
     else:
-        for line in sys.stdin:
-            word = unicode(line, encoding="utf-8").strip()
-            try:
-                print("{}\t{}".format(word, " ".join(g2p.predict_word(word))).encode("utf-8"))
-            except Exception as e:
-                print("WARNING: '{}' not converted".format(word), file=sys.stderr)
-                print(e, file=sys.stderr)
+        for words in ttslab.g2p.batched_words(sys.stdin):
+            for word, phones in zip(words, g2p.predict_words(words, skip_errors=True)):
+                if phones is not None:
+                    print("{}\t{}".format(word, " ".join(phones)).encode("utf-8"))
+                else:
+                    print("WARNING: '{}' not converted".format(word), file=sys.stderr)
+            sys.stdout.flush()
@@ -52,6 +52,22 @@ class G2P_LSTM(g2p.G2P):
         else:
             raise Exception("G2P Error")
 
+    def predict_words(self, words, skip_errors=False):
+        """ Decode the unique words in one call to the model (empty
+            transcriptions are failures, see G2P.predict_words)...
+        """
+        words = list(words)
+        unique = g2p.unique_words(words)
+        predicted = {}
+        for word, s in zip(unique, self.model.decode(unique)):
+            if s:
+                predicted[word] = s.split()
+            elif skip_errors:
+                predicted[word] = None
+            else:
+                raise Exception("G2P Error: %s" % word)
+        return [None if predicted[word] is None else list(predicted[word]) for word in words]
+
 
 if __name__ == "__main__":
     import sys, argparse, pickle
@@ -67,9 +83,10 @@ if __name__ == "__main__":
         with open(args.dumpmodel, "wb") as outfh:
             pickle.dump(g2p, outfh, protocol=2)
     else:
-        for line in sys.stdin:
-            word = unicode(line, encoding="utf-8").strip()
-            try:
-                print("{}\t{}".format(word, " ".join(g2p.predict_word(word))).encode("utf-8"))
-            except Exception as e:
-                print("WARNING: '{}' not converted".format(word), file=sys.stderr)
+        for words in ttslab.g2p.batched_words(sys.stdin):
+            for word, phones in zip(words, g2p.predict_words(words, skip_errors=True)):
+                if phones is not None:
+                    print("{}\t{}".format(word, " ".join(phones)).encode("utf-8"))
+                else:
+                    print("WARNING: '{}' not converted".format(word), file=sys.stderr)
+            sys.stdout.flush()
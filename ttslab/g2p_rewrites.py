@@ -44,7 +44,131 @@ class RewriteRule(object):
                 return False
         #Both match..
         return True
-        
+
+
+REGEX_METACHARS = set(".^$*+?{}[]\\|()")
+
+class ContextTrie(object):
+    """ Trie over rule contexts (read outwards from the grapheme) in
+        which each node holds bitmasks (bit i is rule i in the sorted
+        rulelist) of the rules ending at the node ("term") and in the
+        subtree below it ("subtree")...
+    """
+    def __init__(self):
+        self.root = [{}, 0, 0]
+
+    def add(self, context, ruleindex):
+        bit = 1 << ruleindex
+        node = self.root
+        node[2] |= bit
+        for c in context:
+            node = node[0].setdefault(c, [{}, 0, 0])
+            node[2] |= bit
+        node[1] |= bit
+
+    def freeze(self):
+        """ Convert nodes to tuples (children, term, subtree) for
+            faster lookup...
+        """
+        def _freeze(node):
+            return (dict((c, _freeze(child)) for c, child in node[0].items()), node[1], node[2])
+        self.root = _freeze(self.root)
+
+    def match(self, context):
+        """ Mask of rules matching context (read outwards from the
+            grapheme). As in RewriteRule.match, a rule context longer
+            than the given context matches if it agrees up to the end
+            of the given context...
+        """
+        node = self.root
+        mask = node[1]
+        for c in context:
+            node = node[0].get(c)
+            if node is None:
+                return mask
+            mask |= node[1]
+        return mask | node[2]
+
+
+class CompiledRewrites(object):
+    """ Compiled form of a ruleset and gnulls: left and right context
+        tries per grapheme and a single pass for gnulls where this
+        gives the same result as applying them one by one...
+    """
+    def __init__(self, ruleset, gnulls):
+        self.rules = {}
+        for g, rulelist in ruleset.items():
+            lefttrie = ContextTrie()
+            righttrie = ContextTrie()
+            for i, rule in enumerate(rulelist):
+                lefttrie.add(rule.leftcontext[::-1], i)
+                righttrie.add(rule.rightcontext, i)
+            lefttrie.freeze()
+            righttrie.freeze()
+            self.rules[g] = (lefttrie, righttrie, [rule.phoneme for rule in rulelist])
+        self.gnulls = list((gnulls or {}).items()) #same order as G2P_Rewrites.apply_gnulls
+        self.gnulls_re = None
+        if self.gnulls and self._gnulls_independent(self.gnulls):
+            keys = sorted((k for k, v in self.gnulls), key=len, reverse=True)
+            self.gnulls_map = dict(self.gnulls)
+            self.gnulls_re = re.compile("|".join(map(re.escape, keys)))
+        else:
+            self.gnulls_compiled = [(re.compile(k), v) for k, v in self.gnulls]
+
+    @staticmethod
+    def _gnulls_independent(gnulls):
+        """ True if all gnulls are literal strings that can neither
+            overlap each other nor create or destroy each other's
+            matches when replaced, so that a single combined pass is
+            equivalent to sequential re.sub...
+        """
+        def overlaps(a, b):
+            """ Can an occurrence of b overlap one of a?
+            """
+            if a in b or b in a:
+                return True
+            for n in range(1, min(len(a), len(b))):
+                if a[-n:] == b[:n] or b[-n:] == a[:n]:
+                    return True
+            return False
+        for k, v in gnulls:
+            if not k or REGEX_METACHARS.intersection(k) or "\\" in v:
+                return False
+        for k1, v1 in gnulls:
+            for k2, v2 in gnulls:
+                if k1 == k2:
+                    continue
+                if overlaps(k1, k2) or overlaps(v1, k2):
+                    return False
+        return True
+
+    def apply_gnulls(self, word):
+        if self.gnulls_re is not None:
+            return self.gnulls_re.sub(lambda m: self.gnulls_map[m.group(0)], word)
+        for pattern, repl in self.gnulls_compiled:
+            word = pattern.sub(repl, word)
+        return word
+
+    def predict_word(self, word):
+        phones = []
+        rules = self.rules
+        n = len(word)
+        for i in range(1, n - 1): #excluding whitespace..
+            g = word[i]
+            try:
+                lefttrie, righttrie, phonemes = rules[g]
+            except KeyError:
+                raise g2p.GraphemeNotDefined("Word: " + word + " Grapheme: " + g)
+            mask = lefttrie.match(word[i-1::-1])
+            if mask:
+                mask &= righttrie.match(word[i+1:])
+            if not mask:
+                raise g2p.NoRuleFound#(lc + " " + g + " " + rc)
+            phoneme = phonemes[(mask & -mask).bit_length() - 1] #first matching rule
+            if phoneme:               #phoneme can be "" meaning no phone (pnull)
+                phones.append(phoneme)
+        return phones
+
 
 class G2P_Rewrites(g2p.G2P):
     """ Class to contain and implement the application of rewrite
@@ -52,14 +176,36 @@ class G2P_Rewrites(g2p.G2P):
 
         ruleset is a dict of lists where the each list contains all
         RewriteRules associated with a specific grapheme...
+
+        Rules and gnulls are compiled (see CompiledRewrites) on first
+        use, call compile() after modifying them directly...
     """
     WHITESPACE_CHAR = "#"
+    COMPILED = True #use CompiledRewrites (same output as the linear rule search)
 
     def __init__(self):
         self.features = {}
         self.ruleset = {}
         self.gnulls = {}
 
+    def __getstate__(self):
+        """ The compiled form is recreated on first use...
+        """
+        d = self.__dict__.copy()
+        d.pop("_compiled", None)
+        return d
+
+    def compile(self):
+        self._compiled = CompiledRewrites(self.ruleset, self.gnulls)
+        return self._compiled
+
+    @property
+    def compiled(self):
+        compiled = self.__dict__.get("_compiled")
+        if compiled is None:
+            compiled = self.compile()
+        return compiled
+
     def sort_rules(self):
         """ Make sure that all rulelists associated with each grapheme
         are sorted in the correct order for application (i.e. from
@@ -68,23 +214,49 @@ class G2P_Rewrites(g2p.G2P):
         """
         for g in self.ruleset:
             self.ruleset[g].sort(key=lambda x: x.ordinal, reverse=True)
+        self._compiled = None
 
     def apply_gnulls(self, word):
         """ Apply gnulls to word if applicable...
         """
         if self.gnulls:
+            if self.COMPILED:
+                return self.compiled.apply_gnulls(word)
             for gnull in self.gnulls:
                 word = re.sub(gnull, self.gnulls[gnull], word)
         return word
-    
+
     def predict_word(self, word):
         """ Predict phone sequence given word...
         """
-        phones = []
+        if not self.COMPILED:
+            return self.predict_word_linear(word)
         #append and prepend whitespace_char
         word = word.join([self.WHITESPACE_CHAR, self.WHITESPACE_CHAR])
         #apply gnulls
         word = self.apply_gnulls(word)
+        return self.compiled.predict_word(word)
+
+    def predict_words(self, words, skip_errors=False):
+        if not self.COMPILED:
+            return g2p.map_unique(self.predict_word_linear, words, skip_errors)
+        compiled = self.compiled
+        wrap = self.WHITESPACE_CHAR
+        if self.gnulls:
+            return g2p.map_unique(lambda word: compiled.predict_word(compiled.apply_gnulls(word.join([wrap, wrap]))),
+                                  words, skip_errors)
+        return g2p.map_unique(lambda word: compiled.predict_word(word.join([wrap, wrap])), words, skip_errors)
+
+    def predict_word_linear(self, word):
+        """ Predict phone sequence given word by trying each rule in
+            turn (reference implementation)...
+        """
+        phones = []
+        #append and prepend whitespace_char
+        word = word.join([self.WHITESPACE_CHAR, self.WHITESPACE_CHAR])
+        #apply gnulls
+        for gnull in self.gnulls:
+            word = re.sub(gnull, self.gnulls[gnull], word)
         #find matching rule and thus phoneme for each grapheme..
         for i in list(range(len(word)))[1:-1]: #excluding whitespace..
             lc, g, rc = [word[:i], word[i], word[i+1:]]
@@ -152,6 +324,7 @@ class G2P_Rewrites_Semicolon(G2P_Rewrites):
                 else:
                     mapping[a] = b
         self.gnulls = mapping
+        self._compiled = None
 
     def load_ruleset_semicolon(self, filelocation, wchar=G2P_Rewrites.WHITESPACE_CHAR):
         """ Load rules from semicolon delimited format
@@ -183,6 +356,7 @@ class G2P_Rewrites_Semicolon(G2P_Rewrites):
         for grapheme in self.ruleset:
             for rule in self.ruleset[grapheme]:
                 rule.phoneme = self.phonemap[rule.phoneme]
+        self._compiled = None
 
     def map_graphs(self):
         """Apply self.graphmap to all graphemes in self.ruleset and
@@ -204,6 +378,7 @@ class G2P_Rewrites_Semicolon(G2P_Rewrites):
                         gk = re.sub(k, v, gk)
                         gv = re.sub(k, v, gv)
                         self.gnulls.update({gk: gv})
+        self._compiled = None
 
 if __name__ == "__main__":
     import sys, argparse, pickle
@@ -231,9 +406,10 @@ if __name__ == "__main__":
     if args.dumpmodel:
         print(pickle.dumps(g2p))
     else:
-        for line in sys.stdin:
-            word = unicode(line, encoding="utf-8").strip()
-            try:
-                print("{}\t{}".format(word, " ".join(g2p.predict_word(word))).encode("utf-8"))
-            except Exception as e:
-                print("WARNING: '{}' not converted".format(word), file=sys.stderr)
+        for words in ttslab.g2p.batched_words(sys.stdin):
+            for word, phones in zip(words, g2p.predict_words(words, skip_errors=True)):
+                if phones is not None:
+                    print("{}\t{}".format(word, " ".join(phones)).encode("utf-8"))
+                else:
+                    print("WARNING: '{}' not converted".format(word), file=sys.stderr)
+            sys.stdout.flush()
@@ -6,6 +6,8 @@
 """
 from __future__ import unicode_literals, division, print_function #Py2
 
+import ttslab.g2p as g2p
+
 
 class G2PS(object):
     def predict_word(self, word):
@@ -13,6 +15,13 @@ class G2PS(object):
         """
         raise NotImplementedError
 
+    def predict_words(self, words, skip_errors=False):
+        """Output a list of syllabified pronunciations (each word is
+           converted once), None for failures if skip_errors
+        """
+        predicted = g2p.map_unique(self.predict_word, words, skip_errors)
+        return [None if syllables is None else [list(syl) for syl in syllables] for syllables in predicted]
+
     def __call__(self, word):
         return self.predict_word(word)
 
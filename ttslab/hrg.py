@@ -9,9 +9,28 @@ from __future__ import unicode_literals, division, print_function #Py2
 __author__ = "Daniel van Niekerk"
 __email__ = "dvn.demitasse@gmail.com"
 
+import ast
+import operator
+import threading
+
 class DuplicateItemInRelation(Exception):
     pass
 
+
+def _slots(*attrnames):
+    """ Native string attribute names for __slots__...
+    """
+    return tuple(str(attrname) for attrname in attrnames)
+
+def _setdictstate(obj, state):
+    """ Restores state from the __dict__ of pickles made before
+        __slots__ were used (attributes not in __slots__ are
+        ignored)...
+    """
+    for attrname in obj.__slots__:
+        if attrname in state:
+            setattr(obj, attrname, state[attrname])
+
 class ItemContent(object):
     """ Stores the actual features of an Item and keeps track of Items
         belonging to specific Relations...
@@ -19,9 +38,20 @@ class ItemContent(object):
         This class essentially exists so that actual content referred
         to by Items can be shared by Items in different Relations.
     """
+    __slots__ = _slots("features", "relations")
+
     def __init__(self):
         self.features = {}
         self.relations = {}
+
+    def __getstate__(self):
+        return (self.features, self.relations)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            _setdictstate(self, state)
+        else:
+            self.features, self.relations = state
     
     def add_item_relation(self, item):
         """ Adds the given item to the set of relations. Whenever an
@@ -60,6 +90,10 @@ class ItemContent(object):
 class Item(object):
     """ Represents a node in a Relation...
     """
+    __slots__ = _slots("relation", "content",
+                       "next_item", "prev_item", "parent_item",
+                       "first_daughter", "last_daughter")
+
     def __init__(self, relation, itemcontent):
         self.relation = relation
         self.content = itemcontent
@@ -73,6 +107,17 @@ class Item(object):
         self.first_daughter = None
         self.last_daughter = None
 
+    def __getstate__(self):
+        """ Links to other Items are restored by the Relation (see
+            Relation.__getstate__)...
+        """
+        return (self.relation, self.content)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            _setdictstate(self, state)
+        else:
+            self.relation, self.content = state
         
     def __eq__(self, item):
         """ Determines if the shared contents of the two items are the
@@ -94,11 +139,13 @@ class Item(object):
         """ Sets the specific feature in itemcontent.
         """
         self.content.features[featname] = feat
+        self.relation.utterance._index = None
 
     def __delitem__(self, featname):
         """ Deletes the specific feature in itemcontent.
         """
         del self.content.features[featname]
+        self.relation.utterance._index = None
     
     def __iter__(self):
         """ Iterate over features.
@@ -115,6 +162,9 @@ class Item(object):
             and the corresponding ItemContent if no other Items are
             referencing it....
         """
+        self.relation.utterance._index = None
+        if self.parent_item is None:
+            self.relation._toplevel_changed(-1)
         #fix pointers:
         if self.relation.head_item is self:
             self.relation.head_item = self.next_item
@@ -169,6 +219,7 @@ class Item(object):
             if item is None then creates new ItemContent...
         """
         newitem = self._create_related_item(item)
+        self.relation.utterance._index = None
 
         #if first daughter...
         if self.first_daughter is None:
@@ -195,6 +246,9 @@ class Item(object):
                 newitem = self.relation.append_item(item)
         else:                                       #is inserted in the middle of list...
             newitem = self._create_related_item(item)
+            self.relation.utterance._index = None
+            if self.parent_item is None:
+                self.relation._toplevel_changed(1)
 
             self.next_item.prev_item = newitem
             newitem.next_item = self.next_item
@@ -207,6 +261,9 @@ class Item(object):
         """ Prepends an item in this list before this item.
         """
         newitem = self._create_related_item(item)
+        self.relation.utterance._index = None
+        if self.parent_item is None:
+            self.relation._toplevel_changed(1)
                 
         if self.prev_item is None:                  #then is first item in containing list...            
             if self.parent_item is not None:        #then is daughter..
@@ -313,6 +370,9 @@ class Relation(object):
     """ Represents an ordered set of Items and their associated
         children.
     """
+    __slots__ = _slots("name", "utterance", "head_item", "tail_item",
+                       "_nitems", "_itemarray")
+
     def __init__(self, utterance, relationname):
 
         self.name = relationname
@@ -321,32 +381,102 @@ class Relation(object):
         self.head_item = None
         self.tail_item = None
 
+        self._nitems = 0        #number of top-level Items
+        self._itemarray = None  #list of top-level Items (built when indexing)
 
-    def __iter__(self):
-        self.iterstart = True
-        return self
+    def _toplevel_changed(self, delta):
+        """ Called when a top-level Item is added (delta=1) or removed
+            (delta=-1)...
+        """
+        if self._nitems is not None:
+            self._nitems += delta
+        self._itemarray = None
 
-    def __next__(self):
-        if self.iterstart:
-            self.curr_item = self.head_item
-            self.iterstart = False
-        else:
-            self.curr_item = self.curr_item.next_item
-        if self.curr_item is None:
-            self.iterstart = True
-            raise StopIteration
-        return self.curr_item
+    def __getstate__(self):
+        """ Items are pickled as a flat list (in pre-order) with the
+            index of each Item's parent (-1 for top-level Items),
+            avoiding deep recursion along the links between Items...
+        """
+        items = []
+        parents = []
+        stack = [] #next siblings to continue with after daughters
+        item = self.head_item
+        parentidx = -1
+        while True:
+            while item is not None:
+                items.append(item)
+                parents.append(parentidx)
+                if item.first_daughter is not None:
+                    stack.append((item.next_item, parentidx))
+                    parentidx = len(items) - 1
+                    item = item.first_daughter
+                else:
+                    item = item.next_item
+            if not stack:
+                break
+            item, parentidx = stack.pop()
+        return (self.name, self.utterance, items, parents)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict): #older pickles (Items have links)
+            _setdictstate(self, state)
+            self._nitems = None #counted when needed (Items not restored yet)
+            self._itemarray = None
+            return
+        self.name, self.utterance, items, parents = state
+        self.head_item = None
+        self.tail_item = None
+        self._nitems = parents.count(-1)
+        self._itemarray = None
+        for item, parentidx in zip(items, parents):
+            item.next_item = None
+            item.first_daughter = None
+            item.last_daughter = None
+            if parentidx < 0:
+                parent = None
+                prev = self.tail_item
+                if prev is None:
+                    self.head_item = item
+                self.tail_item = item
+            else:
+                parent = items[parentidx]
+                prev = parent.last_daughter
+                if prev is None:
+                    parent.first_daughter = item
+                parent.last_daughter = item
+            if prev is not None:
+                prev.next_item = item
+            item.prev_item = prev
+            item.parent_item = parent
+
+    def __iter__(self):
+        """ Iterate over top-level Items (each call returns a new
+            generator, so iteration is reentrant)...
+        """
+        item = self.head_item
+        while item is not None:
+            yield item
+            item = item.next_item
 
     def __len__(self):
-        c = 0
-        for i in self:
-            c += 1
-        return c
-
-### PYTHON2 ###
-    def next(self):
-        return self.__next__()
-### PYTHON2 ###
+        if self._nitems is None:
+            c = 0
+            item = self.head_item
+            while item is not None:
+                c += 1
+                item = item.next_item
+            self._nitems = c
+        return self._nitems
+
+    def __getitem__(self, index):
+        """ Top-level Item(s) by index or slice (slices return a
+            list)...
+        """
+        itemarray = self._itemarray
+        if itemarray is None:
+            itemarray = list(self)
+            self._itemarray = itemarray
+        return itemarray[index]
         
     def append_item(self, item=None):
         """ Adds a new item to this relation.
@@ -356,6 +486,7 @@ class Relation(object):
         else:
             #create new Item sharing content...
             newitem = Item(self, item.content)
+        self.utterance._index = None
 
         #if head item...
         if self.head_item is None:
@@ -367,6 +498,7 @@ class Relation(object):
             
         newitem.next_item = None
         self.tail_item = newitem
+        self._toplevel_changed(1)
 
         return newitem
 
@@ -400,8 +532,16 @@ class Utterance(object):
         """
         self.features = {}
         self.relations = {}
+        self._index = None
         if voicetype:
             self.features["voicetype"] = voicetype
+
+    def __getstate__(self):
+        """ The index refers to Items by id and is not pickled.
+        """
+        d = self.__dict__.copy()
+        d.pop("_index", None)
+        return d
         
     def __getitem__(self, featname):
         """ Returns the requested feature.
@@ -436,6 +576,7 @@ class Utterance(object):
         """
         newrelation = Relation(self, relationname)
         self.relations[relationname] = newrelation
+        self._index = None
         return newrelation
 
     def get_relation(self, relationname):
@@ -444,6 +585,17 @@ class Utterance(object):
         if relationname in self.relations:
             return self.relations[relationname]
         return None
+
+    def get_index(self):
+        """ Returns the UtteranceIndex for the current state of this
+            utterance, any change to Items or their features discards
+            the index and it is rebuilt on the next call.
+        """
+        index = self.__dict__.get("_index")
+        if index is None:
+            index = UtteranceIndex(self)
+            self._index = index
+        return index
    
     def __str__(self):
         """ This is a temporary method to sensibly convert object to
@@ -455,6 +607,139 @@ class Utterance(object):
             lines += ["\t" + line for line in str(self.get_relation(relationname)).splitlines()]
         return "\n".join(lines)
 
+class UtteranceIndex(object):
+    """ Positions of Items in sequences (and counts of features along
+        these) precomputed in one linear pass over a relation when
+        first needed. Sequences are identified by a "kind":
+
+           ("relation", relationname): top-level Items in relation
+           ("daughters", relationname): daughters of each Item in relation
+           ("phrasesyls", None): syllables (in SylStructure) of each
+                                 Phrase item
+
+        Lookups return None when an item is not in the index, so that
+        callers can fall back to traversing the HRG.
+    """
+    def __init__(self, utt):
+        self.utt = utt
+        self.sequences = {}
+        self.featcounts = {}
+        self.featdists = {}
+
+    def _build(self, kind):
+        name, relationname = kind
+        seqs = []
+        owners = {}
+        if name == "phrasesyls":
+            relation = self.utt.get_relation("Phrase")
+            if relation is not None:
+                for phraseitem in relation:
+                    syls = []
+                    for worditem in phraseitem.get_daughters():
+                        worditem = worditem.get_item_in_relation("SylStructure")
+                        if worditem is not None:
+                            syls.extend(worditem.get_daughters())
+                    owners[id(phraseitem)] = len(seqs)
+                    seqs.append(syls)
+        else:
+            relation = self.utt.get_relation(relationname)
+            if relation is not None:
+                if name == "relation":
+                    seqs.append(relation.as_list())
+                elif name == "daughters":
+                    stack = relation.as_list()
+                    while stack:
+                        parent = stack.pop()
+                        daughters = parent.get_daughters()
+                        if daughters:
+                            owners[id(parent)] = len(seqs)
+                            seqs.append(daughters)
+                            stack.extend(daughters)
+                else:
+                    raise ValueError(kind)
+        positions = {}
+        for seqi, seq in enumerate(seqs):
+            for i, item in enumerate(seq):
+                positions[id(item)] = (seqi, i)
+        self.sequences[kind] = (seqs, positions, owners)
+        return self.sequences[kind]
+
+    def _get(self, kind):
+        try:
+            return self.sequences[kind]
+        except KeyError:
+            return self._build(kind)
+
+    def position(self, kind, item):
+        """ Returns (index, sequence length) or None.
+        """
+        seqs, positions, owners = self._get(kind)
+        try:
+            seqi, i = positions[id(item)]
+        except KeyError:
+            return None
+        return i, len(seqs[seqi])
+
+    def seqlen(self, kind, owner):
+        """ Returns the length of sequence belonging to owner or None.
+        """
+        seqs, positions, owners = self._get(kind)
+        try:
+            return len(seqs[owners[id(owner)]])
+        except KeyError:
+            return None
+
+    def count_feat(self, kind, item, feat, featvalue, before=True):
+        """ Number of Items before (or after) item in its sequence with
+            'feat' = 'featvalue' or None.
+        """
+        seqs, positions, owners = self._get(kind)
+        try:
+            seqi, i = positions[id(item)]
+        except KeyError:
+            return None
+        key = (kind, seqi, feat, featvalue)
+        try:
+            counts = self.featcounts[key]
+        except KeyError:
+            counts = [0]
+            for e in seqs[seqi]:
+                counts.append(counts[-1] + int(e[feat] == featvalue))
+            self.featcounts[key] = counts
+        if before:
+            return counts[i]
+        return counts[-1] - counts[i + 1]
+
+    def dist_feat(self, kind, item, feat, featvalue, prev=True):
+        """ The number of Items from item to the previous (or next)
+            Item in its sequence with 'feat' = 'featvalue' (0 if no
+            such item) or None.
+        """
+        seqs, positions, owners = self._get(kind)
+        try:
+            seqi, i = positions[id(item)]
+        except KeyError:
+            return None
+        key = (kind, seqi, feat, featvalue, prev)
+        try:
+            dists = self.featdists[key]
+        except KeyError:
+            seq = seqs[seqi]
+            if prev:
+                order = range(len(seq))
+            else:
+                order = range(len(seq) - 1, -1, -1)
+            dists = [0] * len(seq)
+            last = None
+            for j in order:
+                if last is not None:
+                    dists[j] = abs(j - last)
+                e = seq[j]
+                if feat in e and e[feat] == featvalue:
+                    last = j
+            self.featdists[key] = dists
+        return dists[i]
+
 # Convenience functions for HRG traversal... should be moved to
 # ifuncs.py once pytts.extend has been improved...
 ############################################################
@@ -478,33 +763,87 @@ def last_item(item):
         return item
 
 
+#### Path traversal:
+#########################
+#Path strings are compiled once into a tuple of step callables
+#(operator.attrgetter etc.) and kept in a bounded cache (cleared when
+#full). Lookups do not lock (dict.get is atomic), the lock is only
+#taken to insert.
+TRAVERSE_CACHE_SIZE = 1024
+_traverse_cache = {}
+_traverse_cache_lock = threading.Lock()
+
+TRAVERSE_ATTRSTEPS = {"n": "next_item",
+                      "p": "prev_item",
+                      "parent": "parent_item",
+                      "daughter": "first_daughter",
+                      "daughtern": "last_daughter"}
+TRAVERSE_METHODSTEPS = {"first": "first_item",
+                        "last": "last_item"}
+
+def _compile_methodstep(expr):
+    """ Compile the "M:" step expression, e.g. "num_daughters()" or
+        "numsylsbeforesyl_inphrase('tone', '1')"; arguments should be
+        literals, anything else is compiled as an expression...
+    """
+    if "(" not in expr:
+        return operator.attrgetter(str(expr))
+    name, argstring = expr.split("(", 1)
+    argstring = argstring.rstrip()
+    if argstring.endswith(")"):
+        argstring = argstring[:-1].strip()
+        try:
+            args = ast.literal_eval("(%s,)" % argstring) if argstring else ()
+            if isinstance(args, tuple):
+                return operator.methodcaller(str(name.strip()), *args)
+        except (ValueError, SyntaxError):
+            pass
+    code = compile("item.%s" % expr, "<traverse>", "eval")
+    return lambda item: eval(code, globals(), {"item": item})
+
+def compile_path(pathstring):
+    """ Parse pathstring into a tuple of callables, each taking the
+        current item and returning the next...
+    """
+    steps = []
+    for step in pathstring.split("."):
+        if step.startswith("R:") or step.startswith("F:") or step.startswith("M:"):
+            a, b = step.split(":")
+            if a == "R":
+                steps.append(operator.methodcaller("get_item_in_relation", b))
+            elif a == "F":
+                steps.append(operator.itemgetter(b))
+            else:
+                steps.append(_compile_methodstep(b))
+        elif step in TRAVERSE_ATTRSTEPS:
+            steps.append(operator.attrgetter(str(TRAVERSE_ATTRSTEPS[step])))
+        else:
+            steps.append(operator.methodcaller(str(TRAVERSE_METHODSTEPS[step])))
+    return tuple(steps)
+
+def get_compiled_path(pathstring):
+    """ Return compiled pathstring from the cache (compiling if
+        necessary)...
+    """
+    steps = _traverse_cache.get(pathstring)
+    if steps is None:
+        steps = compile_path(pathstring)
+        with _traverse_cache_lock:
+            if len(_traverse_cache) >= TRAVERSE_CACHE_SIZE:
+                _traverse_cache.clear()
+            _traverse_cache[pathstring] = steps
+    return steps
+
 def traverse(item, pathstring):
     """ pathstring e.g.
         "n.R:SylStructure.parent.p.daughter.last.daughtern.first.F:name"
 
-        TO BE IMPROVED!!! DEMITASSE: this seems to break with special strings (unicode issue...)
+        Returns None if the path cannot be followed...
     """
-    mapping = {"n": ".next_item",
-               "p": ".prev_item",
-               "parent": ".parent_item",
-               "daughter": ".first_daughter",
-               "daughtern": ".last_daughter",
-               "first": ".first_item()",
-               "last": ".last_item()",
-               "R": ".get_item_in_relation('%s')",
-               "F": "['%s']",
-               "M": ".%s"
-               }
-    pathlist = pathstring.split(".")
-    cmdstring = "item"
-    for step in pathlist:
-        if step.startswith("R:") or step.startswith("F:") or step.startswith("M:"):
-            a, b = step.split(":")
-            cmdstring += mapping[a] % b
-        else:
-            cmdstring += mapping[step]
     try:
-        return eval(cmdstring)
+        for step in get_compiled_path(pathstring):
+            item = step(item)
+        return item
     except (TypeError, AttributeError):
         return None
 
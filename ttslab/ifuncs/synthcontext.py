@@ -2,6 +2,10 @@
 """Implements a number of functions used to produce the contextual
     information necessary to create models for synthesis... e.g. to
     produce HTS labels...
+
+    Positions and counts are looked up in the utterance's index
+    (hrg.UtteranceIndex) where possible, falling back to traversing
+    the HRG for Items not covered by the index.
 """
 from __future__ import unicode_literals, division, print_function #Py2
 
@@ -9,11 +13,38 @@ __author__ = "Daniel van Niekerk"
 __email__ = "dvn.demitasse@gmail.com"
 
 
+PHRASESYLS = ("phrasesyls", None)
+
+def _index(item):
+    return item.relation.utterance.get_index()
+
+def _dist(item, feat, featvalue, prev):
+    """ Fallback for UtteranceIndex.dist_feat
+    """
+    count = 1
+    if prev:
+        nextitem = item.prev_item
+    else:
+        nextitem = item.next_item
+    while nextitem:
+        if feat in nextitem:
+            if nextitem[feat] == featvalue:
+                return count
+        count += 1
+        if prev:
+            nextitem = nextitem.prev_item
+        else:
+            nextitem = nextitem.next_item
+    return 0
+
 def itempos_inparent_f(item, relation):
     item = item.get_item_in_relation(relation)
     if item is None:
         return 0
     else:
+        pos = _index(item).position(("daughters", relation), item)
+        if pos is not None:
+            return pos[0] + 1
         return item.parent_item.get_daughters().index(item) + 1
 
 def itempos_inparent_b(item, relation):
@@ -21,6 +52,9 @@ def itempos_inparent_b(item, relation):
     if item is None:
         return 0
     else:
+        pos = _index(item).position(("daughters", relation), item)
+        if pos is not None:
+            return pos[1] - pos[0]
         l = item.parent_item.get_daughters()
         return len(l) - l.index(item)
 
@@ -34,6 +68,9 @@ def syllistsylstructrel_inphrase(phraseitem):
     return l
 
 def numsyls_inphrase(phraseitem):
+    n = _index(phraseitem).seqlen(PHRASESYLS, phraseitem)
+    if n is not None:
+        return n
     return len(syllistsylstructrel_inphrase(phraseitem))
 
 
@@ -62,6 +99,9 @@ def sylpos_inphrase_f(sylitem):
     """ position of the current syllable in the current phrase (forward)
     """
     sylitem = sylitem.get_item_in_relation("SylStructure")
+    pos = _index(sylitem).position(PHRASESYLS, sylitem)
+    if pos is not None:
+        return pos[0] + 1
     phraseitem = sylitem.traverse("parent.R:Phrase.parent")
     if phraseitem is None:
         return 0
@@ -73,6 +113,9 @@ def sylpos_inphrase_b(sylitem):
     """ position of the current syllable in the current phrase (backward)
     """
     sylitem = sylitem.get_item_in_relation("SylStructure")
+    pos = _index(sylitem).position(PHRASESYLS, sylitem)
+    if pos is not None:
+        return pos[1] - pos[0]
     phraseitem = sylitem.traverse("parent.R:Phrase.parent")
     if phraseitem is None:
         return 0
@@ -85,6 +128,9 @@ def numsylsbeforesyl_inphrase(sylitem, feat, featvalue):
         current phrase with 'feat' = 'featvalue'
     """
     sylitem = sylitem.get_item_in_relation("SylStructure")
+    count = _index(sylitem).count_feat(PHRASESYLS, sylitem, feat, featvalue, before=True)
+    if count is not None:
+        return count
     phraseitem = sylitem.traverse("parent.R:Phrase.parent")
     if phraseitem is None:
         return 0
@@ -98,6 +144,9 @@ def numsylsaftersyl_inphrase(sylitem, feat, featvalue):
         current phrase with 'feat' = 'featvalue'
     """
     sylitem = sylitem.get_item_in_relation("SylStructure")
+    count = _index(sylitem).count_feat(PHRASESYLS, sylitem, feat, featvalue, before=False)
+    if count is not None:
+        return count
     phraseitem = sylitem.traverse("parent.R:Phrase.parent")
     if phraseitem is None:
         return 0
@@ -111,66 +160,49 @@ def syldistprev_inword(sylitem, feat, featvalue):
         previous syllable with 'feat' = 'featvalue'
     """
     sylitem = sylitem.get_item_in_relation("SylStructure")
-    count = 1
-    nextsyl = sylitem.prev_item 
-    while nextsyl:
-        if feat in nextsyl:
-            if nextsyl[feat] == featvalue:
-                return count
-        count += 1
-        nextsyl = nextsyl.prev_item
-    return 0
+    dist = _index(sylitem).dist_feat(("daughters", "SylStructure"), sylitem, feat, featvalue, prev=True)
+    if dist is not None:
+        return dist
+    return _dist(sylitem, feat, featvalue, prev=True)
 
 def syldistnext_inword(sylitem, feat, featvalue):
     """ the number of syllables from the current syllable to the
         next syllable with 'feat' = 'featvalue'
     """
     sylitem = sylitem.get_item_in_relation("SylStructure")
-    count = 1
-    nextsyl = sylitem.next_item 
-    while nextsyl:
-        if feat in nextsyl:
-            if nextsyl[feat] == featvalue:
-                return count
-        count += 1
-        nextsyl = nextsyl.next_item
-    return 0
+    dist = _index(sylitem).dist_feat(("daughters", "SylStructure"), sylitem, feat, featvalue, prev=False)
+    if dist is not None:
+        return dist
+    return _dist(sylitem, feat, featvalue, prev=False)
 
 def syldistprev(sylitem, feat, featvalue):
     """ the number of syllables from the current syllable to the
         previous syllable with 'feat' = 'featvalue'
     """
     sylitem = sylitem.get_item_in_relation("Syllable")
-    count = 1
-    nextsyl = sylitem.prev_item 
-    while nextsyl:
-        if feat in nextsyl:
-            if nextsyl[feat] == featvalue:
-                return count
-        count += 1
-        nextsyl = nextsyl.prev_item
-    return 0
+    dist = _index(sylitem).dist_feat(("relation", "Syllable"), sylitem, feat, featvalue, prev=True)
+    if dist is not None:
+        return dist
+    return _dist(sylitem, feat, featvalue, prev=True)
 
 def syldistnext(sylitem, feat, featvalue):
     """ the number of syllables from the current syllable to the
         next syllable with 'feat' = 'featvalue'
     """
     sylitem = sylitem.get_item_in_relation("Syllable")
-    count = 1
-    nextsyl = sylitem.next_item 
-    while nextsyl:
-        if feat in nextsyl:
-            if nextsyl[feat] == featvalue:
-                return count
-        count += 1
-        nextsyl = nextsyl.next_item
-    return 0
+    dist = _index(sylitem).dist_feat(("relation", "Syllable"), sylitem, feat, featvalue, prev=False)
+    if dist is not None:
+        return dist
+    return _dist(sylitem, feat, featvalue, prev=False)
 
 
 def wordpos_inphrase_f(worditem):
     """ position of the current word in the current phrase (forward)
     """
     worditem = worditem.get_item_in_relation("Phrase")
+    pos = _index(worditem).position(("daughters", "Phrase"), worditem)
+    if pos is not None:
+        return pos[0] + 1
     phraseitem = worditem.parent_item
     wordlist = phraseitem.get_daughters()
     return wordlist.index(worditem) + 1
@@ -180,6 +212,9 @@ def wordpos_inphrase_b(worditem):
     """ position of the current word in the current phrase (backward)
     """
     worditem = worditem.get_item_in_relation("Phrase")
+    pos = _index(worditem).position(("daughters", "Phrase"), worditem)
+    if pos is not None:
+        return pos[1] - pos[0]
     phraseitem = worditem.parent_item
     wordlist = phraseitem.get_daughters()
     return len(wordlist) - wordlist.index(worditem)
@@ -190,6 +225,9 @@ def numwordsbeforeword_inphrase(worditem, feat, featvalue):
         current phrase with 'feat' = 'featvalue'
     """
     worditem = worditem.get_item_in_relation("Phrase")
+    count = _index(worditem).count_feat(("daughters", "Phrase"), worditem, feat, featvalue, before=True)
+    if count is not None:
+        return count
     phraseitem = worditem.parent_item
     wordlist = phraseitem.get_daughters()
 
@@ -202,6 +240,9 @@ def numwordsafterword_inphrase(worditem, feat, featvalue):
         current phrase with 'feat' = 'featvalue'
     """
     worditem = worditem.get_item_in_relation("Phrase")
+    count = _index(worditem).count_feat(("daughters", "Phrase"), worditem, feat, featvalue, before=False)
+    if count is not None:
+        return count
     phraseitem = worditem.parent_item
     wordlist = phraseitem.get_daughters()
 
@@ -214,15 +255,10 @@ def worddistprev(worditem, feat, featvalue):
         previous word with 'feat' = 'featvalue'
     """
     worditem = worditem.get_item_in_relation("Word")
-    count = 1
-    nextword = worditem.prev_item 
-    while nextword:
-        if feat in nextword:
-            if nextword[feat] == featvalue:
-                return count
-        count += 1
-        nextword = nextword.prev_item
-    return 0
+    dist = _index(worditem).dist_feat(("relation", "Word"), worditem, feat, featvalue, prev=True)
+    if dist is not None:
+        return dist
+    return _dist(worditem, feat, featvalue, prev=True)
 
 
 def worddistnext(worditem, feat, featvalue):
@@ -230,20 +266,18 @@ def worddistnext(worditem, feat, featvalue):
         next word with 'feat' = 'featvalue'
     """
     worditem = worditem.get_item_in_relation("Word")
-    count = 1
-    nextword = worditem.next_item 
-    while nextword:
-        if feat in nextword:
-            if nextword[feat] == featvalue:
-                return count
-        count += 1
-        nextword = nextword.next_item
-    return 0
+    dist = _index(worditem).dist_feat(("relation", "Word"), worditem, feat, featvalue, prev=False)
+    if dist is not None:
+        return dist
+    return _dist(worditem, feat, featvalue, prev=False)
 
 
 def phrasepos_inutt_f(phraseitem):
     """ position of the current phrase in utterance (forward)
     """
+    pos = _index(phraseitem).position(("relation", "Phrase"), phraseitem)
+    if pos is not None:
+        return pos[0] + 1
     phraselist = phraseitem.relation.utterance.get_relation("Phrase").as_list()
     return phraselist.index(phraseitem) + 1
 
@@ -251,6 +285,9 @@ def phrasepos_inutt_f(phraseitem):
 def phrasepos_inutt_b(phraseitem):
     """ position of the current phrase in utterance (backward)
     """
+    pos = _index(phraseitem).position(("relation", "Phrase"), phraseitem)
+    if pos is not None:
+        return pos[1] - pos[0]
     phraselist = phraseitem.relation.utterance.get_relation("Phrase").as_list()
     return len(phraselist) - phraselist.index(phraseitem)
 
@@ -390,9 +390,38 @@ def simple_langclass_words(owner, utt, args=None):
                         word["lang"] = k
     return utt
 
-def word_to_phones(word_item, phoneset, pronunaddendum, pronundict, g2p, syllabify_func, syltonestress_func):
+def in_pronundicts(word_item, pronunaddendum, pronundict):
+    """Will word_to_phones find the word in `pronunaddendum` or
+       `pronundict`?
+    """
+    if pronunaddendum and pronunaddendum.contains(word_item["name"]):
+        return True
+    return pronundict.contains(word_item["name"], word_item["pos"]) or pronundict.contains(word_item["name"])
+
+def predict_missing_words(owner, word_items):
+    """Predict pronunciations of all words not found in pronunciation
+       dictionaries, with one G2P.predict_words call per language.
+       Returns a dict per language mapping words to phones (None if
+       it could not be converted)...
+    """
+    missing = {}
+    for word_item in word_items:
+        lang = word_item["lang"] or "main"
+        pronun_resources = owner.pronun[lang]
+        if not in_pronundicts(word_item, pronun_resources["pronunaddendum"], pronun_resources["pronundict"]):
+            missing.setdefault(lang, []).append(word_item["name"])
+    predicted = {}
+    for lang, words in missing.items():
+        g2p = owner.pronun[lang]["g2p"]
+        predicted[lang] = dict(zip(words, g2p.predict_words(words, skip_errors=True)))
+    return predicted
+
+def word_to_phones(word_item, phoneset, pronunaddendum, pronundict, g2p, syllabify_func, syltonestress_func, g2pphones=None):
     """Process of lookup in dictionaries, g2p and syllabification and
        determination of syllable stress/tone... we just call it "tone"
+
+       g2pphones may contain phones already predicted for words not
+       in the dictionaries (see predict_missing_words)...
     """
     syltones = None #also for "sylstress"
     syllables = None
@@ -414,7 +443,11 @@ def word_to_phones(word_item, phoneset, pronunaddendum, pronundict, g2p, syllabi
             phones = pd.pron_lookup(word_item["name"])
     else:  #word not in PD
         try:
-            phones = g2p.predict_word(word_item["name"])
+            phones = None
+            if g2pphones:
+                phones = g2pphones.get(word_item["name"])
+            if phones is None:
+                phones = g2p.predict_word(word_item["name"])
         except (GraphemeNotDefined, NoRuleFound):
             warns = "WARNING: No pronunciation found for '%s'" % word_item["name"]
             print(warns.encode("utf-8"), file=sys.stderr)
@@ -435,6 +468,7 @@ def phonetize_words(owner, utt, args=None):
     syl_rel = utt.new_relation("Syllable")
     sylstruct_rel = utt.new_relation("SylStructure")
     seg_rel = utt.new_relation("Segment")
+    g2pphones = predict_missing_words(owner, utt.get_relation("Word"))
     for word_item in utt.get_relation("Word"):
         #determine pronun resources for this word
         if word_item["lang"]:
@@ -454,7 +488,8 @@ def phonetize_words(owner, utt, args=None):
                                              pronun_resources["pronundict"],
                                              pronun_resources["g2p"],
                                              syllabify_func,
-                                             syltonestress_func)
+                                             syltonestress_func,
+                                             g2pphones.get(word_item["lang"] or "main"))
         #rename phones:
         if word_item["lang"] and word_item["lang"] != "main":
             for syl in syllables:
@@ -575,6 +610,11 @@ class DefaultVoice(Voice):
             raise Exception("Process not defined in voice: %s", processname)
         if processname in ["text-to-words", "text-to-segments", "text-to-feats", "text-to-wave"]:
             utt = self.standardize_text(utt, args=self.PUNCT_TRANSTABLE)
+        #restore latest stage available from cache (if enabled):
+        cachedstage = None
+        if self.frontendcache is not None:
+            cachedstage, utt = self.frontendcache.lookup(self, utt, processname, synthparms)
+        if processname in ["text-to-words", "text-to-segments", "text-to-feats", "text-to-wave"] and cachedstage is None:
             utt = self.tokenize_text(utt)
             utt = self.normalize_tokens(utt) #also handles simple markup..
             utt = self.gpostag_words(utt)
@@ -582,15 +622,31 @@ class DefaultVoice(Voice):
             if hasattr(self, 'decomp_words'):
                 utt = self.decomp_words(utt)
             utt = self.phrasify_words(utt)
-        if processname in ["text-to-segments", "text-to-feats", "text-to-wave"]:
+        if processname in ["text-to-segments", "text-to-feats", "text-to-wave"] and cachedstage is None:
             utt = self.phonetize_words(utt)
             utt = self.phrasify_segments(utt, args=self.pronun["main"]["phoneset"].features["silence_phone"])
-        if processname in ["text-to-feats", "text-to-wave"]:
+            if self.frontendcache is not None:
+                self.frontendcache.store(self, utt, "text-to-segments")
+        if processname in ["text-to-feats", "text-to-wave"] and cachedstage != "text-to-feats":
             utt = self.synthesizer(utt, ("feats", synthparms))
+            if self.frontendcache is not None:
+                self.frontendcache.store(self, utt, "text-to-feats", synthparms)
         if processname in ["text-to-wave"]:
-            utt = self.synthesizer(utt, ("synth", synthparms))
+            if self.wavecache is None or not self.wavecache.restore(self, utt, synthparms):
+                utt = self.synthesizer(utt, ("synth", synthparms))
+                if self.wavecache is not None:
+                    self.wavecache.store(self, utt, synthparms)
         return utt
 
+    def synthesize_stream(self, inputstring, synthparms=None):
+        """Render the inputstring, yielding chunks of 16-bit samples as
+           they are synthesized (phrase by phrase if supported by the
+           synthesizer)...
+        """
+        utt = self.synthesize(inputstring, "text-to-feats", synthparms)
+        for samples in self.synthesizer.synth_stream(self, utt, synthparms):
+            yield samples
+
 #const data
 DefaultVoice.VALID_GRAPHS = VALID_GRAPHS
 DefaultVoice.VALID_PUNCTS = VALID_PUNCTS
@@ -620,6 +676,11 @@ DefaultVoice.phonetize_words = phonetize_words
 DefaultVoice.phrasify_words = phrasify_words
 DefaultVoice.phrasify_segments = phrasify_segments
 
+#optional cache of front-end results (see ttslab.frontendcache):
+DefaultVoice.frontendcache = None
+#optional on-disk store of synthesized waveforms (see ttslab.wavecache):
+DefaultVoice.wavecache = None
+
 
 if __name__ == "__main__":
     from ttslab.lang.default import DefaultVoice
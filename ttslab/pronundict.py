@@ -14,16 +14,120 @@
 
     -- Return None when entry not found instead of raising KeyError
 
+   Large dictionaries can be converted to a binary file
+   (PronunciationDictionary.tomappedfile) and used through
+   MappedPronunciationDictionary, which memory-maps the file so that
+   processes using the same dictionary share its pages.
 """
 from __future__ import unicode_literals, division, print_function #Py2
 
 __author__ = "Daniel van Niekerk"
 __email__ = "dvn.demitasse@gmail.com"
 
+import os
+import gc
 import sys
+import mmap
+import zlib
+import struct
 import codecs
+import marshal
+import hashlib
+import tempfile
+import multiprocessing
+from contextlib import contextmanager
 from collections import defaultdict
 
+import numpy as np
+
+PARSECACHE_VERSION = 1
+
+@contextmanager
+def _gc_disabled():
+    """Bulk creation of many small containers is much faster without
+       cyclic garbage collection passes...
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def _read_source(fn):
+    """Contents and identity (mtime and sha1) of a file...
+    """
+    with open(fn, "rb") as infh:
+        data = infh.read()
+    return data, (os.path.getmtime(fn), hashlib.sha1(data).hexdigest())
+
+def _load_parsecache(cachefn, source, key):
+    """Returns (prond, checked) from cachefn if it was saved for the
+       same source file contents and load options, else None...
+    """
+    if cachefn is None or not os.path.exists(cachefn):
+        return None
+    try:
+        with open(cachefn, "rb") as infh, _gc_disabled():
+            version, cachedsource, cachedkey, checked, prond, shared = marshal.loads(infh.read())
+    except Exception: #also different Python (marshal) version
+        return None
+    if version != PARSECACHE_VERSION or cachedsource != source or cachedkey != key:
+        return None
+    for word, tag in shared:
+        prond[word][None] = prond[word][tag]
+    return prond, checked
+
+def _save_parsecache(cachefn, source, key, checked, prond):
+    """Saved with marshal (much faster to load than pickle), which
+       does not keep shared entries (see fromtextfile): these are
+       listed separately...
+    """
+    if cachefn is None:
+        return
+    shared = []
+    for word, entries in prond.iteritems(): #Py2
+        if len(entries) > 1 and None in entries:
+            shared.extend((word, tag) for tag in entries if tag is not None and entries[tag] is entries[None])
+    fd, tmpfn = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(cachefn)))
+    try:
+        with os.fdopen(fd, "wb") as outfh:
+            outfh.write(marshal.dumps((PARSECACHE_VERSION, source, key, checked, prond, shared)))
+        os.rename(tmpfn, cachefn)
+    except:
+        if os.path.exists(tmpfn):
+            os.remove(tmpfn)
+        raise
+
+def _phonemap_key(phonemap):
+    return None if phonemap is None else sorted(phonemap.items())
+
+def _check_entries(items):
+    """Consistency check of a list of (word, {tag: entry}), returns
+       the first offending word (and exception) or None...
+    """
+    syllsums = {}
+    for word, entries in items:
+        try:
+            for tag in entries:
+                _pron, _tone, _syll = entries[tag]
+                if _syll:
+                    if _syll not in syllsums:
+                        syllsums[_syll] = sum(map(int, _syll))
+                    assert syllsums[_syll] == len(_pron.split())
+                if _tone:
+                    assert len(_tone) == len(_syll)
+        except Exception as e:
+            return word, e
+    return None
+
+_check_items = None #set for forked worker processes
+
+def _check_range(bounds):
+    with _gc_disabled():
+        return _check_entries(_check_items[bounds[0]:bounds[1]])
+
 class PronunciationDictionary(object):
     """Basic implementation...
     """
@@ -49,19 +153,28 @@ class PronunciationDictionary(object):
             return True
         return False
 
-    def __check_consistency(self):
-        """Assert that all info is consistent"""
-        try:
-            for word in self.prond:
-                for tag in self.prond[word]:
-                    _pron, _tone, _syll = self.prond[word][tag]
-                    if _syll:
-                        assert sum(map(int, _syll)) == len(_pron.split())
-                    if _tone:
-                        assert len(_tone) == len(_syll)
-        except Exception as e:
-            print("OFFENDING ENTRY:", word.encode("utf-8"), file=sys.stderr)
-            raise
+    def __check_consistency(self, nprocs=1):
+        """Assert that all info is consistent (using "nprocs" processes)"""
+        global _check_items
+        with _gc_disabled():
+            items = list(self.prond.items())
+            if nprocs > 1 and len(items) > nprocs:
+                chunksize = len(items) // nprocs + 1
+                _check_items = items #inherited by workers, not pickled
+                pool = multiprocessing.Pool(nprocs)
+                try:
+                    results = pool.map(_check_range, [(i, i + chunksize) for i in range(0, len(items), chunksize)])
+                finally:
+                    pool.close()
+                    pool.join()
+                    _check_items = None
+            else:
+                results = [_check_entries(items)]
+        for result in results:
+            if result is not None:
+                word, e = result
+                print("OFFENDING ENTRY:", word.encode("utf-8"), file=sys.stderr)
+                raise e
 
     def check_against_phoneset(self, phset):
         """check all dictionary entries are compatible with a specific
@@ -160,19 +273,35 @@ class PronunciationDictionary(object):
                     pron = pron
                 outfh.write(" ".join([word, str(tag), str(tone), str(syll), pron]) + "\n")
 
-    def fromsimpletextfile(self, fn, phonemap=None):
+    def tomappedfile(self, fn):
+        """Write in the binary format used by
+           MappedPronunciationDictionary...
+        """
+        write_mappedfile(self.prond, fn)
+
+    def fromsimpletextfile(self, fn, phonemap=None, cachefn=None):
         """ abandon q b a n d q n
+
+            If "cachefn" is given, the parsed result is saved there
+            and reused while the contents of "fn" do not change...
         """
-        prond = defaultdict(dict)
-        with codecs.open(fn, encoding="utf-8") as infh:
-            for line in infh:
+        data, source = _read_source(fn)
+        key = ("simple", _phonemap_key(phonemap))
+        cached = _load_parsecache(cachefn, source, key)
+        if cached is not None:
+            self.prond = cached[0]
+            return self
+        prond = {}
+        phonemap = phonemap.__getitem__ if phonemap else None
+        with _gc_disabled():
+            for line in data.decode("utf-8").splitlines():
                 fields = line.split()
-                word = fields[0]
-                phones = fields[1:]
                 if phonemap:
-                    phones = [phonemap[p] for p in phones]
-                prond[word][None] = [" ".join(phones), None, None]
-        self.prond = dict(prond)
+                    prond[fields[0]] = {None: [" ".join(map(phonemap, fields[1:])), None, None]}
+                else:
+                    prond[fields[0]] = {None: [" ".join(fields[1:]), None, None]}
+        self.prond = prond
+        _save_parsecache(cachefn, source, key, False, prond)
         return self
 
     def updatefromsimpledict(self, d):
@@ -184,30 +313,281 @@ class PronunciationDictionary(object):
             else:
                 self.prond[k][None] = [" ".join(d[k].split()), None, None]
 
-    def fromtextfile(self, fn, phonemap=None, nonestring="None"):
+    def fromtextfile(self, fn, phonemap=None, nonestring="None", check=True, nprocs=1, cachefn=None):
         """ abandon VERB 010 133 q b a n d q n
+
+            The consistency check is optional and may be run in
+            "nprocs" processes. If "cachefn" is given, the parsed
+            result is saved there and reused while the contents of
+            "fn" do not change...
         """
+        data, source = _read_source(fn)
+        key = ("text", _phonemap_key(phonemap), nonestring)
+        cached = _load_parsecache(cachefn, source, key)
+        if cached is not None:
+            self.prond, checked = cached
+            if check and not checked:
+                self.__check_consistency(nprocs)
+                _save_parsecache(cachefn, source, key, True, self.prond)
+            return self
         prond = defaultdict(dict)
-        with codecs.open(fn, encoding="utf-8") as infh:
-            for line in infh:
+        phonemap = phonemap.__getitem__ if phonemap else None
+        with _gc_disabled():
+            for line in data.decode("utf-8").splitlines():
                 fields = line.split()
-                word = fields[0]
-                tag = fields[1]
-                tones = fields[2]
+                word, tag, tones, sylls = fields[0], fields[1], fields[2], fields[3]
                 if tones == nonestring:
                     tones = None
-                sylls = fields[3]
                 if sylls == nonestring:
                     sylls = None
-                phones = fields[4:]
                 if phonemap:
-                    phones = [phonemap[p] for p in phones]
+                    entry = [" ".join(map(phonemap, fields[4:])), tones, sylls]
+                else:
+                    entry = [" ".join(fields[4:]), tones, sylls]
+                wordentries = prond[word]
                 if tag != nonestring:
-                    prond[word][tag] = [" ".join(phones), tones, sylls]
-                    if None not in prond[word]: #First tagged word will be retained as entry for "None" if no explicit untagged
-                        prond[word][None] = prond[word][tag]
+                    wordentries[tag] = entry
+                    if None not in wordentries: #First tagged word will be retained as entry for "None" if no explicit untagged
+                        wordentries[None] = entry
                 else:
-                    prond[word][None] = [" ".join(phones), tones, sylls]
+                    wordentries[None] = entry
         self.prond = dict(prond)
-        self.__check_consistency()
+        if check:
+            self.__check_consistency(nprocs)
+        _save_parsecache(cachefn, source, key, check, self.prond)
         return self
+
+
+######################################## BINARY (MEMORY-MAPPED) FORMAT
+## Header (MAPPED_HEADER) followed by sections (MAPPED_SECTIONS) at
+## 8-byte aligned offsets. Words are found through an open addressing
+## hash table (crc32 of UTF-8 word, linear probing) of word indices
+## (+1, 0 is empty). Phones, tags and tone/syllable strings are
+## interned and stored as IDs (tag 0 and string -1 represent None).
+
+MAPPED_MAGIC = b"TTSLABPD"
+MAPPED_VERSION = 1
+MAPPED_SECTIONS = [("phones", None),   #newline terminated strings
+                   ("tags", None),
+                   ("strings", None),
+                   ("buckets", "<u4"),  #hash table
+                   ("words", "<u4"),    #word i: (wordblob offset, first entry), i+1 gives the ends
+                   ("wordblob", None),
+                   ("entries", "<i4"),  #entry j: (tag, phoneids offset, tone, syllables), j+1 gives the end of phoneids
+                   ("phoneids", "<u2")]
+MAPPED_HEADER = struct.Struct(str("<8sIIII") + str("QQ") * len(MAPPED_SECTIONS))
+_BUCKET = struct.Struct(str("<I"))
+_WORDREC = struct.Struct(str("<IIII"))     #record i and i+1
+_ENTRYREC = struct.Struct(str("<iiiiii"))  #record j and phoneids offset of j+1
+
+def _hashword(key):
+    return zlib.crc32(key) & 0xffffffff
+
+def write_mappedfile(prond, fn):
+    """Write "prond" (as in PronunciationDictionary) to binary file...
+    """
+    words = sorted(prond)
+    phones = {}
+    tags = {None: 0}
+    strings = {}
+    def intern(table, s):
+        if s not in table:
+            table[s] = len(table)
+        return table[s]
+    wordkeys = [word.encode("utf-8") for word in words]
+    wordrecs = []
+    entries = []
+    phoneids = []
+    wordoff = 0
+    for word, key in zip(words, wordkeys):
+        wordrecs.append((wordoff, len(entries)))
+        wordoff += len(key)
+        for tag in sorted(prond[word], key=lambda t: (t is not None, t)): #None first
+            pron, tone, syll = prond[word][tag]
+            entries.append((intern(tags, tag),
+                            len(phoneids),
+                            -1 if tone is None else intern(strings, tone),
+                            -1 if syll is None else intern(strings, syll)))
+            phoneids.extend(intern(phones, ph) for ph in pron.split())
+    wordrecs.append((wordoff, len(entries)))
+    entries.append((0, len(phoneids), -1, -1))
+    assert len(phones) < 2**16 and len(tags) < 2**31
+    nbuckets = 1
+    while nbuckets < 2 * len(words):
+        nbuckets *= 2
+    buckets = np.zeros(nbuckets, dtype="<u4")
+    for i, key in enumerate(wordkeys):
+        b = _hashword(key) & (nbuckets - 1)
+        while buckets[b]:
+            b = (b + 1) & (nbuckets - 1)
+        buckets[b] = i + 1
+    def joined(table):
+        return "".join(k + "\n" for k, v in sorted(table.items(), key=lambda x: x[1]) if k is not None).encode("utf-8")
+    data = {"phones": joined(phones),
+            "tags": joined(tags),
+            "strings": joined(strings),
+            "buckets": buckets,
+            "words": wordrecs,
+            "wordblob": b"".join(wordkeys),
+            "entries": entries,
+            "phoneids": phoneids}
+    blobs = []
+    offset = MAPPED_HEADER.size
+    sectionoffs = []
+    for name, dtype in MAPPED_SECTIONS:
+        offset += -offset % 8
+        blob = data[name] if dtype is None else np.asarray(data[name], dtype=dtype).tostring()
+        sectionoffs.extend([offset, len(blob)])
+        blobs.append(blob)
+        offset += len(blob)
+    with open(fn, "wb") as outfh:
+        outfh.write(MAPPED_HEADER.pack(MAPPED_MAGIC, MAPPED_VERSION, len(words), len(entries) - 1, nbuckets, *sectionoffs))
+        for blob, sectionoff in zip(blobs, sectionoffs[::2]):
+            outfh.write(b"\0" * (sectionoff - outfh.tell()))
+            outfh.write(blob)
+
+
+class MappedPronunciationDictionary(PronunciationDictionary):
+    """Read-only dictionary backed by a memory-mapped binary file
+       (see write_mappedfile). Only the file name is pickled, the file
+       is mapped again when unpickled...
+    """
+    def __init__(self, fn):
+        self.fn = os.path.abspath(fn)
+        self._open()
+
+    def _open(self):
+        with open(self.fn, "rb") as infh:
+            self._mm = mmap.mmap(infh.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = MAPPED_HEADER.unpack_from(self._mm, 0)
+        magic, version, self._nwords, self._nentries, self._nbuckets = fields[:5]
+        if magic != MAPPED_MAGIC or version != MAPPED_VERSION:
+            raise ValueError("Not a mapped pronunciation dictionary (version %s): %s" % (MAPPED_VERSION, self.fn))
+        sections = dict((name, (offset, length)) for (name, dtype), offset, length
+                        in zip(MAPPED_SECTIONS, fields[5::2], fields[6::2]))
+        def strtable(name):
+            offset, length = sections[name]
+            return self._mm[offset:offset+length].decode("utf-8").split("\n")[:-1]
+        self._phones = strtable("phones")
+        self._tags = [None] + strtable("tags")
+        self._tagids = dict((tag, i) for i, tag in enumerate(self._tags))
+        self._strings = [None] + strtable("strings") #index + 1 (-1 is None)
+        self._bucketsoff = sections["buckets"][0]
+        self._wordsoff = sections["words"][0]
+        self._wordbloboff = sections["wordblob"][0]
+        self._entriesoff = sections["entries"][0]
+        self._phoneidsoff = sections["phoneids"][0]
+        self._lastword = (None, None)
+
+    def __getstate__(self):
+        return {"fn": self.fn}
+
+    def __setstate__(self, d):
+        self.fn = d["fn"]
+        self._open()
+
+    def __len__(self):
+        return self._nwords
+
+    def _word(self, i):
+        """(word key, first entry, end entry) of word i...
+        """
+        wordoff, entstart, wordend, entend = _WORDREC.unpack_from(self._mm, self._wordsoff + 8 * i)
+        return self._mm[self._wordbloboff+wordoff:self._wordbloboff+wordend], entstart, entend
+
+    def _find(self, word):
+        """Range of entries for word or None (the last word looked up is
+           remembered: word_to_phones does several lookups per word)...
+        """
+        lastword, entrange = self._lastword
+        if word == lastword:
+            return entrange
+        key = word.encode("utf-8")
+        mask = self._nbuckets - 1
+        b = _hashword(key) & mask
+        while True:
+            i = _BUCKET.unpack_from(self._mm, self._bucketsoff + 4 * b)[0]
+            if i == 0:
+                entrange = None
+                break
+            wordkey, entstart, entend = self._word(i - 1)
+            if wordkey == key:
+                entrange = (entstart, entend)
+                break
+            b = (b + 1) & mask
+        self._lastword = (word, entrange)
+        return entrange
+
+    def _find_entry(self, word, tag=None):
+        """(tag, phoneids offset, tone, syllables, phoneids end) or
+           None...
+        """
+        entrange = self._find(word)
+        if entrange is None:
+            return None
+        tagid = self._tagids.get(tag)
+        for j in range(*entrange):
+            entry = _ENTRYREC.unpack_from(self._mm, self._entriesoff + 16 * j)
+            if entry[0] == tagid:
+                return entry
+        return None
+
+    def _phonelist(self, entry):
+        n = entry[5] - entry[1]
+        phoneids = struct.unpack_from(str("<%dH" % n), self._mm, self._phoneidsoff + 2 * entry[1])
+        phones = self._phones
+        return [phones[p] for p in phoneids]
+
+    def _entrylist(self, entry):
+        return [" ".join(self._phonelist(entry)), self._strings[entry[2] + 1], self._strings[entry[3] + 1]]
+
+    @property
+    def prond(self):
+        """Complete nested dict (as in PronunciationDictionary), built
+           on each access: only for conversion/writing...
+        """
+        prond = {}
+        for i in range(self._nwords):
+            wordkey, entstart, entend = self._word(i)
+            word = wordkey.decode("utf-8")
+            prond[word] = {}
+            for j in range(entstart, entend):
+                entry = _ENTRYREC.unpack_from(self._mm, self._entriesoff + 16 * j)
+                prond[word][self._tags[entry[0]]] = self._entrylist(entry)
+        return prond
+
+    def __iter__(self):
+        for i in range(self._nwords):
+            yield self._word(i)[0].decode("utf-8")
+
+    def __contains__(self, word):
+        return self._find(word) is not None
+
+    def contains(self, word, tag=None):
+        if tag is not None:
+            return self._find_entry(word, tag) is not None
+        return self._find(word) is not None
+
+    def lookup(self, word, tag=None):
+        entry = self._find_entry(word, tag)
+        if entry is None:
+            return None
+        return self._entrylist(entry)
+
+    def pron_lookup(self, word, tag=None):
+        entry = self._find_entry(word, tag)
+        if entry is None:
+            return None
+        return self._phonelist(entry)
+
+    def syll_lookup(self, word, tag=None):
+        entry = self._find_entry(word, tag)
+        if entry is None or entry[3] < 0:
+            return None
+        return self._flatphones2nestedsyl(self._phonelist(entry), self._strings[entry[3] + 1])
+
+    def tone_lookup(self, word, tag=None):
+        entry = self._find_entry(word, tag)
+        if entry is None:
+            return None
+        return self._strings[entry[2] + 1]
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Versioned file format for voices, utterances and other ttslab
+   objects (used by ttslab.tofile and ttslab.fromfile):
+
+       header | pickle | buffers
+
+   The header holds a magic string, the format version, pickle
+   protocol, compression codec, section sizes and a SHA-1 hash of the
+   (uncompressed) content. The pickle is written with the highest
+   protocol and large numpy arrays (e.g. unit catalogue residuals and
+   LPC tracks) are stored out-of-band in the "buffers"
+   section, aligned so that uncompressed files are memory-mapped and
+   arrays are created without copying or unpickling the data.
+
+   Both sections can be compressed ("zstd" or "lz4" if the modules
+   are installed, otherwise "zlib" or "bz2" from the standard
+   library). Files without the magic string are loaded as plain
+   pickles by ttslab.fromfile.
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import bz2
+import zlib
+import mmap
+import struct
+import hashlib
+try:
+    import cPickle as pickle #Py2
+except ImportError:
+    import pickle
+try:
+    from cStringIO import StringIO as BytesIO #Py2
+except ImportError:
+    from io import BytesIO
+
+import numpy as np
+
+MAGIC = b"TTSLABSZ"
+FORMAT_VERSION = 1
+#magic, version, protocol, codec, pickle (stored, raw), buffers (stored, raw), sha1
+HEADER = struct.Struct(str("<8sII8sQQQQ20s4x")) #Py2
+ALIGN = 64
+OOB_MIN_BYTES = 1024 #smaller arrays are pickled in-band
+DEFAULT_CODEC = "none"
+
+class FormatError(Exception):
+    pass
+
+
+def _codecs():
+    """Available codecs: name -> (compress, decompress)...
+    """
+    codecs = {"none": (None, None),
+              "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+              "bz2": (bz2.compress, bz2.decompress)}
+    try:
+        import zstandard
+        codecs["zstd"] = (lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+                          lambda data: zstandard.ZstdDecompressor().decompress(data))
+    except ImportError:
+        pass
+    try:
+        import lz4.frame
+        codecs["lz4"] = (lz4.frame.compress, lz4.frame.decompress)
+    except ImportError:
+        pass
+    return codecs
+
+CODECS = _codecs()
+CODEC_FALLBACKS = {"zstd": "zlib", "lz4": "zlib"} #used when writing if not installed
+
+def resolve_codec(codec):
+    codec = codec or DEFAULT_CODEC
+    if codec not in CODECS:
+        codec = CODEC_FALLBACKS.get(codec, codec)
+    if codec not in CODECS:
+        raise ValueError("Unknown codec: %s (available: %s)" % (codec, ", ".join(sorted(CODECS))))
+    return codec
+
+def _aligned(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+class _Buffers(object):
+    """Collects out-of-band arrays while pickling...
+    """
+    def __init__(self, minbytes):
+        self.minbytes = minbytes
+        self.arrays = []  #C-contiguous arrays in file order
+        self.pids = {}    #id(array) -> persistent id
+        self.nbytes = 0
+
+    def persistent_id(self, obj):
+        if type(obj) is not np.ndarray or obj.dtype.hasobject or obj.nbytes < self.minbytes:
+            return None
+        pid = self.pids.get(id(obj))
+        if pid is None:
+            transposed = not obj.flags.c_contiguous and obj.flags.f_contiguous
+            arr = np.ascontiguousarray(obj.T if transposed else obj)
+            offset = _aligned(self.nbytes)
+            pid = (offset, arr.dtype.str, arr.shape, transposed)
+            self.pids[id(obj)] = pid
+            self.arrays.append((offset, obj, arr)) #keep obj alive: its id is in self.pids
+            self.nbytes = offset + arr.nbytes
+        return pid
+
+    def chunks(self):
+        """Section content as a sequence of buffers (including
+           alignment padding)...
+        """
+        pos = 0
+        for offset, obj, arr in self.arrays:
+            if offset > pos:
+                yield b"\0" * (offset - pos)
+            yield np.getbuffer(arr) if hasattr(np, "getbuffer") else memoryview(arr).cast("B") #Py2
+            pos = offset + arr.nbytes
+
+
+def dump(obj, fname, codec=None, protocol=pickle.HIGHEST_PROTOCOL, minbytes=OOB_MIN_BYTES):
+    """Write obj to file (see module doc), arrays of at least
+       "minbytes" are stored out-of-band...
+    """
+    codec = resolve_codec(codec)
+    compress = CODECS[codec][0]
+    buffers = _Buffers(minbytes)
+    outbuf = BytesIO()
+    pickler = pickle.Pickler(outbuf, protocol)
+    try:
+        pickler.inst_persistent_id = buffers.persistent_id #Py2: cPickle skips builtin types
+    except AttributeError:
+        pickler.persistent_id = buffers.persistent_id
+    pickler.dump(obj)
+    pickled = outbuf.getvalue()
+    h = hashlib.sha1(pickled)
+    chunks = list(buffers.chunks())
+    for chunk in chunks:
+        h.update(chunk)
+    if compress is not None:
+        pickled_stored = compress(pickled)
+        chunks = [compress(b"".join(bytes(chunk) for chunk in chunks))] if chunks else []
+    else:
+        pickled_stored = pickled
+    buffers_stored = sum(len(chunk) for chunk in chunks)
+    with open(fname, "wb") as outfh:
+        outfh.write(HEADER.pack(MAGIC, FORMAT_VERSION, protocol, codec.encode("ascii"),
+                                len(pickled_stored), len(pickled), buffers_stored, buffers.nbytes,
+                                h.digest()))
+        outfh.write(pickled_stored)
+        pos = HEADER.size + len(pickled_stored)
+        outfh.write(b"\0" * (_aligned(pos) - pos))
+        for chunk in chunks:
+            outfh.write(chunk)
+
+def read_header(infh):
+    """Returns the header fields as a dict, or None if the file is not
+       in this format...
+    """
+    data = infh.read(HEADER.size)
+    if len(data) < HEADER.size or not data.startswith(MAGIC):
+        return None
+    (magic, version, protocol, codec, pickled_stored, pickled_raw,
+     buffers_stored, buffers_raw, digest) = HEADER.unpack(data)
+    if version > FORMAT_VERSION:
+        raise FormatError("Unsupported format version %s (expected <= %s)" % (version, FORMAT_VERSION))
+    return {"version": version,
+            "protocol": protocol,
+            "codec": codec.rstrip(b"\0").decode("ascii"),
+            "pickle": (pickled_stored, pickled_raw),
+            "buffers": (buffers_stored, buffers_raw),
+            "sha1": digest}
+
+def isserialized(fname):
+    with open(fname, "rb") as infh:
+        return infh.read(len(MAGIC)) == MAGIC
+
+def load(fname, verify=False, use_mmap=True):
+    """Load object from file. If "verify", the content hash is checked.
+       Out-of-band arrays in uncompressed files are backed by a private
+       (copy-on-write) memory map if "use_mmap"...
+    """
+    with open(fname, "rb") as infh:
+        header = read_header(infh)
+        if header is None:
+            raise FormatError("Not a ttslab serialized file: %s" % fname)
+        if header["codec"] not in CODECS:
+            raise FormatError("Codec not available: %s" % header["codec"])
+        decompress = CODECS[header["codec"]][1]
+        pickled_stored, pickled_raw = header["pickle"]
+        buffers_stored, buffers_raw = header["buffers"]
+        pickled = infh.read(pickled_stored)
+        if decompress is not None:
+            pickled = decompress(pickled)
+        buffers_offset = _aligned(HEADER.size + pickled_stored)
+        if buffers_stored == 0:
+            buffers = b""
+        elif decompress is None and use_mmap:
+            buffers = mmap.mmap(infh.fileno(), 0, access=mmap.ACCESS_COPY)
+        else:
+            infh.seek(buffers_offset)
+            buffers = infh.read(buffers_stored)
+            if decompress is not None:
+                buffers = decompress(buffers)
+            buffers = bytearray(buffers) #writable arrays
+            buffers_offset = 0
+    if len(pickled) != pickled_raw:
+        raise FormatError("Truncated file: %s" % fname)
+    if verify:
+        h = hashlib.sha1(pickled)
+        if buffers_raw:
+            h.update(buffers[buffers_offset:buffers_offset + buffers_raw])
+        if h.digest() != header["sha1"]:
+            raise FormatError("Content hash mismatch: %s" % fname)
+    arrays = {} #persistent id -> array (preserves sharing)
+    dtypes = {}
+    def persistent_load(pid):
+        pid = tuple(pid)
+        arr = arrays.get(pid)
+        if arr is None:
+            offset, dtype, shape, transposed = pid
+            if dtype not in dtypes:
+                dtypes[dtype] = np.dtype(str(dtype)) #Py2
+            count = 1
+            for n in shape: #np.prod is slow for many small arrays
+                count *= n
+            arr = np.frombuffer(buffers, dtype=dtypes[dtype], count=count, offset=buffers_offset + offset)
+            if len(shape) != 1:
+                arr = arr.reshape(shape)
+            if transposed:
+                arr = arr.T
+            arrays[pid] = arr
+        return arr
+    unpickler = pickle.Unpickler(BytesIO(pickled))
+    unpickler.persistent_load = persistent_load
+    return unpickler.load()
+
+
+if __name__ == "__main__":
+    import sys, argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('infn', metavar='INFN', type=str, help="input file (pickle or serialized)")
+    parser.add_argument('outfn', metavar='OUTFN', type=str, nargs='?', help="output file (serialized)")
+    parser.add_argument('--codec', metavar='CODEC', type=str, default=DEFAULT_CODEC,
+                        help="compression (%s)" % ", ".join(sorted(CODECS)))
+    parser.add_argument('--verify', action='store_true', help="check content hash")
+    args = parser.parse_args()
+
+    import ttslab
+    with open(args.infn, "rb") as infh:
+        header = read_header(infh)
+    if header is not None:
+        print("version: %(version)s protocol: %(protocol)s codec: %(codec)s pickle: %(pickle)s buffers: %(buffers)s" % header,
+              file=sys.stderr)
+    if header is not None and args.verify:
+        load(args.infn, verify=True)
+    if args.outfn:
+        dump(ttslab.fromfile(args.infn), args.outfn, codec=args.codec)
@@ -25,6 +25,16 @@ class Synthesizer(UttProcessor):
     def synth(self, voice, utt, args):
         raise NotImplementedError
 
+    def synth_stream(self, voice, utt, args):
+        """Generator yielding chunks of 16-bit samples as they become
+           available, given an utterance on which `feats` has been
+           run. This default implementation simply yields the
+           complete waveform, back-ends capable of incremental
+           synthesis should override this.
+        """
+        utt = self.synth(voice, utt, args)
+        yield utt["waveform"].samples
+
     def process(self, voice, utt, args):
         """Our synthesiser implementation will generally perform two things:
            extract relevant _feats_ from the utterance and actually
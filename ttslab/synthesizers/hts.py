@@ -14,10 +14,17 @@ __author__ = "Daniel van Niekerk"
 __email__ = "dvn.demitasse@gmail.com"
 
 import os
+import threading
+
+import numpy as np
 
 import ttslab.synthesizer
 from ttslab.synthesizers.hts_labels import * #all feature funcs (p, a, b, ...) and htk number conversion
-from ttslab.synthesizers.htsengine_me_cffi import HTS_EngineME
+from ttslab.synthesizers import hts_labels_columnar
+from ttslab.synthesizers.htsengine_me_cffi import HTS_EngineME, HTS_EnginePool
+from ttslab.waveform import Waveform
+
+ENGINEPOOL_LOCK = threading.Lock() #guards lazy creation of engine pools
 
 class Synthesizer(ttslab.synthesizer.Synthesizer):
     """Simple HTS synthesizer implementation with "standard" labels. We
@@ -25,10 +32,49 @@ class Synthesizer(ttslab.synthesizer.Synthesizer):
        excitation synthesis.
     """
 
+    ENGINEPOOL_MAXSIZE = 4 #max number of idle engines kept loaded
+    COLUMNAR_LABELS = False #use hts_labels_columnar (faster, same output as the item-wise functions, see tools/bench/labels.py)
+    LABEL_VARIANT = "default" #see hts_labels_columnar.VARIANTS
+
     def __init__(self, modelsdir=None):
         if modelsdir:
             self._loadmodels(modelsdir)
 
+    def __getstate__(self):
+        """The engine pool holds C allocations and is not pickled, it
+           is recreated on first use...
+        """
+        d = self.__dict__.copy()
+        d.pop("_enginepool", None)
+        return d
+
+    @property
+    def enginepool(self):
+        """Pool of preloaded HTS engines for this voice, created lazily
+           (e.g. after unpickling)...
+        """
+        pool = self.__dict__.get("_enginepool")
+        if pool is None:
+            with ENGINEPOOL_LOCK:
+                pool = self.__dict__.get("_enginepool")
+                if pool is None:
+                    pool = HTS_EnginePool(self.htsvoice_bin, self.mixfilter_bin, self.pdfilter_bin,
+                                          maxsize=self.ENGINEPOOL_MAXSIZE)
+                    self._enginepool = pool
+        return pool
+
+    def enginepool_stats(self):
+        return self.enginepool.stats()
+
+    def release_enginepool(self):
+        """Free the idle engines now (e.g. when the voice is unloaded),
+           a new pool is created on next use...
+        """
+        with ENGINEPOOL_LOCK:
+            pool = self.__dict__.pop("_enginepool", None)
+        if pool is not None:
+            pool.clear()
+
     def _loadmodels(self, modelsdir):
         with open(os.path.join(modelsdir, "htsvoice"), "rb") as infh:
             self.htsvoice_bin = infh.read()
@@ -36,8 +82,12 @@ class Synthesizer(ttslab.synthesizer.Synthesizer):
             self.mixfilter_bin = infh.read()
         with open(os.path.join(modelsdir, "pdfilter"), "rb") as infh:
             self.pdfilter_bin = infh.read()
+        self.release_enginepool() #models changed
 
     def feats(self, voice, utt, args):
+        if self.COLUMNAR_LABELS:
+            utt["hts_label"] = hts_labels_columnar.make_labels(utt, voice.phones, voice.phonemap, self.LABEL_VARIANT)
+            return utt
         lab = []
         starttime = 0
         for phone_item in utt.get_relation("Segment"):
@@ -72,9 +122,91 @@ class Synthesizer(ttslab.synthesizer.Synthesizer):
             use_labalignments = True
         else:
             use_labalignments = False
-        with HTS_EngineME(self.htsvoice_bin, self.mixfilter_bin, self.pdfilter_bin) as htsengine:
+        with self.enginepool() as htsengine:
             htsengine.synth(htslabel, use_labalignments=use_labalignments)
             utt["waveform"] = htsengine.get_wav()
             for segt, seg in zip(htsengine.get_segtimes(), utt.gr("Segment")):
                 seg["start"], seg["end"] = segt
         return utt
+
+    def _phrase_chunks(self, utt):
+        """Split the Segment relation into consecutive lists of segments
+           at phrase breaks, each chunk ends with the pause following
+           the phrase (if present)...
+        """
+        phrasefinal = set()
+        for phr_item in utt.get_relation("Phrase"):
+            last_seg = phr_item.traverse("daughtern.R:SylStructure.daughtern.daughtern.R:Segment")
+            if last_seg is not None:
+                if last_seg.next_item is not None:
+                    last_seg = last_seg.next_item #pause
+                phrasefinal.add(id(last_seg.content))
+        chunks = [[]]
+        for seg in utt.get_relation("Segment"):
+            chunks[-1].append(seg)
+            if id(seg.content) in phrasefinal:
+                chunks.append([])
+        return [chunk for chunk in chunks if chunk]
+
+    def synth_stream(self, voice, utt, args):
+        """Synthesize phrase by phrase, yielding the int16 samples of
+           each phrase as soon as it is done. Labels are taken from
+           the complete utterance (i.e. `feats` has been run) so that
+           context across phrase boundaries is retained. On
+           completion the utterance contains the complete waveform
+           and segment times as with `synth` (which is used if there
+           are no segments to split).
+        """
+        synthparms = args
+        if synthparms and "use_labalignments" in synthparms:
+            use_labalignments = True
+        else:
+            use_labalignments = False
+        htslabel = "\n".join(utt["hts_label"]).encode("utf-8").splitlines() #to utf-8 bytestring
+        chunks = self._phrase_chunks(utt)
+        if not chunks:
+            utt = self.synth(voice, utt, args)
+            yield utt["waveform"].samples
+            return
+        assert sum(map(len, chunks)) == len(htslabel)
+        allsamples = []
+        samplerate = None
+        starttime = 0.0
+        labi = 0
+        for chunk in chunks:
+            chunklabel = htslabel[labi:labi+len(chunk)]
+            labi += len(chunk)
+            if use_labalignments:
+                chunklabel = rebase_label_times(chunklabel)
+            with self.enginepool() as htsengine:
+                htsengine.synth(chunklabel, use_labalignments=use_labalignments)
+                waveform = htsengine.get_wav()
+                segtimes = htsengine.get_segtimes()
+            for (segstart, segend), seg in zip(segtimes, chunk):
+                seg["start"], seg["end"] = starttime + segstart, starttime + segend
+            if segtimes:
+                starttime += segtimes[-1][1]
+            else:
+                starttime += len(waveform.samples) / waveform.samplerate
+            samplerate = waveform.samplerate
+            allsamples.append(waveform.samples)
+            yield waveform.samples
+        waveform = Waveform()
+        waveform.samples = np.concatenate(allsamples)
+        waveform.samplerate = samplerate
+        waveform.channels = 1
+        utt["waveform"] = waveform
+
+
+def rebase_label_times(htslabel):
+    """Shift HTK start and end times in label lines so that the first
+       line starts at 0...
+    """
+    if not htslabel or len(htslabel[0].split()) < 3:
+        return htslabel
+    offset = int(htslabel[0].split()[0])
+    newlabel = []
+    for line in htslabel:
+        start, end, lab = line.split(None, 2)
+        newlabel.append(b" ".join([str(int(start) - offset), str(int(end) - offset), lab]))
+    return newlabel
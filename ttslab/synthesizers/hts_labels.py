@@ -15,6 +15,23 @@ ttslab.extend(hrg.Item, "ttslab.ifuncs.synthcontext")
 
 NONE_STRING = "xxx"
 
+#label field formats (shared with hts_labels_columnar):
+P_FORMAT = "%s^%s-%s+%s=%s@%s_%s"
+A_FORMAT = "A:%s_%s_%s"
+B_FORMAT = "B:%s-%s-%s@%s-%s&%s-%s#%s-%s$%s-%s!%s-%s;%s-%s|%s"
+C_FORMAT = "C:%s+%s+%s"
+D_FORMAT = "D:%s_%s"
+E_FORMAT = "E:%s+%s@%s+%s&%s+%s#%s+%s"
+F_FORMAT = "F:%s_%s"
+G_FORMAT = "G:%s_%s"
+H_FORMAT = "H:%s=%s@%s=%s|%s"
+I_FORMAT = "I:%s_%s"
+J_FORMAT = "J:%s+%s-%s"
+K_FORMAT = "K:%s"
+L_FORMAT = "L:%s"
+M_FORMAT = "M:%s"
+N_FORMAT = "N:%s"
+
 
 def float_to_htk_int(string):
     """ Converts a string representing a floating point number to an
@@ -70,7 +87,7 @@ def p(segitem, phonemap):
     p6 = segitem.segpos_insyl_f()
     p7 = segitem.segpos_insyl_b()
 
-    return "%s^%s-%s+%s=%s@%s_%s" % tuple(map(nonestring, (p1, p2, p3, p4, p5, p6, p7)))
+    return P_FORMAT % tuple(map(nonestring, (p1, p2, p3, p4, p5, p6, p7)))
 
 
 def a(segitem):
@@ -79,7 +96,7 @@ def a(segitem):
     a2 = segitem.traverse("R:SylStructure.parent.R:Syllable.p.R:SylStructure.F:accent")
     a3 = segitem.traverse("R:SylStructure.parent.R:Syllable.p.R:SylStructure.M:num_daughters()")
     
-    return "A:%s_%s_%s" % tuple(map(zero, (a1, a2, a3)))
+    return A_FORMAT % tuple(map(zero, (a1, a2, a3)))
 
 
 def b(segitem, phones, phonemap):
@@ -113,7 +130,7 @@ def b(segitem, phones, phonemap):
                     break
     b16 = vowelname
     
-    return "B:%s-%s-%s@%s-%s&%s-%s#%s-%s$%s-%s!%s-%s;%s-%s|%s" % tuple(map(zero, (b1, b2, b3, b4,
+    return B_FORMAT % tuple(map(zero, (b1, b2, b3, b4,
                                                                                   b5, b6, b7, b8,
                                                                                   b9, b10, b11, b12,
                                                                                   b13, b14, b15, b16)))
@@ -125,7 +142,7 @@ def c(segitem):
     c2 = segitem.traverse("R:SylStructure.parent.R:Syllable.n.R:SylStructure.F:accent")
     c3 = segitem.traverse("R:SylStructure.parent.R:Syllable.n.R:SylStructure.M:num_daughters()")
     
-    return "C:%s+%s+%s" % tuple(map(zero, (c1, c2, c3)))
+    return C_FORMAT % tuple(map(zero, (c1, c2, c3)))
 
     
 
@@ -136,7 +153,7 @@ def d(segitem):
     d2 = segitem.traverse("R:SylStructure.parent.parent.p.M:num_daughters()")
     if d2 is None: d2 = 0
     
-    return "D:%s_%s" % (d1, d2)
+    return D_FORMAT % (d1, d2)
 
 
 def e(segitem):
@@ -151,7 +168,7 @@ def e(segitem):
     e7 = segitem.traverse("R:SylStructure.parent.parent.M:worddistprev('gpos', 'c')")
     e8 = segitem.traverse("R:SylStructure.parent.parent.M:worddistnext('gpos', 'c')")
     
-    return "E:%s+%s@%s+%s&%s+%s#%s+%s" % tuple(map(zero, (e1, e2, e3, e4, e5, e6, e7, e8)))
+    return E_FORMAT % tuple(map(zero, (e1, e2, e3, e4, e5, e6, e7, e8)))
 
 
 def f(segitem):
@@ -161,7 +178,7 @@ def f(segitem):
     f2 = segitem.traverse("R:SylStructure.parent.parent.n.M:num_daughters()")
     if f2 is None: f2 = 0
     
-    return "F:%s_%s" % (f1, f2)
+    return F_FORMAT % (f1, f2)
 
 
 def g(segitem):
@@ -169,7 +186,7 @@ def g(segitem):
     g1 = segitem.traverse("R:SylStructure.parent.parent.R:Phrase.parent.p.M:numsyls_inphrase()")
     g2 = segitem.traverse("R:SylStructure.parent.parent.R:Phrase.parent.p.M:num_daughters()")
 
-    return "G:%s_%s" % tuple(map(zero, (g1, g2)))
+    return G_FORMAT % tuple(map(zero, (g1, g2)))
 
 
 def h(segitem):
@@ -181,7 +198,7 @@ def h(segitem):
     h5 = segitem.traverse("R:SylStructure.parent.parent.R:Phrase.parent.F:tobi")
     if h5 is None: h5 = NONE_STRING
 
-    return "H:%s=%s@%s=%s|%s" % tuple(map(zero, (h1, h2, h3, h4, h5)))
+    return H_FORMAT % tuple(map(zero, (h1, h2, h3, h4, h5)))
 
 
 def i(segitem):
@@ -189,7 +206,7 @@ def i(segitem):
     i1 = segitem.traverse("R:SylStructure.parent.parent.R:Phrase.parent.n.M:numsyls_inphrase()")
     i2 = segitem.traverse("R:SylStructure.parent.parent.R:Phrase.parent.n.M:num_daughters()")
 
-    return "I:%s_%s" % tuple(map(zero, (i1, i2)))
+    return I_FORMAT % tuple(map(zero, (i1, i2)))
 
 
 def j(segitem):
@@ -200,4 +217,4 @@ def j(segitem):
     j2 = len(utt.get_relation("Word"))
     j3 = len(utt.get_relation("Phrase"))
 
-    return "J:%s+%s-%s" % (j1, j2, j3)
+    return J_FORMAT % (j1, j2, j3)
@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+"""Columnar implementation of the HTS label functions (p, a, b, ...)
+   in hts_labels, hts_labels_tone, hts_labels_prom and
+   hts_labels_word...
+
+   The Segment/Syllable/Word/Phrase structure of an utterance is
+   flattened once into numpy arrays (parent indices, positions and
+   counts per level), contextual features are computed with array
+   operations and all label strings are formatted from one template.
+   The output is identical to that of the item-wise functions;
+   utterances that do not have the "standard" structure (see
+   LabelTable) fall back to the item-wise functions.
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import sys
+import importlib
+
+import numpy as np
+
+from ttslab.synthesizers.hts_labels import NONE_STRING, float_to_htk_int, nonestring, zero
+from ttslab.synthesizers.hts_labels import (P_FORMAT, A_FORMAT, B_FORMAT, C_FORMAT, D_FORMAT, E_FORMAT, F_FORMAT,
+                                            G_FORMAT, H_FORMAT, I_FORMAT, J_FORMAT, K_FORMAT, L_FORMAT,
+                                            M_FORMAT, N_FORMAT)
+
+#module with item-wise functions and the feature functions used to
+#make up a label:
+VARIANTS = {"default": ("ttslab.synthesizers.hts_labels", "pabcdefghij"),
+            "tone": ("ttslab.synthesizers.hts_labels_tone", "pabcdefghijklmn"),
+            "prom": ("ttslab.synthesizers.hts_labels_prom", "pabcdefghij"),
+            "word": ("ttslab.synthesizers.hts_labels_word", "pabcdefghij")}
+
+
+
+class UnsupportedStructure(Exception):
+    pass
+
+
+class LabelTable(object):
+    """Segment/Syllable/Word/Phrase levels of an utterance as arrays.
+       Requires the "standard" structure: top-level Items in
+       SylStructure are the Words (same order as in the Word relation
+       and the daughters of Phrase items), their daughters the
+       Syllables (same order as in the Syllable relation) and their
+       daughters Segments. Segments not in SylStructure (pauses) are
+       allowed and have syllable index -1.
+    """
+    def __init__(self, utt):
+        rels = {}
+        for relname in ["Segment", "Syllable", "Word", "Phrase", "SylStructure"]:
+            rels[relname] = utt.get_relation(relname)
+            if rels[relname] is None:
+                raise UnsupportedStructure("No %s relation" % relname)
+
+        #Phrases and words in phrases:
+        self.phrase_items = list(rels["Phrase"])
+        phrase_nwords = []
+        word_phrase = []
+        word_posinphrase = []
+        phrasewords = []
+        for i, phrase_item in enumerate(self.phrase_items):
+            daughters = phrase_item.get_daughters()
+            phrase_nwords.append(len(daughters))
+            for j, word_item in enumerate(daughters):
+                phrasewords.append(id(word_item.content))
+                word_phrase.append(i)
+                word_posinphrase.append(j)
+
+        #Words, syllables and segments in SylStructure:
+        self.word_items = list(rels["SylStructure"])
+        self.syl_items = []
+        word_nsyls = []
+        syl_word = []
+        syl_posinword = []
+        syl_nsegs = []
+        self.sylseg_names = [] #names of syllable daughters in order
+        segpositions = {}
+        for i, word_item in enumerate(self.word_items):
+            daughters = word_item.get_daughters()
+            word_nsyls.append(len(daughters))
+            for j, syl_item in enumerate(daughters):
+                segs = syl_item.get_daughters()
+                for k, seg_item in enumerate(segs):
+                    segpositions[id(seg_item.content)] = (len(self.syl_items), k)
+                    self.sylseg_names.append(seg_item["name"])
+                self.syl_items.append(syl_item)
+                syl_word.append(i)
+                syl_posinword.append(j)
+                syl_nsegs.append(len(segs))
+
+        wordcontents = [id(item.content) for item in self.word_items]
+        if wordcontents != [id(item.content) for item in rels["Word"]] or wordcontents != phrasewords:
+            raise UnsupportedStructure("Words in SylStructure, Word and Phrase differ")
+        if [id(item.content) for item in self.syl_items] != [id(item.content) for item in rels["Syllable"]]:
+            raise UnsupportedStructure("Syllables in SylStructure and Syllable differ")
+
+        self.seg_items = list(rels["Segment"])
+        seg_syl = []
+        seg_posinsyl = []
+        for seg_item in self.seg_items:
+            if seg_item.get_item_in_relation("SylStructure") is None:
+                seg_syl.append(-1)
+                seg_posinsyl.append(-1)
+                continue
+            try:
+                sylidx, pos = segpositions[id(seg_item.content)]
+            except KeyError:
+                raise UnsupportedStructure("Segment not below a syllable in SylStructure")
+            seg_syl.append(sylidx)
+            seg_posinsyl.append(pos)
+
+        self.nsegs = len(self.seg_items)
+        self.nsyls = len(self.syl_items)
+        self.nwords = len(self.word_items)
+        self.nphrases = len(self.phrase_items)
+
+        self.phrase_nwords = np.array(phrase_nwords, dtype=np.int64)
+        self.word_phrase = np.array(word_phrase, dtype=np.int64)
+        self.word_posinphrase = np.array(word_posinphrase, dtype=np.int64)
+        self.word_nsyls = np.array(word_nsyls, dtype=np.int64)
+        self.syl_word = np.array(syl_word, dtype=np.int64)
+        self.syl_posinword = np.array(syl_posinword, dtype=np.int64)
+        self.syl_nsegs = np.array(syl_nsegs, dtype=np.int64)
+        self.seg_syl = np.array(seg_syl, dtype=np.int64)
+        self.seg_posinsyl = np.array(seg_posinsyl, dtype=np.int64)
+
+        #derived: syllables in phrases (contiguous because words are)
+        self.syl_phrase = self.word_phrase[self.syl_word]
+        self.phrase_nsyls = np.bincount(self.syl_phrase, minlength=self.nphrases).astype(np.int64)
+        self.phrase_firstsyl = np.cumsum(self.phrase_nsyls) - self.phrase_nsyls
+        self.syl_posinphrase = np.arange(self.nsyls) - self.phrase_firstsyl[self.syl_phrase]
+        self.word_firstsyl = np.cumsum(self.word_nsyls) - self.word_nsyls
+        self.syl_segstart = np.cumsum(self.syl_nsegs) - self.syl_nsegs
+        #segment -> word and phrase indices:
+        self.seg_word = self.take(self.syl_word, self.seg_syl, -1)
+        self.seg_phrase = self.take(self.word_phrase, self.seg_word, -1)
+
+    @staticmethod
+    def take(values, idx, default):
+        """values[idx] with default where idx < 0...
+        """
+        if len(values) == 0:
+            return np.zeros(len(idx), dtype=np.int64) + default
+        return np.where(idx >= 0, values[np.maximum(idx, 0)], default)
+
+    def feat(self, level, featname, func=zero):
+        """List of func(item[featname]) for items in level ("syl", "word"
+           or "phrase")...
+        """
+        return [func(item[featname]) for item in getattr(self, level + "_items")]
+
+    def syl_flag(self, featname, featvalue):
+        return np.array([item[featname] == featvalue for item in self.syl_items], dtype=np.int64)
+
+    def word_flag(self, featname, featvalue):
+        return np.array([item[featname] == featvalue for item in self.word_items], dtype=np.int64)
+
+    def syl_vowels(self, phones, phonemap):
+        """Mapped name of the first vowel in each syllable (None if no
+           vowel)...
+        """
+        vowelnames = [ph for ph in phones if "vowel" in phones[ph]]
+        isvowel = np.array([name in vowelnames for name in self.sylseg_names], dtype=bool)
+        vowelidx = np.flatnonzero(isvowel)
+        vowels = [None] * self.nsyls
+        if len(vowelidx) == 0:
+            return vowels
+        first = np.minimum(np.searchsorted(vowelidx, self.syl_segstart), len(vowelidx) - 1)
+        first = vowelidx[first]
+        found = (first >= self.syl_segstart) & (first < self.syl_segstart + self.syl_nsegs)
+        for i in np.flatnonzero(found).tolist():
+            vowels[i] = phonemap[self.sylseg_names[first[i]]]
+        return vowels
+
+
+#### Array helpers:
+def column(values, idx, default):
+    """values[idx] as a list with default where idx < 0 (works for
+       lists of arbitrary objects)...
+    """
+    arr = np.empty(len(values) + 1, dtype=object)
+    for i, v in enumerate(values):
+        arr[i] = v
+    arr[-1] = default
+    return arr[np.where(idx >= 0, idx, -1)].tolist()
+
+def intcolumn(values, idx, default=0):
+    return LabelTable.take(values, idx, default).tolist()
+
+def shifted(idx, offset, start, end):
+    """idx + offset where this stays in [start, end) (and idx >= 0)
+       else -1...
+    """
+    newidx = idx + offset
+    return np.where((idx >= 0) & (newidx >= start) & (newidx < end), newidx, -1)
+
+def count_before_after(flag, start, end):
+    """Number of flagged elements before and after each element in
+       the group [start, end) containing it...
+    """
+    cs = np.concatenate([[0], np.cumsum(flag)])
+    i = np.arange(len(flag))
+    return cs[i] - cs[start], cs[end] - cs[i + 1]
+
+def dist_prev_next(flag, start, end):
+    """Distance to the previous and next flagged element in the group
+       [start, end) containing each element (0 if none)...
+    """
+    n = len(flag)
+    i = np.arange(n)
+    if n == 0:
+        return i, i
+    last = np.maximum.accumulate(np.where(flag, i, -1))
+    prevflagged = np.concatenate([[-1], last[:-1]])
+    nxt = np.minimum.accumulate(np.where(flag, i, n)[::-1])[::-1]
+    nextflagged = np.concatenate([nxt[1:], [n]])
+    distprev = np.where(prevflagged >= start, i - prevflagged, 0)
+    distnext = np.where(nextflagged < end, nextflagged - i, 0)
+    return distprev, distnext
+
+def mapname(phonemap, name):
+    try:
+        return phonemap[name]
+    except KeyError:
+        return None
+
+
+#### Label computation:
+def _p(t, phonemap):
+    names = [seg_item["name"] for seg_item in t.seg_items]
+    mapped = [mapname(phonemap, name) for name in names]
+    p3 = []
+    for seg_item in t.seg_items:
+        if "hts_symbol" in seg_item:
+            p3.append(seg_item["hts_symbol"])
+        else:
+            p3.append(phonemap[seg_item["name"]])
+    none = [None, None]
+    p1 = none[:2] + mapped[:-2]
+    p2 = none[:1] + mapped[:-1]
+    p4 = mapped[1:] + none[:1]
+    p5 = mapped[2:] + none[:2]
+    p1, p2, p4, p5 = [list(map(nonestring, x))[:t.nsegs] for x in (p1, p2, p4, p5)]
+    pos = t.seg_posinsyl
+    nsegs = t.take(t.syl_nsegs, t.seg_syl, 0)
+    p6 = np.where(pos >= 0, pos + 1, 0).tolist()
+    p7 = np.where(pos >= 0, nsegs - pos, 0).tolist()
+    return [p1, p2, p3, p4, p5, p6, p7]
+
+def _p_word(t, phonemap):
+    def map_or_not(p):
+        try:
+            return phonemap[p]
+        except KeyError:
+            if p is not None:
+                print("hts_labels*.py: WARNING: phone name not mapped: '{}'".format(p).encode("utf-8"), file=sys.stderr)
+        return p
+    names = [seg_item["name"] for seg_item in t.seg_items]
+    seg_word = t.seg_word.tolist()
+    rows = []
+    for i, seg_item in enumerate(t.seg_items):
+        w = seg_word[i]
+        context = []
+        for j in (i - 2, i - 1, i + 1, i + 2):
+            if j < 0 or j >= t.nsegs or (w >= 0 and seg_word[j] != w):
+                context.append(None)
+            else:
+                context.append(names[j])
+        if "hts_symbol" in seg_item:
+            p3 = seg_item["hts_symbol"]
+        else:
+            p3 = names[i]
+        rows.append(tuple(map(nonestring, map(map_or_not, (context[0], context[1], p3, context[2], context[3])))))
+    cols = [list(x) for x in zip(*rows)] or [[]] * 5
+    pos = t.seg_posinsyl
+    nsegs = t.take(t.syl_nsegs, t.seg_syl, 0)
+    p6 = np.where(pos >= 0, pos + 1, 0).tolist()
+    p7 = np.where(pos >= 0, nsegs - pos, 0).tolist()
+    return cols + [p6, p7]
+
+def _syl_context(t, idx, tonefeat):
+    """Fields of A and C (syllable at idx)...
+    """
+    return [column(t.feat("syl", tonefeat), idx, 0),
+            column(t.feat("syl", "accent"), idx, 0),
+            intcolumn(t.syl_nsegs, idx)]
+
+def _b(t, phones, phonemap, tonefeat, accentfeat="accent", accentlevel="syl"):
+    s = t.seg_syl
+    sylidx = np.arange(t.nsyls)
+    phrasestart = t.phrase_firstsyl[t.syl_phrase] if t.nsyls else sylidx
+    phraseend = phrasestart + t.phrase_nsyls[t.syl_phrase] if t.nsyls else sylidx
+    tone = t.syl_flag(tonefeat, "1")
+    accent = t.syl_flag("accent", "1")
+    tonebefore, toneafter = count_before_after(tone, phrasestart, phraseend)
+    accentbefore, accentafter = count_before_after(accent, phrasestart, phraseend)
+    toneprev, tonenext = dist_prev_next(tone, 0, t.nsyls)
+    accentprev, accentnext = dist_prev_next(accent, 0, t.nsyls)
+    if accentlevel == "syl":
+        b2 = column(t.feat("syl", accentfeat), s, 0)
+    else:
+        b2 = column(t.feat("word", accentfeat), t.seg_word, 0)
+    nsylsinword = t.word_nsyls[t.syl_word] if t.nsyls else sylidx
+    nsylsinphrase = t.phrase_nsyls[t.syl_phrase] if t.nsyls else sylidx
+    return [column(t.feat("syl", tonefeat), s, 0),
+            b2,
+            intcolumn(t.syl_nsegs, s),
+            intcolumn(t.syl_posinword + 1, s),
+            intcolumn(nsylsinword - t.syl_posinword, s),
+            intcolumn(t.syl_posinphrase + 1, s),
+            intcolumn(nsylsinphrase - t.syl_posinphrase, s),
+            intcolumn(tonebefore, s),
+            intcolumn(toneafter, s),
+            intcolumn(accentbefore, s),
+            intcolumn(accentafter, s),
+            intcolumn(toneprev, s),
+            intcolumn(tonenext, s),
+            intcolumn(accentprev, s),
+            intcolumn(accentnext, s),
+            column(list(map(zero, t.syl_vowels(phones, phonemap))), s, 0)]
+
+def _b_word(t, phones, phonemap):
+    s = t.seg_syl
+    sylidx = np.arange(t.nsyls)
+    wordstart = t.word_firstsyl[t.syl_word] if t.nsyls else sylidx
+    wordend = wordstart + t.word_nsyls[t.syl_word] if t.nsyls else sylidx
+    toneprev, tonenext = dist_prev_next(t.syl_flag("tone", "1"), wordstart, wordend)
+    accentprev, accentnext = dist_prev_next(t.syl_flag("accent", "1"), wordstart, wordend)
+    nsylsinword = t.word_nsyls[t.syl_word] if t.nsyls else sylidx
+    zeros = [0] * t.nsegs
+    return ([column(t.feat("syl", "tone"), s, 0),
+             column(t.feat("syl", "accent"), s, 0),
+             intcolumn(t.syl_nsegs, s),
+             intcolumn(t.syl_posinword + 1, s),
+             intcolumn(nsylsinword - t.syl_posinword, s)] +
+            [zeros] * 6 +
+            [intcolumn(toneprev, s),
+             intcolumn(tonenext, s),
+             intcolumn(accentprev, s),
+             intcolumn(accentnext, s),
+             column(list(map(nonestring, t.syl_vowels(phones, phonemap))), s, NONE_STRING)])
+
+def _word_context(t, idx):
+    """Fields of D and F (word at idx)...
+    """
+    return [column(t.feat("word", "gpos", nonestring), idx, NONE_STRING),
+            intcolumn(t.word_nsyls, idx)]
+
+def _e(t):
+    w = t.seg_word
+    wordidx = np.arange(t.nwords)
+    phrasestart = wordidx - t.word_posinphrase
+    phraseend = phrasestart + t.phrase_nwords[t.word_phrase] if t.nwords else wordidx
+    gpos = t.word_flag("gpos", "c")
+    before, after = count_before_after(gpos, phrasestart, phraseend)
+    distprev, distnext = dist_prev_next(gpos, 0, t.nwords)
+    nwordsinphrase = t.phrase_nwords[t.word_phrase] if t.nwords else wordidx
+    return [column(t.feat("word", "gpos", nonestring), w, NONE_STRING),
+            intcolumn(t.word_nsyls, w),
+            intcolumn(t.word_posinphrase + 1, w),
+            intcolumn(nwordsinphrase - t.word_posinphrase, w),
+            intcolumn(before, w),
+            [0] * t.nsegs, #numwordssafterword_inphrase does not exist (see hts_labels.e)
+            intcolumn(distprev, w),
+            intcolumn(distnext, w)]
+
+def _phrase_context(t, idx):
+    """Fields of G and I (phrase at idx)...
+    """
+    return [intcolumn(t.phrase_nsyls, idx),
+            intcolumn(t.phrase_nwords, idx)]
+
+def _h(t):
+    ph = t.seg_phrase
+    phraseidx = np.arange(t.nphrases)
+    return [intcolumn(t.phrase_nsyls, ph),
+            intcolumn(t.phrase_nwords, ph),
+            intcolumn(phraseidx + 1, ph),
+            intcolumn(t.nphrases - phraseidx, ph),
+            column(t.feat("phrase", "tobi", nonestring), ph, NONE_STRING)]
+
+def _columns(t, phones, phonemap, variant):
+    """Format string and list of columns (one per field) for all
+       segments...
+    """
+    s = t.seg_syl
+    w = t.seg_word
+    ph = t.seg_phrase
+    prevsyl = shifted(s, -1, 0, t.nsyls)
+    nextsyl = shifted(s, 1, 0, t.nsyls)
+    j = [[t.nsyls] * t.nsegs, [t.nwords] * t.nsegs, [t.nphrases] * t.nsegs]
+    if variant == "word":
+        wordstart = t.take(t.word_firstsyl, w, 0)
+        wordend = wordstart + t.take(t.word_nsyls, w, 0)
+        prevsyl = shifted(s, -1, wordstart, wordend)
+        nextsyl = shifted(s, 1, wordstart, wordend)
+        a = [column(t.feat("syl", "tone", nonestring), prevsyl, NONE_STRING),
+             column(t.feat("syl", "accent", nonestring), prevsyl, NONE_STRING),
+             intcolumn(t.syl_nsegs, prevsyl)]
+        e = _word_context(t, w) + [[0] * t.nsegs] * 6
+        fmt = "/".join([P_FORMAT, A_FORMAT, B_FORMAT, C_FORMAT,
+                        D_FORMAT % (NONE_STRING, 0),
+                        E_FORMAT,
+                        F_FORMAT % (NONE_STRING, 0),
+                        G_FORMAT % (0, 0),
+                        H_FORMAT % (0, 0, 0, 0, NONE_STRING),
+                        I_FORMAT % (0, 0),
+                        J_FORMAT % (0, 0, 0)])
+        return fmt, (_p_word(t, phonemap) + a + _b_word(t, phones, phonemap) +
+                     _syl_context(t, nextsyl, "tone") + e)
+    tonefeat = "tone"
+    if variant in ["tone", "prom"]:
+        bparms = {"tonefeat": "stress"}
+        if variant == "tone":
+            tonefeat = "stress"
+        else:
+            bparms.update({"accentfeat": "prom", "accentlevel": "word"})
+    else:
+        bparms = {"tonefeat": "tone"}
+    columns = (_p(t, phonemap) +
+               _syl_context(t, prevsyl, tonefeat) +
+               _b(t, phones, phonemap, **bparms) +
+               _syl_context(t, nextsyl, tonefeat) +
+               _word_context(t, shifted(w, -1, 0, t.nwords)) +
+               _e(t) +
+               _word_context(t, shifted(w, 1, 0, t.nwords)) +
+               _phrase_context(t, shifted(ph, -1, 0, t.nphrases)) +
+               _h(t) +
+               _phrase_context(t, shifted(ph, 1, 0, t.nphrases)) +
+               j)
+    fmts = [P_FORMAT, A_FORMAT, B_FORMAT, C_FORMAT, D_FORMAT, E_FORMAT,
+            F_FORMAT, G_FORMAT, H_FORMAT, I_FORMAT, J_FORMAT]
+    if variant == "tone":
+        tones = t.feat("syl", "tone", nonestring)
+        columns += [column(tones, s, NONE_STRING),
+                    column(tones, prevsyl, NONE_STRING),
+                    column(tones, shifted(s, -2, 0, t.nsyls), NONE_STRING),
+                    column(tones, nextsyl, NONE_STRING)]
+        fmts += [K_FORMAT, L_FORMAT, M_FORMAT, N_FORMAT]
+    return "/".join(fmts), columns
+
+
+def itemwise_labels(utt, phones, phonemap, variant="default"):
+    """Labels (without times) using the item-wise functions...
+    """
+    modname, funcnames = VARIANTS[variant]
+    mod = importlib.import_module(modname)
+    funcs = [getattr(mod, funcname) for funcname in funcnames]
+    labels = []
+    for phone_item in utt.get_relation("Segment"):
+        phlabel = []
+        for funcname, func in zip(funcnames, funcs):
+            if funcname == "p":
+                phlabel.append(func(phone_item, phonemap))
+            elif funcname == "b":
+                phlabel.append(func(phone_item, phones, phonemap))
+            else:
+                phlabel.append(func(phone_item))
+        labels.append("/".join(phlabel))
+    return labels
+
+def columnar_labels(utt, phones, phonemap, variant="default"):
+    """Labels (without times) using LabelTable, raises
+       UnsupportedStructure if the utterance cannot be represented...
+    """
+    if variant not in VARIANTS:
+        raise ValueError("Unknown label variant: %s" % variant)
+    t = LabelTable(utt)
+    fmt, columns = _columns(t, phones, phonemap, variant)
+    return [fmt % row for row in zip(*columns)]
+
+def add_times(utt, labels):
+    """Prepend HTK start and end times where segments have "end"...
+    """
+    lab = []
+    starttime = 0
+    for phone_item, phlabel in zip(utt.get_relation("Segment"), labels):
+        if "end" in phone_item:
+            endtime = float_to_htk_int(phone_item["end"])
+        else:
+            endtime = None
+        if endtime is not None:
+            lab.append(" ".join([str(starttime), str(endtime), phlabel]))
+        else:
+            lab.append(phlabel)
+        starttime = endtime
+    return lab
+
+def make_labels(utt, phones, phonemap, variant="default"):
+    """Full-context labels as made by the feats() method of the
+       corresponding HTS synthesizer...
+    """
+    try:
+        labels = columnar_labels(utt, phones, phonemap, variant)
+    except UnsupportedStructure:
+        labels = itemwise_labels(utt, phones, phonemap, variant)
+    return add_times(utt, labels)
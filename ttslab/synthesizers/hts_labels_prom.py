@@ -40,7 +40,7 @@ def b(segitem, phones, phonemap):
                     break
     b16 = vowelname
     
-    return "B:%s-%s-%s@%s-%s&%s-%s#%s-%s$%s-%s!%s-%s;%s-%s|%s" % tuple(map(zero, (b1, b2, b3, b4,
+    return B_FORMAT % tuple(map(zero, (b1, b2, b3, b4,
                                                                                   b5, b6, b7, b8,
                                                                                   b9, b10, b11, b12,
                                                                                   b13, b14, b15, b16)))
@@ -15,7 +15,7 @@ def a(segitem):
     a2 = segitem.traverse("R:SylStructure.parent.R:Syllable.p.R:SylStructure.F:accent")
     a3 = segitem.traverse("R:SylStructure.parent.R:Syllable.p.R:SylStructure.M:num_daughters()")
     
-    return "A:%s_%s_%s" % tuple(map(zero, (a1, a2, a3)))
+    return A_FORMAT % tuple(map(zero, (a1, a2, a3)))
 
 
 def b(segitem, phones, phonemap):
@@ -49,7 +49,7 @@ def b(segitem, phones, phonemap):
                     break
     b16 = vowelname
     
-    return "B:%s-%s-%s@%s-%s&%s-%s#%s-%s$%s-%s!%s-%s;%s-%s|%s" % tuple(map(zero, (b1, b2, b3, b4,
+    return B_FORMAT % tuple(map(zero, (b1, b2, b3, b4,
                                                                                   b5, b6, b7, b8,
                                                                                   b9, b10, b11, b12,
                                                                                   b13, b14, b15, b16)))
@@ -61,29 +61,29 @@ def c(segitem):
     c2 = segitem.traverse("R:SylStructure.parent.R:Syllable.n.R:SylStructure.F:accent")
     c3 = segitem.traverse("R:SylStructure.parent.R:Syllable.n.R:SylStructure.M:num_daughters()")
     
-    return "C:%s+%s+%s" % tuple(map(zero, (c1, c2, c3)))
+    return C_FORMAT % tuple(map(zero, (c1, c2, c3)))
 
 
 def k(segitem):
     k0 = segitem.traverse("R:SylStructure.parent.F:tone")
     if k0 is None:
         k0 = NONE_STRING
-    return "K:%s" % k0
+    return K_FORMAT % k0
 
 def l(segitem):
     l0 = segitem.traverse("R:SylStructure.parent.R:Syllable.p.F:tone")
     if l0 is None:
         l0 = NONE_STRING
-    return "L:%s" % l0
+    return L_FORMAT % l0
 
 def m(segitem):
     m0 = segitem.traverse("R:SylStructure.parent.R:Syllable.p.p.F:tone")
     if m0 is None:
         m0 = NONE_STRING
-    return "M:%s" % m0
+    return M_FORMAT % m0
 
 def n(segitem):
     n0 = segitem.traverse("R:SylStructure.parent.R:Syllable.n.F:tone")
     if n0 is None:
         n0 = NONE_STRING
-    return "N:%s" % n0
+    return N_FORMAT % n0
@@ -10,7 +10,9 @@ __email__ = "dvn.demitasse@gmail.com"
 
 import sys
 
-from ttslab.synthesizers.hts_labels import NONE_STRING, float_to_htk_int, htk_int_to_float, nonestring, zero
+from ttslab.synthesizers.hts_labels import (NONE_STRING, float_to_htk_int, htk_int_to_float, nonestring, zero,
+                                          P_FORMAT, A_FORMAT, B_FORMAT, C_FORMAT, D_FORMAT, E_FORMAT, F_FORMAT,
+                                          G_FORMAT, H_FORMAT, I_FORMAT, J_FORMAT)
 
 def p(segitem, phonemap):
     def map_or_not(p):
@@ -53,7 +55,7 @@ def p(segitem, phonemap):
     p6 = segitem.segpos_insyl_f()
     p7 = segitem.segpos_insyl_b()
 
-    return "%s^%s-%s+%s=%s@%s_%s" % (tuple(map(nonestring, map(map_or_not, (p1, p2, p3, p4, p5)))) + (p6, p7))
+    return P_FORMAT % (tuple(map(nonestring, map(map_or_not, (p1, p2, p3, p4, p5)))) + (p6, p7))
 
 
 def a(segitem):
@@ -64,7 +66,7 @@ def a(segitem):
     a2 = segitem.traverse("R:SylStructure.parent.p.F:accent")
     a3 = segitem.traverse("R:SylStructure.parent.p.M:num_daughters()")
     
-    return "A:%s_%s_%s" % (tuple(map(nonestring, (a1, a2))) + tuple(map(zero, (a3,))))
+    return A_FORMAT % (tuple(map(nonestring, (a1, a2))) + tuple(map(zero, (a3,))))
 
 
 def b(segitem, phones, phonemap):
@@ -98,7 +100,7 @@ def b(segitem, phones, phonemap):
                     break
     b16 = vowelname
     
-    return "B:%s-%s-%s@%s-%s&%s-%s#%s-%s$%s-%s!%s-%s;%s-%s|%s" % (tuple(map(zero, (b1, b2, b3, b4,
+    return B_FORMAT % (tuple(map(zero, (b1, b2, b3, b4,
                                                                                    b5, b6, b7, b8,
                                                                                    b9, b10, b11, b12,
                                                                                    b13, b14, b15))) + 
@@ -113,7 +115,7 @@ def c(segitem):
     c2 = segitem.traverse("R:SylStructure.parent.n.F:accent")
     c3 = segitem.traverse("R:SylStructure.parent.n.M:num_daughters()")
     
-    return "C:%s+%s+%s" % tuple(map(zero, (c1, c2, c3)))
+    return C_FORMAT % tuple(map(zero, (c1, c2, c3)))
 
     
 
@@ -124,7 +126,7 @@ def d(segitem):
     d2 = segitem.traverse("R:NoRelation")
     if d2 is None: d2 = 0
     
-    return "D:%s_%s" % (d1, d2)
+    return D_FORMAT % (d1, d2)
 
 
 def e(segitem):
@@ -139,7 +141,7 @@ def e(segitem):
     e7 = segitem.traverse("R:NoRelation")
     e8 = segitem.traverse("R:NoRelation")
     
-    return "E:%s+%s@%s+%s&%s+%s#%s+%s" % tuple(map(zero, (e1, e2, e3, e4, e5, e6, e7, e8)))
+    return E_FORMAT % tuple(map(zero, (e1, e2, e3, e4, e5, e6, e7, e8)))
 
 
 def f(segitem):
@@ -149,7 +151,7 @@ def f(segitem):
     f2 = segitem.traverse("R:NoRelation")
     if f2 is None: f2 = 0
     
-    return "F:%s_%s" % (f1, f2)
+    return F_FORMAT % (f1, f2)
 
 
 def g(segitem):
@@ -157,7 +159,7 @@ def g(segitem):
     g1 = segitem.traverse("R:NoRelation")
     g2 = segitem.traverse("R:NoRelation")
 
-    return "G:%s_%s" % tuple(map(zero, (g1, g2)))
+    return G_FORMAT % tuple(map(zero, (g1, g2)))
 
 
 def h(segitem):
@@ -169,7 +171,7 @@ def h(segitem):
     h5 = segitem.traverse("R:NoRelation")
     if h5 is None: h5 = NONE_STRING
 
-    return "H:%s=%s@%s=%s|%s" % tuple(map(zero, (h1, h2, h3, h4, h5)))
+    return H_FORMAT % tuple(map(zero, (h1, h2, h3, h4, h5)))
 
 
 def i(segitem):
@@ -177,7 +179,7 @@ def i(segitem):
     i1 = segitem.traverse("R:NoRelation")
     i2 = segitem.traverse("R:NoRelation")
 
-    return "I:%s_%s" % tuple(map(zero, (i1, i2)))
+    return I_FORMAT % tuple(map(zero, (i1, i2)))
 
 
 def j(segitem):
@@ -188,4 +190,4 @@ def j(segitem):
     j2 = 0
     j3 = 0
 
-    return "J:%s+%s-%s" % (j1, j2, j3)
+    return J_FORMAT % (j1, j2, j3)
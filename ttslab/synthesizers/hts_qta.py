@@ -20,6 +20,7 @@ import os
 import numpy as np
 from scipy.interpolate import InterpolatedUnivariateSpline
 
+import ttslab.synthesizer
 import ttslab.synthesizers.hts
 from ttslab.synthesizers.htsengine_me_cffi import HTS_EngineME, tolf0
 from ttslab.trackfile import Track
@@ -33,6 +34,13 @@ BACKOFF_STARTPITCH = 12.0 * np.log2(100.0) #100 Hz
 class Synthesizer(ttslab.synthesizers.hts.Synthesizer):
     """F0 in semitones relative to 1Hz.
     """
+    def synth_stream(self, voice, utt, args):
+        """The qTA f0 contour is predicted for the whole utterance (and
+           the HTS f0 it is based on), so there is no incremental
+           synthesis: yields the complete waveform...
+        """
+        return ttslab.synthesizer.Synthesizer.synth_stream(self, voice, utt, args)
+
     def synth(self, voice, utt, args):
         synthparms = args #not yet implemented...
         htslabel = "\n".join(utt["hts_label"]).encode("utf-8").splitlines() #to utf-8 bytestring
@@ -40,7 +48,7 @@ class Synthesizer(ttslab.synthesizers.hts.Synthesizer):
             use_labalignments = True
         else:
             use_labalignments = False
-        with HTS_EngineME(self.htsvoice_bin, self.mixfilter_bin, self.pdfilter_bin) as htsengine:
+        with self.enginepool() as htsengine:
             htsengine.synth(htslabel, use_labalignments=use_labalignments)
             for segt, seg in zip(htsengine.get_segtimes(), utt.gr("Segment")):
                 seg["start"], seg["end"] = segt
@@ -13,6 +13,7 @@ __author__ = "Daniel van Niekerk"
 __email__ = "dvn.demitasse@gmail.com"
 
 import os
+import threading
 import locale
 locale.setlocale(locale.LC_NUMERIC, "C.UTF-8") #for C atof calls to recognize "." as floating point
 import cffi #from cffi import FFI
@@ -49,6 +50,20 @@ def castdouble_np_flat_arr(x):
         x = x.astype(np.float64)
     return FFI.cast("double *", x.ctypes.data)
 
+def doublebuf_to_np(ptr, n):
+    """Copy `n` doubles from C buffer in one go...
+    """
+    if n == 0:
+        return np.zeros(0, dtype=np.float64)
+    return np.frombuffer(FFI.buffer(ptr, n * FFI.sizeof("double")), dtype=np.float64).copy()
+
+def sizetbuf_to_np(ptr, n):
+    """Copy `n` size_t values from C buffer in one go...
+    """
+    if n == 0:
+        return np.zeros(0, dtype=np.uintp)
+    return np.frombuffer(FFI.buffer(ptr, n * FFI.sizeof("size_t")), dtype=np.uintp).copy()
+
 def label_add_durs(htslabel, durs):
     """ seconds "end times" to HTK int start end times
     """
@@ -121,8 +136,22 @@ class HTS_EngineME(object):
         return self
 
     def __exit__(self, type, value, traceback):
+        self.clear()
+
+    def refresh(self):
+        """Free memory allocated for the last synthesis request, the
+           loaded voice and filters are retained so that the engine
+           can be reused...
+        """
+        LIBHTS.HTS_Engine_refresh(self.engine)
+        self.donesynth = False
+
+    def clear(self):
+        """Free the engine completely (including the loaded voice)...
+        """
         LIBHTS.HTS_Engine_refresh(self.engine)
         LIBHTS.HTS_Engine_clear(self.engine)
+        self.donesynth = False
         #Other allocations get free'd automatically by CFFI when out of scope
 
     def synth(self, htslabel, lf0=None, use_labalignments=False):
@@ -153,11 +182,10 @@ class HTS_EngineME(object):
     def get_wav(self):
         assert self.donesynth
         waveform = Waveform()
-        waveform.samples = np.zeros(LIBHTS.HTS_Engine_get_nsamples(self.engine), np.int16) #16-bit samples
+        nsamples = LIBHTS.HTS_Engine_get_nsamples(self.engine)
+        waveform.samples = doublebuf_to_np(self.engine.gss.gspeech, nsamples).astype(np.int16) #16-bit samples
         waveform.samplerate = int(LIBHTS.HTS_Engine_get_sampling_frequency(self.engine))
         waveform.channels = 1
-        for i in range(len(waveform.samples)):
-            waveform.samples[i] = LIBHTS.HTS_Engine_get_generated_speech(self.engine, i) #copy
         return waveform
 
     def get_parm(self, parm):
@@ -169,35 +197,30 @@ class HTS_EngineME(object):
             parmidx = self.SPEECHPARMS[parm]
         else:
             parmidx = int(parm)
-        veclength = LIBHTS.HTS_GStreamSet_get_vector_length(FFI.new("HTS_GStreamSet *", self.engine.gss), parmidx)
-        length = LIBHTS.HTS_GStreamSet_get_total_frame(FFI.new("HTS_GStreamSet *", self.engine.gss))
-        x = np.zeros((veclength, length), dtype=np.float64)
-        for i in xrange(veclength):
-            for j in xrange(length):
-                x[i, j] = LIBHTS.HTS_Engine_get_generated_parameter(self.engine, parmidx, j, i) #copy
-        return x
+        gss = FFI.addressof(self.engine, "gss")
+        veclength = LIBHTS.HTS_GStreamSet_get_vector_length(gss, parmidx)
+        length = LIBHTS.HTS_GStreamSet_get_total_frame(gss)
+        #each frame is a separate allocation in HTS_GStream.par: copy row-wise
+        par = self.engine.gss.gstream[parmidx].par
+        x = np.empty((length, veclength), dtype=np.float64)
+        for j in xrange(length):
+            x[j] = doublebuf_to_np(par[j], veclength)
+        return x.T.copy()
 
     def get_dur(self):
         assert self.donesynth
-        durs = np.zeros(len(self.htslabel), dtype=np.float64)
-        states_per_model = LIBHTS.HTS_ModelSet_get_nstate(FFI.new("HTS_ModelSet *", self.engine.ms))
-        statei = 0
-        for i in range(len(self.htslabel)):
-            for j in range(states_per_model):
-                durs[i] += LIBHTS.HTS_SStreamSet_get_duration(FFI.new("HTS_SStreamSet *", self.engine.sss), statei)
-                statei += 1
+        states_per_model = LIBHTS.HTS_ModelSet_get_nstate(FFI.addressof(self.engine, "ms"))
+        nstates = len(self.htslabel) * states_per_model
+        statedurs = sizetbuf_to_np(self.engine.sss.duration, nstates)
+        durs = statedurs.reshape((len(self.htslabel), states_per_model)).sum(axis=1).astype(np.float64)
         durs *= self.engine.condition.fperiod / LIBHTS.HTS_Engine_get_sampling_frequency(self.engine)
         return durs
 
     def get_segtimes(self):
         assert self.donesynth
-        durs = self.get_dur()
-        starttime = 0.0
-        segtimes = []
-        for dur in durs:
-            segtimes.append([starttime, starttime+dur])
-            starttime += dur
-        return segtimes
+        endtimes = np.cumsum(self.get_dur())
+        starttimes = np.concatenate(([0.0], endtimes[:-1]))
+        return np.column_stack((starttimes, endtimes)).tolist()
 
     def get_f0(self, log=False):
         lf0 = self.get_parm("lf0")
@@ -207,6 +230,95 @@ class HTS_EngineME(object):
             return tof0(lf0).flatten()
         
 
+class HTS_EnginePool(object):
+    """A thread-safe pool of preloaded HTS_EngineME instances, parsing
+       the voice and filters only when no idle engine is available
+       (a "miss"). Engines are refreshed (not cleared) when returned
+       to the pool and at most `maxsize` idle engines are retained.
+       Idle engines are cleared when the pool is garbage collected
+       (engines in use keep the pool alive).
+    """
+    def __init__(self, voice, mefilt, pdfilt, maxsize=4):
+        self.voice = voice
+        self.mefilt = mefilt
+        self.pdfilt = pdfilt
+        self.maxsize = maxsize
+        self.idle = []
+        self.nengines = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        """Number of live engines (idle and in use)...
+        """
+        return self.nengines
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                self.hits += 1
+                return self.idle.pop()
+            self.misses += 1
+            self.nengines += 1
+        try:
+            return HTS_EngineME(self.voice, self.mefilt, self.pdfilt)
+        except:
+            with self.lock:
+                self.nengines -= 1
+            raise
+
+    def release(self, htsengine):
+        htsengine.refresh()
+        with self.lock:
+            if len(self.idle) < self.maxsize:
+                self.idle.append(htsengine)
+                return
+            self.nengines -= 1
+        htsengine.clear()
+
+    def clear(self):
+        """Free all idle engines...
+        """
+        with self.lock:
+            idle, self.idle = self.idle, []
+            self.nengines -= len(idle)
+        for htsengine in idle:
+            htsengine.clear()
+
+    def __del__(self):
+        try:
+            self.clear()
+        except Exception: #e.g. module globals already gone at interpreter exit
+            pass
+
+    def stats(self):
+        with self.lock:
+            return {"size": self.nengines,
+                    "idle": len(self.idle),
+                    "maxsize": self.maxsize,
+                    "hits": self.hits,
+                    "misses": self.misses}
+
+    def __call__(self):
+        """Use as: `with pool() as htsengine: ...`
+        """
+        return _PooledEngine(self)
+
+class _PooledEngine(object):
+    def __init__(self, pool):
+        self.pool = pool
+        self.htsengine = None
+
+    def __enter__(self):
+        self.htsengine = self.pool.acquire()
+        return self.htsengine
+
+    def __exit__(self, type, value, traceback):
+        self.pool.release(self.htsengine)
+        self.htsengine = None
+
+
 def maintest():
     """Brute-force method to check for memory leaks...
     """
@@ -245,5 +357,53 @@ def maintest():
             # pl.plot(durs)
             # pl.show()
 
+def benchtest(reps=10):
+    """Compare bulk waveform/parameter extraction with per-element CFFI
+       calls (as previously implemented)...
+    """
+    import sys, timeit
+    voicefn, mefiltfn, pdfiltfn, labfn = sys.argv[1:5]
+    with open(voicefn, "rb") as infh:
+        voice = infh.read()
+    with open(labfn) as infh:
+        label = infh.read().splitlines()
+    with open(mefiltfn) as infh:
+        mefilt = infh.read()
+    with open(pdfiltfn) as infh:
+        pdfilt = infh.read()
+
+    def get_wav_elementwise(htsengine):
+        samples = np.zeros(LIBHTS.HTS_Engine_get_nsamples(htsengine.engine), np.int16)
+        for i in range(len(samples)):
+            samples[i] = LIBHTS.HTS_Engine_get_generated_speech(htsengine.engine, i)
+        return samples
+
+    def get_parm_elementwise(htsengine, parmidx):
+        veclength = LIBHTS.HTS_GStreamSet_get_vector_length(FFI.new("HTS_GStreamSet *", htsengine.engine.gss), parmidx)
+        length = LIBHTS.HTS_GStreamSet_get_total_frame(FFI.new("HTS_GStreamSet *", htsengine.engine.gss))
+        x = np.zeros((veclength, length), dtype=np.float64)
+        for i in xrange(veclength):
+            for j in xrange(length):
+                x[i, j] = LIBHTS.HTS_Engine_get_generated_parameter(htsengine.engine, parmidx, j, i)
+        return x
+
+    with HTS_EngineME(voice, mefilt, pdfilt) as htsengine:
+        htsengine.synth(label)
+        assert np.array_equal(get_wav_elementwise(htsengine), htsengine.get_wav().samples)
+        for parm in sorted(HTS_EngineME.SPEECHPARMS):
+            assert np.array_equal(get_parm_elementwise(htsengine, HTS_EngineME.SPEECHPARMS[parm]), htsengine.get_parm(parm))
+        print("nsamples: %s" % LIBHTS.HTS_Engine_get_nsamples(htsengine.engine))
+        for name, old, new in [("wav", lambda: get_wav_elementwise(htsengine), htsengine.get_wav),
+                               ("mgc", lambda: get_parm_elementwise(htsengine, 0), lambda: htsengine.get_parm("mgc"))]:
+            oldt = timeit.timeit(old, number=reps) / reps
+            newt = timeit.timeit(new, number=reps) / reps
+            print("%s: elementwise %.6fs bulk %.6fs (x%.1f)" % (name, oldt, newt, oldt / newt))
+
+
 if __name__ == "__main__":
-    maintest()
+    import sys
+    if "--bench" in sys.argv:
+        sys.argv.remove("--bench")
+        benchtest()
+    else:
+        maintest()
@@ -20,7 +20,11 @@ class Synthesizer(ttslab.synthesizers.hts.Synthesizer):
        engine which is capable of mixed excitation synthesis.
     """
 
+    LABEL_VARIANT = "tone"
+
     def feats(self, voice, utt, args):
+        if self.COLUMNAR_LABELS:
+            return ttslab.synthesizers.hts.Synthesizer.feats(self, voice, utt, args)
         lab = []
         starttime = 0
         for phone_item in utt.get_relation("Segment"):
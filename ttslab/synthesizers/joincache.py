@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""Join score matrices for the unit-selection Viterbi search (see
+   ttslab.synthesizers.unitselection), keyed by the pair of adjacent
+   unit types: entry[i, j] is the join score between candidate j of
+   the first and candidate i of the second unit type.
+
+   Matrices can be precomputed for all unit type pairs that can be
+   adjacent and saved to a file next to the unit catalogue (memory
+   mapped when loaded, see ttslab.serialization), and/or computed when
+   first needed and kept in a bounded LRU store. To bound memory
+   matrices can be stored as float32, float16 or quantized to uint16
+   (float64 gives the same scores as computing the joins).
+
+   Precompute for a unit catalogue with:
+
+       python -m ttslab.synthesizers.joincache catalogue.pickle --dtype float16
+
+   which is then used by Synthesizer(unitcataloguefile="catalogue.pickle"),
+   or enable for a synthesizer with:
+
+       synth.joincache = JoinCache(dtype="float16", maxbytes=2**29)
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.spatial.distance import cdist
+
+import ttslab.serialization as serialization
+
+JOINCACHE_EXT = ".joincache"
+JOINCACHE_VERSION = 1
+DTYPES = ["float64", "float32", "float16", "uint16"]
+QUANT_MAX = 2**16 - 1 #uint16: score in [0.0, 1.0] -> round(score * QUANT_MAX)
+
+def join_scores(prevcands, cands):
+    """ Join scores between all candidates (UnitCandidates) of adjacent
+        unit types, value range: (0.0, 1.0]...
+    """
+    return 6 / (cdist(cands.left, prevcands.right, "euclidean") + 6)
+
+def catalogue_fingerprint(unitcands):
+    """ Hash of the join coefficients of all unit types
+        (UnitCandidates), a stored cache is only used for the same
+        catalogue...
+    """
+    h = hashlib.sha1()
+    for unitname in sorted(unitcands):
+        h.update(unitname.encode("utf-8"))
+        for coefs in [unitcands[unitname].left, unitcands[unitname].right]:
+            h.update(np.ascontiguousarray(coefs, dtype=np.float64).tostring())
+    return h.hexdigest()
+
+
+class JoinCache(object):
+    """Join score matrices from file and an LRU store of those computed
+       when needed...
+    """
+    def __init__(self, dtype="float32", maxbytes=2**28, fn=None):
+        """If "fn" exists, stored matrices are loaded (memory mapped)
+           and the dtype is that of the file...
+        """
+        if dtype not in DTYPES:
+            raise ValueError("Unknown dtype: %s (available: %s)" % (dtype, ", ".join(DTYPES)))
+        self.dtype = dtype
+        self.maxbytes = maxbytes
+        self.fn = fn
+        self._init_cache()
+
+    def _init_cache(self):
+        self.fingerprint = None
+        self._stored = {}              #(prevname, name) -> matrix (from file)
+        self._entries = OrderedDict()  #(prevname, name) -> matrix (computed)
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.fn is not None and os.path.exists(self.fn):
+            self.load()
+
+    def __getstate__(self):
+        return {"dtype": self.dtype, "maxbytes": self.maxbytes, "fn": self.fn}
+
+    def __setstate__(self, d):
+        self.dtype = d["dtype"]
+        self.maxbytes = d["maxbytes"]
+        self.fn = d["fn"]
+        self._init_cache()
+
+    def __len__(self):
+        return len(self._stored) + len(self._entries)
+
+    def bind(self, fingerprint):
+        """Use for the catalogue with "fingerprint", entries for a
+           different catalogue are dropped...
+        """
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                if self.fingerprint is not None:
+                    self._stored = {}
+                    self._entries.clear()
+                    self._nbytes = 0
+                self.fingerprint = fingerprint
+
+    def encode(self, scores):
+        if self.dtype == "uint16":
+            return np.round(scores * QUANT_MAX).astype(np.uint16)
+        return scores.astype(self.dtype)
+
+    def decode(self, matrix, columns=None, rows=None):
+        """Float64 scores (a new array) of the given rows and columns
+           (only these are read from a memory-mapped matrix)...
+        """
+        if rows is not None:
+            matrix = matrix.take(rows, axis=0)
+        if columns is not None:
+            matrix = matrix.take(columns, axis=1)
+        if matrix.dtype == np.uint16:
+            return matrix / float(QUANT_MAX)
+        return matrix.astype(np.float64)
+
+    def _get(self, key, shape):
+        matrix = self._stored.get(key)
+        if matrix is not None and matrix.shape == shape:
+            return matrix
+        with self._lock:
+            matrix = self._entries.pop(key, None)
+            if matrix is None or matrix.shape != shape:
+                self.misses += 1
+                return None
+            self._entries[key] = matrix #most recently used
+            self.hits += 1
+            return matrix
+
+    def _put(self, key, matrix):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._nbytes -= old.nbytes
+            if matrix.nbytes > self.maxbytes:
+                return
+            self._entries[key] = matrix
+            self._nbytes += matrix.nbytes
+            while self._nbytes > self.maxbytes:
+                key, old = self._entries.popitem(last=False)
+                self._nbytes -= old.nbytes
+                self.evictions += 1
+
+    def scores(self, prevname, prevcands, name, cands, columns=None, rows=None):
+        """Join scores (float64, len(rows) x len(columns)) between
+           candidates (in "rows", all if None) of unit type "name" and
+           those (in "columns", all if None) of unit type "prevname"...
+        """
+        key = (prevname, name)
+        matrix = self._get(key, (len(cands), len(prevcands)))
+        if matrix is None:
+            matrix = self.encode(join_scores(prevcands, cands))
+            self._put(key, matrix)
+        return self.decode(matrix, columns, rows)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self):
+        return {"stored": len(self._stored),
+                "stored_nbytes": sum(m.nbytes for m in self._stored.values()),
+                "size": len(self._entries),
+                "nbytes": self._nbytes,
+                "maxbytes": self.maxbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions}
+
+    def precompute(self, synth, pairs=None):
+        """Compute (to be saved) the matrices for "pairs" of unit type
+           names, by default all pairs that can be adjacent (see
+           Synthesizer._unit_pairs)...
+        """
+        if pairs is None:
+            pairs = synth._unit_pairs()
+        stored = {}
+        for prevname, name in pairs:
+            stored[(prevname, name)] = self.encode(join_scores(synth._candidates(prevname), synth._candidates(name)))
+        self.bind(synth._catalogue_fingerprint)
+        with self._lock:
+            self._stored.update(stored)
+            for key in stored:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._nbytes -= old.nbytes
+
+    def save(self, fn=None, include_computed=True):
+        """Save stored (and computed) matrices, the file is replaced
+           atomically...
+        """
+        fn = fn or self.fn
+        with self._lock:
+            pairs = dict(self._stored)
+            if include_computed:
+                pairs.update(self._entries)
+        fd, tmpfn = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(fn)))
+        os.close(fd)
+        try:
+            serialization.dump({"version": JOINCACHE_VERSION,
+                                "dtype": self.dtype,
+                                "fingerprint": self.fingerprint,
+                                "pairs": pairs}, tmpfn, minbytes=0) #all matrices memory mapped
+            os.rename(tmpfn, fn)
+        except:
+            if os.path.exists(tmpfn):
+                os.remove(tmpfn)
+            raise
+
+    def load(self, fn=None):
+        fn = fn or self.fn
+        d = serialization.load(fn)
+        if d["version"] != JOINCACHE_VERSION:
+            raise serialization.FormatError("Unsupported join cache version %s: %s" % (d["version"], fn))
+        with self._lock:
+            self.dtype = d["dtype"]
+            self.fingerprint = d["fingerprint"]
+            self._stored = d["pairs"]
+            self._entries.clear()
+            self._nbytes = 0
+
+
+if __name__ == "__main__":
+    import sys, argparse
+    import ttslab
+    import ttslab.synthesizers.unitselection as unitselection
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('cataloguefn', metavar='CATALOGUEFN', type=str, help="unit catalogue file")
+    parser.add_argument('--dtype', metavar='DTYPE', type=str, default="float32", help="one of: %s" % ", ".join(DTYPES))
+    parser.add_argument('--outfn', metavar='OUTFN', type=str, default=None, help="default: CATALOGUEFN" + JOINCACHE_EXT)
+    args = parser.parse_args()
+
+    synth = unitselection.Synthesizer()
+    synth.unitcatalogue = ttslab.fromfile(args.cataloguefn)
+    joincache = JoinCache(dtype=args.dtype)
+    joincache.precompute(synth)
+    joincache.save(args.outfn or args.cataloguefn + JOINCACHE_EXT)
+    print("%(stored)s matrices, %(stored_nbytes)s bytes" % joincache.stats(), file=sys.stderr)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""RELP synthesis filter with scipy.signal.lfilter: the all-pole LPC
+   filter is run over the sample span of each frame in one call, the
+   filter state is carried over from the previous output samples.
+
+   Gives the same output as the compiled filter (relp.pyx) up to
+   floating point summation order, including its quirk that the first
+   output sample is never fed back (j - k > 0).
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import numpy as np
+from scipy.signal import lfilter
+
+def frame_ends(times, nsamples, samplerate):
+    """ Last sample (exclusive) filtered with each frame: halfway to
+        the next frame...
+    """
+    ends = np.empty(len(times), dtype=np.int64)
+    ends[:-1] = ((times[:-1] + times[1:]) * samplerate).astype(np.int64) // 2
+    ends[-1] = nsamples
+    return np.minimum(ends, nsamples)
+
+def synth_filter(times, lpcs, residual, samplerate):
+    """ Returns float samples (truncate with astype("int16"))...
+    """
+    residual = np.asarray(residual, dtype=np.float64)
+    nsamples = len(residual)
+    order = lpcs.shape[1] - 1
+    samples = np.zeros(nsamples, dtype=np.float64)
+    history = np.zeros(order, dtype=np.float64) #most recent first
+    b = np.ones(1)
+    startsample_index = 0
+    for frame, endsample_index in zip(lpcs, frame_ends(times, nsamples, samplerate)):
+        start = startsample_index
+        if start == 0 and endsample_index > 0:
+            samples[0] = residual[0] #no feedback for the first sample
+            start = 1
+        if endsample_index > start:
+            a = np.empty(order + 1, dtype=np.float64)
+            a[0] = 1.0
+            a[1:] = -frame[1:]
+            #previous outputs, sample 0 is never fed back:
+            history[:] = 0.0
+            prev = samples[max(start - order, 1):start][::-1]
+            history[:len(prev)] = prev
+            zi = -np.correlate(a[1:], history, "full")[order-1:] #as lfiltic(b, a, history)
+            samples[start:endsample_index] = lfilter(b, a, residual[start:endsample_index], zi=zi)[0]
+        startsample_index = endsample_index
+    return samples
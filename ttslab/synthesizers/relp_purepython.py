@@ -37,3 +37,26 @@ def synth_filter(times, lpcs, residual, samplerate):
             samples[j] = np.int16(s) + residual[j]         #assuming 16bit samples
         startsample_index = endsample_index
     return samples
+
+def synth_filter_float(times, lpcs, residual, samplerate):
+    """ As the compiled filter (relp.pyx): float samples, truncated
+        to 16-bit by the caller...
+    """
+    samples = np.zeros(len(residual), dtype=np.float64)
+    startsample_index = 0
+    for i, frame in enumerate(lpcs):
+        try:
+            endsample_index = int((times[i] + times[i+1]) * samplerate) // 2
+        except IndexError:
+            endsample_index = len(residual)
+        if endsample_index > len(residual):
+            endsample_index = len(residual)
+
+        for j in xrange(startsample_index, endsample_index):
+            s = 0.0
+            for k in xrange(1, len(frame)):
+                if j - k > 0:
+                    s += frame[k] * samples[j - k]
+            samples[j] = s + residual[j]
+        startsample_index = endsample_index
+    return samples
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Pre-windowed residual frames of all candidates in a unit catalogue
+   (see ttslab.synthesizers.unitselection.window_frames), so that
+   concatenation only gathers and overlap-adds them: one contiguous
+   array of windowed samples for the catalogue with the window
+   offsets and lengths of all frames and the first frame of each
+   candidate.
+
+   Candidates are numbered in the order of the sorted unit type names
+   and their lists in the catalogue (the catalogue is not modified).
+   Arrays are saved in a file next to the catalogue (see
+   ttslab.serialization) and memory-mapped when loaded, so that
+   server processes loading the same file share the pages.
+
+   Build for a unit catalogue with:
+
+       python -m ttslab.synthesizers.residualframes catalogue.pickle
+
+   which is then used by Synthesizer(unitcataloguefile="catalogue.pickle").
+   Global pitch mark positions depend on the time offsets of units in
+   the utterance and are computed when concatenating.
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import os
+import tempfile
+
+import numpy as np
+
+import ttslab.serialization as serialization
+
+FRAMES_EXT = ".frames"
+FRAMES_VERSION = 1
+
+def _candidates(catalogue):
+    for unitname in sorted(catalogue):
+        for cand in catalogue[unitname]:
+            yield cand
+
+
+class ResidualFrames(object):
+    """Windowed residual frames of a unit catalogue...
+    """
+    def __init__(self, fn=None):
+        self.fn = fn
+        self._init_frames()
+
+    def _init_frames(self):
+        self.unitnames = []
+        self.ncands = np.zeros(0, dtype=np.int64)    #per unit type
+        self.candframes = np.zeros(1, dtype=np.int64) #first frame of each candidate (and total)
+        self.framestarts = np.zeros(0, dtype=np.int64) #in samples
+        self.framelens = np.zeros(0, dtype=np.int32)
+        self.samples = np.zeros(0)
+        self._catalogue = None
+        self._candindices = None #id(cand) -> index
+        if self.fn is not None and os.path.exists(self.fn):
+            self.load()
+
+    def __getstate__(self):
+        """Only the filename is kept if the frames have been saved...
+        """
+        if self.fn is not None and os.path.exists(self.fn):
+            return {"fn": self.fn}
+        d = self.__dict__.copy()
+        d["_catalogue"] = None
+        d["_candindices"] = None
+        return d
+
+    def __setstate__(self, d):
+        if set(d) == set(["fn"]):
+            self.fn = d["fn"]
+            self._init_frames()
+        else:
+            self.__dict__.update(d)
+
+    def __len__(self):
+        return len(self.candframes) - 1
+
+    def build(self, catalogue, dtype=np.float64, chunksize=2**16):
+        """Window the residuals of all candidates (in chunks of
+           "chunksize" candidates)...
+        """
+        from ttslab.synthesizers.unitselection import window_frames
+        cands = list(_candidates(catalogue))
+        framelens = []
+        samples = []
+        for i in range(0, len(cands), chunksize):
+            chunk = cands[i:i+chunksize]
+            lengths, windowed = window_frames([cand["lpc-coefs"] for cand in chunk],
+                                              [np.asarray(cand["residuals"]).ravel() for cand in chunk])
+            framelens.append(lengths)
+            samples.append(windowed.astype(dtype))
+        self.unitnames = sorted(catalogue)
+        self.ncands = np.array([len(catalogue[unitname]) for unitname in self.unitnames], dtype=np.int64)
+        self.candframes = np.zeros(len(cands) + 1, dtype=np.int64)
+        self.candframes[1:] = np.cumsum([len(cand["lpc-coefs"].times) for cand in cands])
+        self.framelens = np.concatenate(framelens).astype(np.int32)
+        self.framestarts = np.cumsum(self.framelens, dtype=np.int64) - self.framelens
+        self.samples = np.concatenate(samples)
+        self.bind(catalogue)
+
+    def bind(self, catalogue):
+        """Use for "catalogue": checks that the unit types, candidates
+           and frames match...
+        """
+        if catalogue is self._catalogue:
+            return
+        if sorted(catalogue) != list(self.unitnames) or \
+           any(len(catalogue[unitname]) != n for unitname, n in zip(self.unitnames, self.ncands)):
+            raise ValueError("Residual frames do not match unit catalogue (unit types or candidates)")
+        cands = list(_candidates(catalogue))
+        nframes = np.array([len(cand["lpc-coefs"].times) for cand in cands], dtype=np.int64)
+        if not np.array_equal(nframes, np.diff(self.candframes)):
+            raise ValueError("Residual frames do not match unit catalogue (frames)")
+        self._candindices = dict((id(cand), i) for i, cand in enumerate(cands))
+        self._catalogue = catalogue
+
+    def frames(self, cands):
+        """Window lengths and concatenated windowed samples of all
+           frames of "cands" (as window_frames)...
+        """
+        indices = np.array([self._candindices[id(cand)] for cand in cands], dtype=np.int64)
+        firsts = self.candframes[indices]
+        nframes = self.candframes[indices + 1] - firsts
+        frameindices = np.repeat(firsts - (np.cumsum(nframes) - nframes), nframes) + np.arange(nframes.sum())
+        lengths = self.framelens[frameindices].astype(np.int64)
+        sampleindices = np.repeat(self.framestarts[frameindices] - (np.cumsum(lengths) - lengths), lengths) + \
+                        np.arange(lengths.sum())
+        return lengths, self.samples[sampleindices].astype(np.float64)
+
+    def save(self, fn=None):
+        """Save arrays (replaced atomically)...
+        """
+        fn = fn or self.fn
+        fd, tmpfn = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(fn)))
+        os.close(fd)
+        try:
+            serialization.dump({"version": FRAMES_VERSION,
+                                "unitnames": self.unitnames,
+                                "ncands": self.ncands,
+                                "candframes": self.candframes,
+                                "framestarts": self.framestarts,
+                                "framelens": self.framelens,
+                                "samples": self.samples}, tmpfn, minbytes=0) #all arrays memory mapped
+            os.rename(tmpfn, fn)
+        except:
+            if os.path.exists(tmpfn):
+                os.remove(tmpfn)
+            raise
+        self.fn = fn
+
+    def load(self, fn=None):
+        fn = fn or self.fn
+        d = serialization.load(fn)
+        if d["version"] != FRAMES_VERSION:
+            raise serialization.FormatError("Unsupported residual frames version %s: %s" % (d["version"], fn))
+        for key in ["unitnames", "ncands", "candframes", "framestarts", "framelens", "samples"]:
+            setattr(self, key, d[key])
+        self._catalogue = None
+        self._candindices = None
+
+
+if __name__ == "__main__":
+    import sys, argparse
+    import ttslab
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('cataloguefn', metavar='CATALOGUEFN', type=str, help="unit catalogue file")
+    parser.add_argument('--dtype', metavar='DTYPE', type=str, default="float64",
+                        help="of windowed samples (float32 halves the size, output may differ slightly)")
+    parser.add_argument('--outfn', metavar='OUTFN', type=str, default=None, help="default: CATALOGUEFN" + FRAMES_EXT)
+    args = parser.parse_args()
+
+    frames = ResidualFrames()
+    frames.build(ttslab.fromfile(args.cataloguefn), dtype=np.dtype(str(args.dtype)))
+    frames.save(args.outfn or args.cataloguefn + FRAMES_EXT)
+    print("%s candidates, %s frames, %s bytes" % (len(frames), len(frames.framelens), frames.samples.nbytes),
+          file=sys.stderr)
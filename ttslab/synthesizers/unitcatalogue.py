@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""Columnar unit catalogue for the unit-selection synthesizers (see
+   ttslab.synthesizers.unitselection and unitselection_word): the
+   candidates of all unit types in one table, each candidate field a
+   column of contiguous arrays:
+
+       - "fixed": arrays of the same shape (e.g. join coefficients)
+         as rows of one array
+       - "ragged": arrays of different lengths (e.g. residuals)
+         concatenated with offsets
+       - "track": Track objects (e.g. LPC coefficients) as
+         concatenated times and values with offsets
+       - "codes": scalar values (strings, numbers, None) as integer
+         codes into a table of values
+       - "objects": anything else, as a list
+
+   Arrays are saved in a file (see ttslab.serialization) and memory
+   mapped when loaded, so that loading is fast and server processes
+   loading the same file share the pages. The catalogue is a read-only
+   mapping from unit type name to a sequence of candidate views which
+   behave as the candidate dicts of the pickled catalogue (fields are
+   read from the arrays when accessed).
+
+   Convert a pickled unit catalogue with:
+
+       python -m ttslab.synthesizers.unitcatalogue catalogue.pickle
+
+   which is then used by Synthesizer(unitcataloguefile="catalogue.pickle")
+   (or Synthesizer(unitcataloguefile="catalogue.pickle.units")).
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import os
+import tempfile
+from collections import Mapping, Sequence
+
+import numpy as np
+
+import ttslab.serialization as serialization
+from ttslab.trackfile import Track
+
+UNITCATALOGUE_EXT = ".units"
+UNITCATALOGUE_VERSION = 1
+
+def _isscalar(value):
+    return value is None or isinstance(value, (basestring, int, long, float, bool, np.generic)) #Py2
+
+def _offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    return offsets
+
+def _make_column(values):
+    """ Column ("kind", arrays...) of the values of one field for all
+        candidates (None where the field is missing)...
+    """
+    present = [value for value in values if value is not None]
+    if all(_isscalar(value) for value in values):
+        table = {} #(type, value) -> code: keeps e.g. 1 and 1.0 apart
+        vocab = []
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            key = (type(value), value)
+            if key not in table:
+                table[key] = len(vocab)
+                vocab.append(value)
+            codes[i] = table[key]
+        return ("codes", vocab, codes)
+    if len(present) == len(values) and all(type(value) is np.ndarray and value.ndim > 0 for value in values):
+        if len(set((value.dtype, value.shape) for value in values)) == 1:
+            return ("fixed", np.array(values))
+        if len(set((value.dtype, value.shape[1:]) for value in values)) == 1:
+            return ("ragged", np.concatenate(values), _offsets([len(value) for value in values]))
+    if len(present) == len(values) and all(type(value) is Track and set(value.__dict__) == set(["times", "values"])
+                                           for value in values):
+        if len(set((value.values.dtype, value.values.shape[1:]) for value in values)) == 1:
+            return ("track",
+                    np.concatenate([np.asarray(value.times, dtype=np.float64) for value in values]),
+                    np.concatenate([value.values for value in values]),
+                    _offsets([len(value.times) for value in values]))
+    return ("objects", list(values))
+
+
+class Candidate(Mapping):
+    """Read-only view of a candidate in a UnitCatalogue, pickled (and
+       copied) as a dict...
+    """
+    __slots__ = ["catalogue", "index"]
+
+    def __init__(self, catalogue, index):
+        self.catalogue = catalogue
+        self.index = index
+
+    def __getitem__(self, key):
+        return self.catalogue._field(key, self.index)
+
+    def __iter__(self):
+        for key in self.catalogue.fields:
+            if self.catalogue._present(key, self.index):
+                yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __reduce__(self):
+        return (dict, (list(self.items()),))
+
+    def __repr__(self):
+        return "Candidate(%s)" % self.index
+
+
+class CandidateList(Sequence):
+    """The candidates of one unit type in a UnitCatalogue...
+    """
+    def __init__(self, catalogue, start, stop):
+        self.catalogue = catalogue
+        self.start = start
+        self.stop = stop
+        self._cands = [Candidate(catalogue, i) for i in range(start, stop)] #kept: selected candidates are compared by id
+
+    def __getitem__(self, index):
+        return self._cands[index]
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def column(self, key, default=None):
+        """Values of field "key" of all candidates (default where
+           missing), an array for "fixed" and "codes" columns...
+        """
+        return self.catalogue._column(key, self.start, self.stop, default)
+
+
+class UnitCatalogue(Mapping):
+    """Mapping from unit type name to CandidateList...
+    """
+    def __init__(self, fn=None):
+        self.fn = fn
+        self._init_catalogue()
+
+    def _init_catalogue(self):
+        self.unitnames = []
+        self.unitstarts = np.zeros(1, dtype=np.int64) #first candidate of each unit type (and total)
+        self.columns = {}  #field -> ("kind", arrays...)
+        self.missing = {}  #field -> bool array (if missing for some candidates)
+        self._reset()
+        if self.fn is not None and os.path.exists(self.fn):
+            self.load()
+
+    def _reset(self):
+        self.fields = sorted(self.columns)
+        self._unitindices = dict((unitname, i) for i, unitname in enumerate(self.unitnames))
+        self._lists = {}
+        self._vocabs = {}
+
+    def __getstate__(self):
+        """Only the filename is kept if the catalogue has been saved...
+        """
+        if self.fn is not None and os.path.exists(self.fn):
+            return {"fn": self.fn}
+        return {"fn": self.fn, "unitnames": self.unitnames, "unitstarts": self.unitstarts,
+                "columns": self.columns, "missing": self.missing}
+
+    def __setstate__(self, d):
+        if set(d) == set(["fn"]):
+            self.fn = d["fn"]
+            self._init_catalogue()
+        else:
+            self.__dict__.update(d)
+            self._reset()
+
+    def __getitem__(self, unitname):
+        cands = self._lists.get(unitname)
+        if cands is None:
+            i = self._unitindices[unitname]
+            cands = self._lists.setdefault(unitname, CandidateList(self, int(self.unitstarts[i]),
+                                                                   int(self.unitstarts[i+1])))
+        return cands
+
+    def __iter__(self):
+        return iter(self.unitnames)
+
+    def __len__(self):
+        return len(self.unitnames)
+
+    def __contains__(self, unitname):
+        return unitname in self._unitindices
+
+    @property
+    def numcands(self):
+        return int(self.unitstarts[-1])
+
+    @classmethod
+    def fromcatalogue(cls, catalogue):
+        """Convert a catalogue (dict of unit type name to list of
+           candidate dicts)...
+        """
+        self = cls()
+        self.unitnames = sorted(catalogue)
+        self.unitstarts = _offsets([len(catalogue[unitname]) for unitname in self.unitnames])
+        cands = [cand for unitname in self.unitnames for cand in catalogue[unitname]]
+        for key in sorted(set(key for cand in cands for key in cand)):
+            self.columns[key] = _make_column([cand.get(key) for cand in cands])
+            missing = np.array([key not in cand for cand in cands], dtype=np.bool_)
+            if missing.any():
+                self.missing[key] = missing
+        self._reset()
+        return self
+
+    def _present(self, key, index):
+        missing = self.missing.get(key)
+        return missing is None or not missing[index]
+
+    def _vocab(self, key):
+        vocab = self._vocabs.get(key)
+        if vocab is None:
+            vocab = np.empty(len(self.columns[key][1]), dtype=object)
+            vocab[:] = self.columns[key][1]
+            self._vocabs[key] = vocab
+        return vocab
+
+    def _field(self, key, index):
+        column = self.columns[key]
+        if not self._present(key, index):
+            raise KeyError(key)
+        kind = column[0]
+        if kind == "codes":
+            return column[1][column[2][index]]
+        if kind == "fixed":
+            return column[1][index]
+        if kind == "ragged":
+            return column[1][column[2][index]:column[2][index+1]]
+        if kind == "track":
+            track = Track()
+            track.times = column[1][column[3][index]:column[3][index+1]]
+            track.values = column[2][column[3][index]:column[3][index+1]]
+            return track
+        return column[1][index]
+
+    def _column(self, key, start, stop, default=None):
+        column = self.columns.get(key)
+        if column is None:
+            return [default] * (stop - start)
+        missing = self.missing.get(key)
+        if column[0] == "codes":
+            values = self._vocab(key)[column[2][start:stop]]
+        elif column[0] == "fixed" and missing is None:
+            return column[1][start:stop]
+        else:
+            values = [self._field(key, i) if self._present(key, i) else default for i in range(start, stop)]
+        if missing is not None:
+            for i in np.flatnonzero(missing[start:stop]):
+                values[i] = default
+        return values
+
+    def save(self, fn=None):
+        """Save arrays (replaced atomically)...
+        """
+        fn = fn or self.fn
+        fd, tmpfn = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(fn)))
+        os.close(fd)
+        try:
+            serialization.dump({"version": UNITCATALOGUE_VERSION,
+                                "unitnames": self.unitnames,
+                                "unitstarts": self.unitstarts,
+                                "columns": self.columns,
+                                "missing": self.missing}, tmpfn, minbytes=0) #all arrays memory mapped
+            os.rename(tmpfn, fn)
+        except:
+            if os.path.exists(tmpfn):
+                os.remove(tmpfn)
+            raise
+        self.fn = fn
+
+    def load(self, fn=None):
+        fn = fn or self.fn
+        d = serialization.load(fn)
+        if d["version"] != UNITCATALOGUE_VERSION:
+            raise serialization.FormatError("Unsupported unit catalogue version %s: %s" % (d["version"], fn))
+        for key in ["unitnames", "unitstarts", "columns", "missing"]:
+            setattr(self, key, d[key])
+        self._reset()
+
+
+if __name__ == "__main__":
+    import sys, argparse
+    import ttslab
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('cataloguefn', metavar='CATALOGUEFN', type=str, help="unit catalogue file (pickled)")
+    parser.add_argument('--outfn', metavar='OUTFN', type=str, default=None,
+                        help="default: CATALOGUEFN" + UNITCATALOGUE_EXT)
+    args = parser.parse_args()
+
+    catalogue = UnitCatalogue.fromcatalogue(ttslab.fromfile(args.cataloguefn))
+    catalogue.save(args.outfn or args.cataloguefn + UNITCATALOGUE_EXT)
+    print("%s unit types, %s candidates, columns: %s" %
+          (len(catalogue), catalogue.numcands,
+           ", ".join("%s (%s)" % (key, catalogue.columns[key][0]) for key in catalogue.fields)), file=sys.stderr)
@@ -24,6 +24,7 @@ from __future__ import unicode_literals, division, print_function #Py2
 __author__ = "Daniel van Niekerk"
 __email__ = "dvn.demitasse@gmail.com"
 
+import os
 import copy
 
 import numpy as np
@@ -33,9 +34,22 @@ import ttslab
 from ttslab.waveform import Waveform
 
 import ttslab.synthesizer
-from ttslab.synthesizers.relp import synth_filter
+import ttslab.synthesizers.relp_lfilter as relp_lfilter
+import ttslab.synthesizers.relp_purepython as relp_purepython
+try:
+    import ttslab.synthesizers.relp as relp #compiled: see compile_relp.sh
+except ImportError:
+    relp = None
+from ttslab.synthesizers.joincache import JoinCache, JOINCACHE_EXT, catalogue_fingerprint
+from ttslab.synthesizers.residualframes import ResidualFrames, FRAMES_EXT
+from ttslab.synthesizers.unitcatalogue import UnitCatalogue, CandidateList, UNITCATALOGUE_EXT
 
 SAMPLERATE = 16000
+#RELP synthesis filters: output truncated to 16-bit in _concatunits
+SYNTH_FILTERS = {"lfilter": relp_lfilter.synth_filter,
+                 "purepython": relp_purepython.synth_filter_float} #reference (slow), same output as the others
+if relp is not None:
+    SYNTH_FILTERS["relp"] = relp.synth_filter
 WINDOWFACTOR = 1
 #using the hamming window: np.hamming
 
@@ -66,16 +80,220 @@ def window_residual(lpctrack, residual):
 
     return residuals
 
+def concat_units_reference(cands):
+    """ Concatenated LPC frame times and coefficients and overlap-added
+        windowed residual of candidate units...
+    """
+    #concat:
+    lpctrack = copy.deepcopy(cands[0]["lpc-coefs"])
+    residuals = window_residual(cands[0]["lpc-coefs"], cands[0]["residuals"])
+    for cand in cands[1:]:
+        temptrack = cand["lpc-coefs"]
+        #append lpccoefs to lpctrack:
+        lpctrack.times = np.concatenate((lpctrack.times, (temptrack.times + lpctrack.times[-1])))
+        lpctrack.values = np.concatenate((lpctrack.values, temptrack.values))
+        #append windowed residuals:
+        residuals.extend(window_residual(temptrack, cand["residuals"]))
+
+    #overlap add residual:
+    lastsample = int(round(lpctrack.times[-1] * SAMPLERATE)) + int(round(len(residuals[-1]) / 2))
+    residual = np.zeros(lastsample + 1)
+
+    for i, time in enumerate(lpctrack.times):
+        centersample = int(round(time * SAMPLERATE))
+        firstsample = centersample - int(len(residuals[i]) / 2)
+        residual[firstsample:firstsample+len(residuals[i])] += np.array(residuals[i])
+    return lpctrack.times, lpctrack.values, residual
+
+_hamming_windows = {} #length -> window
+
+def hamming(n):
+    """ np.hamming(n) (cached)...
+    """
+    window = _hamming_windows.get(n)
+    if window is None:
+        window = _hamming_windows.setdefault(n, np.hamming(n))
+    return window
+
+def round_half_away(x):
+    """ int(round(x)) (Python 2: half away from zero) of each element...
+    """
+    a = np.abs(x)
+    r = np.floor(a)
+    r += (a - r) >= 0.5
+    return (np.sign(x) * r).astype(np.int64)
+
+def _slice_bounds(index, length):
+    """ Python slice semantics for (arrays of) start and stop
+        indices...
+    """
+    return np.where(index < 0, np.maximum(index + length, 0), np.minimum(index, length))
+
+def window_frames(tracks, residuals):
+    """ Windowed residual frames of units (as window_residual) with
+        array operations: sample indices of the windows are computed
+        for all pitch marks at once and windowing is a gather. Returns
+        the window lengths and concatenated windowed samples...
+    """
+    nframes = np.array([len(track.times) for track in tracks], dtype=np.int64)
+    reslens = np.array([len(residual) for residual in residuals], dtype=np.int64)
+    unittimes = np.concatenate([track.times for track in tracks])
+    prevtimes = np.empty_like(unittimes)
+    prevtimes[1:] = unittimes[:-1]
+    prevtimes[(np.cumsum(nframes) - nframes)[nframes > 0]] = 0.0
+    halfperiods = unittimes - prevtimes
+    centersamples = round_half_away(unittimes * SAMPLERATE)
+    firstsamples = round_half_away((unittimes - (halfperiods * WINDOWFACTOR)) * SAMPLERATE)
+    lastsamples = centersamples + (centersamples - firstsamples)
+    framereslens = np.repeat(reslens, nframes)
+    starts = _slice_bounds(firstsamples, framereslens)
+    lengths = np.maximum(_slice_bounds(lastsamples + 1, framereslens) - starts, 0)
+    #per sample (of all windows): frame and index in window
+    frameindices = np.repeat(np.arange(len(lengths)), lengths)
+    positions = np.arange(len(frameindices)) - (np.cumsum(lengths) - lengths)[frameindices]
+    #hamming windows of each length, concatenated:
+    windowlens, windowids = np.unique(lengths, return_inverse=True)
+    windows = np.concatenate([hamming(n) for n in windowlens])
+    windowstarts = np.cumsum(windowlens) - windowlens
+    sourcestarts = np.repeat(np.cumsum(reslens) - reslens, nframes) + starts
+    windowed = windows[windowstarts[windowids][frameindices] + positions] * \
+               np.concatenate(residuals)[sourcestarts[frameindices] + positions]
+    return lengths, windowed
+
+def overlap_add(times, lengths, windowed):
+    """ Overlap-add windowed frames (concatenated, with "lengths")
+        centred on "times" as in concat_units_reference: a bincount
+        (adding in frame order)...
+    """
+    nsamples = round_half_away(times[-1] * SAMPLERATE) + (lengths[-1] + 1) // 2 + 1
+    targetstarts = round_half_away(times * SAMPLERATE) - lengths // 2
+    #target index of each windowed sample:
+    indices = np.repeat(targetstarts - (np.cumsum(lengths) - lengths), lengths) + np.arange(len(windowed))
+    return np.bincount(indices, weights=windowed, minlength=nsamples)[:nsamples]
+
+def concat_units(cands, residualframes=None):
+    """ The same as concat_units_reference with array operations (see
+        window_frames and overlap_add). Windowed frames are taken from
+        "residualframes" (see ttslab.synthesizers.residualframes) if
+        given...
+    """
+    tracks = [cand["lpc-coefs"] for cand in cands]
+    nframes = np.array([len(track.times) for track in tracks], dtype=np.int64)
+    #each unit's times are offset by the last (offset) time of the previous:
+    offsets = np.empty(len(tracks))
+    offset = 0.0
+    for i, track in enumerate(tracks):
+        offsets[i] = offset
+        if len(track.times):
+            offset = track.times[-1] + offset
+    times = np.concatenate([track.times for track in tracks]) + np.repeat(offsets, nframes)
+    values = np.concatenate([track.values for track in tracks])
+    if residualframes is not None:
+        lengths, windowed = residualframes.frames(cands)
+    else:
+        lengths, windowed = window_frames(tracks, [np.asarray(cand["residuals"]).ravel() for cand in cands])
+    return times, values, overlap_add(times, lengths, windowed)
+
+
+class UnitCandidates(object):
+    """ Arrays over the candidates of one unit type (in catalogue
+        order) used by the vectorized Viterbi search: join
+        coefficients, target features encoded as integer codes and
+        numeric target features (NaN for None). Columns of a
+        columnar catalogue (see ttslab.synthesizers.unitcatalogue) are
+        read directly...
+    """
+    def __init__(self, cands, featnames, featcodes, numfeatnames):
+        self.cands = cands
+        if isinstance(cands, CandidateList):
+            column = cands.column
+        else:
+            column = lambda name: [c.get(name) for c in cands]
+        self.left = np.asarray(column("left-joincoef"), dtype=np.float64)
+        self.right = np.asarray(column("right-joincoef"), dtype=np.float64)
+        self.feats = np.array([[codes.setdefault(value, len(codes)) for value in column(name)]
+                               for name, codes in zip(featnames, featcodes)], dtype=np.int32).T.reshape((len(cands), len(featnames)))
+        self.numfeats = dict((name, np.array([np.nan if value is None else value for value in column(name)], dtype=np.float64))
+                             for name in numfeatnames)
+
+    def __len__(self):
+        return len(self.cands)
+
 
 class Synthesizer(ttslab.synthesizer.Synthesizer):
     """ Implementation with halfphone units... 
     """
+    VECTORIZED = True #else use _selectunits_reference and concat_units_reference
+    TARGET_FEATURES = ["position_in_syl", "position_in_word", "position_in_phrase",
+                       "context_nextsegment", "context_prevsegment"]
+    NUMERIC_TARGET_FEATURES = ["num_syls"]
+    #Viterbi search parameters (may be set per request in synthparms, see _searchparms):
+    PRUNE_SCORE_DELTA = 0.01  #beam: keep candidates scoring within this fraction of the best
+    PRUNE_NUM_CANDS = 100     #beam: max candidates kept
+    PRESELECT_NUM_CANDS = None #max candidates (best target scores) considered per unit, None for all
+    SYNTH_FILTER = None #key in SYNTH_FILTERS, default: "relp" if compiled else "lfilter"
+    joincache = None #see ttslab.synthesizers.joincache
+    residualframes = None #see ttslab.synthesizers.residualframes
+
     def __init__(self, unitcataloguefile=None):
         if unitcataloguefile:
             self._load_unitcatalogue(unitcataloguefile)
 
+    def __getstate__(self):
+        """ Candidate arrays are rebuilt when loaded...
+        """
+        d = self.__dict__.copy()
+        d.pop("_unitcands", None)
+        d.pop("_featcodes", None)
+        d.pop("_catalogue_fingerprint", None)
+        return d
+
+    def __setstate__(self, d):
+        self.__dict__.update(d)
+        if "unitcatalogue" in d:
+            self._index_catalogue()
+
     def _load_unitcatalogue(self, unitcataloguefile):
-        self.unitcatalogue = ttslab.fromfile(unitcataloguefile)
+        if unitcataloguefile.endswith(UNITCATALOGUE_EXT):
+            self.unitcatalogue = UnitCatalogue(fn=unitcataloguefile)
+        elif os.path.exists(unitcataloguefile + UNITCATALOGUE_EXT): #converted (columnar, memory mapped)
+            self.unitcatalogue = UnitCatalogue(fn=unitcataloguefile + UNITCATALOGUE_EXT)
+        else:
+            self.unitcatalogue = ttslab.fromfile(unitcataloguefile)
+        if os.path.exists(unitcataloguefile + JOINCACHE_EXT):
+            self.joincache = JoinCache(fn=unitcataloguefile + JOINCACHE_EXT)
+        if os.path.exists(unitcataloguefile + FRAMES_EXT):
+            self.residualframes = ResidualFrames(fn=unitcataloguefile + FRAMES_EXT)
+        self._index_catalogue()
+
+    def _index_catalogue(self):
+        """ Build UnitCandidates for each unit type in the
+            catalogue...
+        """
+        self._featcodes = [{} for name in self.TARGET_FEATURES] #feature value -> code
+        self._unitcands = dict((unitname, UnitCandidates(cands, self.TARGET_FEATURES, self._featcodes,
+                                                         self.NUMERIC_TARGET_FEATURES))
+                               for unitname, cands in self.unitcatalogue.iteritems())
+        self._catalogue_fingerprint = catalogue_fingerprint(self._unitcands)
+        if self.joincache is not None:
+            self.joincache.bind(self._catalogue_fingerprint)
+
+    def _candidates(self, unitname):
+        if getattr(self, "_unitcands", None) is None: #catalogue assigned directly
+            self._index_catalogue()
+        return self._unitcands[unitname]
+
+    def _featcode(self, featindex, value):
+        return self._featcodes[featindex].get(value, -1)
+
+    def _unit_pairs(self):
+        """ Pairs of unit types that can be adjacent in the Unit
+            relation (see feats)...
+        """
+        lefts = sorted(name for name in self.unitcatalogue if name.startswith("left-"))
+        rights = sorted(name for name in self.unitcatalogue if name.startswith("right-"))
+        return ([(left, "right-" + left[len("left-"):]) for left in lefts if "right-" + left[len("left-"):] in self.unitcatalogue] +
+                [(right, left) for right in rights for left in lefts])
 
 
     def feats(self, voice, utt, args):
@@ -124,7 +342,118 @@ class Synthesizer(ttslab.synthesizer.Synthesizer):
         return utt
 
     #################### Lower level synth methods...
+    def _synth_filter(self):
+        if self.SYNTH_FILTER is None:
+            return SYNTH_FILTERS.get("relp", relp_lfilter.synth_filter)
+        try:
+            return SYNTH_FILTERS[self.SYNTH_FILTER]
+        except KeyError:
+            raise ttslab.SynthesisError("Synthesis filter not available: %s (available: %s)" %
+                                        (self.SYNTH_FILTER, ", ".join(sorted(SYNTH_FILTERS))))
+
+    def _searchparms(self, synthparms):
+        """ Viterbi search parameters: the class defaults, overridden
+            by keys "prunescoredelta", "prunenumcands" and
+            "preselectnumcands" in synthparms (dict)...
+        """
+        parms = {"prunescoredelta": self.PRUNE_SCORE_DELTA,
+                 "prunenumcands": self.PRUNE_NUM_CANDS,
+                 "preselectnumcands": self.PRESELECT_NUM_CANDS}
+        if isinstance(synthparms, dict):
+            for key in parms:
+                if key in synthparms:
+                    parms[key] = synthparms[key]
+        if not isinstance(parms["prunescoredelta"], (int, long, float, np.number)) or parms["prunescoredelta"] < 0.0: #Py2
+            raise ttslab.SynthesisError("Invalid prunescoredelta: %r" % (parms["prunescoredelta"],))
+        for key in ["prunenumcands", "preselectnumcands"]:
+            if parms[key] is None and key != "prunenumcands":
+                continue
+            if not isinstance(parms[key], (int, long, np.integer)) or parms[key] < 1: #Py2
+                raise ttslab.SynthesisError("Invalid %s: %r" % (key, parms[key]))
+            parms[key] = int(parms[key])
+        return parms
+
+    def _prune(self, scores, scoredelta=None, numcands=None):
+        """ Indices of candidates kept (in order of decreasing score
+            if capped)...
+        """
+        scoredelta = self.PRUNE_SCORE_DELTA if scoredelta is None else scoredelta
+        numcands = self.PRUNE_NUM_CANDS if numcands is None else numcands
+        best = scores.max()
+        keep = np.flatnonzero(scores > best - (scoredelta * best))
+        if len(keep) > numcands:
+            keep = keep[np.argsort(-scores[keep], kind="mergesort")[:numcands]]
+        return keep
+
+    def _preselect(self, targetscores, numcands):
+        """ Indices (in catalogue order) of the "numcands" candidates
+            with the best target scores, None for all...
+        """
+        if numcands is None or numcands >= len(targetscores):
+            return None
+        return np.sort(np.argsort(-targetscores, kind="mergesort")[:numcands])
+
     def _selectunits(self, utt, args):
+        """ Viterbi search over the candidates of each unit, the same
+            search (and pruning) as _selectunits_reference with array
+            operations: each step in the trellis is the candidate
+            indices kept, their backpointers and total scores.
+
+            With "preselectnumcands" only the candidates with the best
+            target scores are considered at each step (see
+            _searchparms), only their join scores are computed (or read
+            from the join cache)...
+        """
+        if not self.VECTORIZED:
+            return self._selectunits_reference(utt, args)
+        parms = self._searchparms(args)
+        unit_items = utt.get_relation("Unit").as_list()
+        unitcands = [self._candidates(unit_item["name"]) for unit_item in unit_items]
+        #t = 0:
+        preselected = None
+        if parms["preselectnumcands"] is not None:
+            preselected = self._preselect(self._targetscores(unit_items[0], unitcands[0]), parms["preselectnumcands"])
+        indices = np.arange(len(unitcands[0])) if preselected is None else preselected
+        trellis = [(indices, None, np.zeros(len(indices)))]
+        for t in range(1, len(unit_items)):
+            previndices, prevbackpointers, prevscores = trellis[-1]
+            targetscores = self._targetscores(unit_items[t], unitcands[t])
+            preselected = self._preselect(targetscores, parms["preselectnumcands"])
+            if preselected is not None:
+                targetscores = targetscores[preselected]
+            if self.joincache is not None:
+                if self.joincache.fingerprint != self._catalogue_fingerprint: #attached after indexing
+                    self.joincache.bind(self._catalogue_fingerprint)
+                scorematrix = self.joincache.scores(unit_items[t-1]["name"], unitcands[t-1],
+                                                    unit_items[t]["name"], unitcands[t], previndices, preselected)
+            else:
+                left = unitcands[t].left if preselected is None else unitcands[t].left[preselected]
+                scorematrix = cdist(left, unitcands[t-1].right[previndices], "euclidean")
+                scorematrix = 6 / (scorematrix + 6)
+            scorematrix += prevscores
+            scorematrix += targetscores[:, np.newaxis]
+            backpointers = scorematrix.argmax(axis=1)
+            scores = scorematrix[np.arange(len(backpointers)), backpointers]
+            keep = self._prune(scores, parms["prunescoredelta"], parms["prunenumcands"])
+            trellis.append((keep if preselected is None else preselected[keep], backpointers[keep], scores[keep]))
+
+        #traceback
+        bestindex = trellis[-1][2].argmax()
+        for t in reversed(range(len(unit_items))):
+            indices, backpointers, scores = trellis[t]
+            if t == 0:
+                selected = {"candidate": unitcands[t].cands[indices[bestindex]],
+                            "prevcandidate": None,
+                            "total_score": 0.0}
+            else:
+                selected = {"candidate": unitcands[t].cands[indices[bestindex]],
+                            "prevcandidate": backpointers[bestindex],
+                            "total_score": scores[bestindex]}
+                bestindex = backpointers[bestindex]
+            unit_items[t]["selected_unit"] = selected
+        return utt
+
+    def _selectunits_reference(self, utt, args):
         """ Does a Viterbi search given the target Utterance and
             unitcatalogue, using the joinscore and targetscore
             functions defined... Update: joinscore calculation
@@ -133,8 +462,9 @@ class Synthesizer(ttslab.synthesizer.Synthesizer):
 
         unit_rel = utt.get_relation("Unit")
 
-        prunescoredelta = 0.01
-        prunenumcands = 100
+        parms = self._searchparms(args) #beam only
+        prunescoredelta = parms["prunescoredelta"]
+        prunenumcands = parms["prunenumcands"]
         trellis = []
         unit_item = unit_rel.head_item
         #t = 0:
@@ -229,35 +559,16 @@ class Synthesizer(ttslab.synthesizer.Synthesizer):
         """ Concatenates units and produces waveform via residual
             excited LPC synthesis filter...
         """
-        
-        unit_rel = utt.get_relation("Unit")
-        #concat:
-        unit_item = unit_rel.head_item
-        lpctrack = copy.deepcopy(unit_item["selected_unit"]["candidate"]["lpc-coefs"])
-        residuals = window_residual(unit_item["selected_unit"]["candidate"]["lpc-coefs"],
-                                    unit_item["selected_unit"]["candidate"]["residuals"])
-        unit_item = unit_item.next_item
-        while unit_item is not None:
-            temptrack = unit_item["selected_unit"]["candidate"]["lpc-coefs"]
-            #append lpccoefs to lpctrack:
-            lpctrack.times = np.concatenate((lpctrack.times, (temptrack.times + lpctrack.times[-1])))
-            lpctrack.values = np.concatenate((lpctrack.values, temptrack.values))
-            #append windowed residuals:
-            residuals.extend(window_residual(temptrack,
-                                             unit_item["selected_unit"]["candidate"]["residuals"]))
-            unit_item = unit_item.next_item
-        
-        #overlap add residual:
-        lastsample = int(round(lpctrack.times[-1] * SAMPLERATE)) + int(round(len(residuals[-1]) / 2))
-        residual = np.zeros(lastsample + 1)
-
-        for i, time in enumerate(lpctrack.times):
-            centersample = int(round(time * SAMPLERATE))
-            firstsample = centersample - int(len(residuals[i]) / 2)
-            residual[firstsample:firstsample+len(residuals[i])] += np.array(residuals[i])
-
+        cands = [unit_item["selected_unit"]["candidate"] for unit_item in utt.get_relation("Unit")]
+        if not self.VECTORIZED:
+            times, values, residual = concat_units_reference(cands)
+        elif self.residualframes is not None:
+            self.residualframes.bind(self.unitcatalogue)
+            times, values, residual = concat_units(cands, self.residualframes)
+        else:
+            times, values, residual = concat_units(cands)
         #synth filter:
-        samples = synth_filter(lpctrack.times, lpctrack.values, residual.astype(np.float), SAMPLERATE)
+        samples = self._synth_filter()(times, values, residual.astype(np.float), SAMPLERATE)
 
         #save in utterance:
         w = Waveform()
@@ -357,6 +668,21 @@ class Synthesizer(ttslab.synthesizer.Synthesizer):
             score += 1.0
         return score / 6.0
 
+    def _targetscores(self, targetunit, unitcands):
+        """ _targetscore of all candidates (UnitCandidates)...
+        """
+        tsylls = targetunit["num_syls"]
+        csylls = unitcands.numfeats["num_syls"]
+        if tsylls is None:
+            scores = np.ones(len(unitcands))
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = np.where(csylls >= tsylls, tsylls / csylls, csylls / tsylls)
+            scores[np.isnan(csylls)] = 1.0
+        for i, featname in enumerate(self.TARGET_FEATURES):
+            scores += unitcands.feats[:,i] == self._featcode(i, targetunit[featname])
+        return scores / 6.0
+
     # def _joinscore(self, unit1, unit2):
     #     """ Calculates a value representing a level of match between
     #         two consecutive candidate units based on acoustic
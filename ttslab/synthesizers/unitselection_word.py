@@ -7,9 +7,13 @@ from __future__ import unicode_literals, division, print_function #Py2
 __author__ = "Daniel van Niekerk"
 __email__ = "dvn.demitasse@gmail.com"
 
+import numpy as np
+
 import ttslab.synthesizers.unitselection
 
 class Synthesizer(ttslab.synthesizers.unitselection.Synthesizer):        
+    TARGET_FEATURES = ["context_prevword", "context_nextword"]
+    NUMERIC_TARGET_FEATURES = []
 
     def feats(self, voice, utt, processname):
         """ Create target units for synthesis.. (words)
@@ -26,6 +30,12 @@ class Synthesizer(ttslab.synthesizers.unitselection.Synthesizer):
             unit_item["context_nextword"] = context_nextword
         return utt
 
+    def _unit_pairs(self):
+        """ Any two words can be adjacent...
+        """
+        names = sorted(self.unitcatalogue)
+        return [(prevname, name) for prevname in names for name in names]
+
     #################### Lower lower level methods...
         
     def _targetscore(self, targetunit, candidateunit):
@@ -39,3 +49,11 @@ class Synthesizer(ttslab.synthesizers.unitselection.Synthesizer):
         if targetunit["context_nextword"] == candidateunit["context_nextword"]:
             score += 0.5
         return score
+
+    def _targetscores(self, targetunit, unitcands):
+        """ _targetscore of all candidates (UnitCandidates)...
+        """
+        scores = np.zeros(len(unitcands))
+        for i, featname in enumerate(self.TARGET_FEATURES):
+            scores += 0.5 * (unitcands.feats[:,i] == self._featcode(i, targetunit[featname]))
+        return scores
@@ -19,6 +19,7 @@ import types
 
 import hrg
 import uttprocessor
+import voicecontainer
 
 class Voice(object):
     """ Abstract voice class
@@ -57,10 +58,17 @@ class Voice(object):
            seemlessly as if methods of the voice, we do this on the
            fly to preserve the original type of the attribute
            (assuming this is necessary for pickling correctly)
+
+           Sections of voices loaded from containers are loaded on
+           first access (see ttslab.voicecontainer)...
         """
-        if issubclass(type(object.__getattribute__(self, name)), uttprocessor.UttProcessor):
-            return types.MethodType(object.__getattribute__(self, name), self)
-        return object.__getattribute__(self, name)
+        attr = object.__getattribute__(self, name)
+        if type(attr) is voicecontainer.LazySection:
+            attr = attr.load()
+            object.__setattr__(self, name, attr)
+        if issubclass(type(attr), uttprocessor.UttProcessor):
+            return types.MethodType(attr, self)
+        return attr
 
     def _create_utterance(self):
         """Create Utterance with info about this voice...
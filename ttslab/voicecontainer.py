@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Voice container: a directory with a manifest, a small pickle of
+   the voice itself ("root") and a file (see ttslab.serialization) for
+   each resource ("section"): UttProcessor attributes (e.g.
+   "synthesizer"), other resource attributes (RESOURCE_TYPES, e.g.
+   Morphparse instances, and RESOURCE_ATTRIBUTES, e.g. "morphparser")
+   and the entries of voice.pronun (e.g. "pronun/englishZA/pronundict").
+
+   Sections are loaded on first access, except those matching the
+   "preload" patterns given to fromcontainer. Rarely used resources
+   (e.g. a code-switching lexicon) are therefore only loaded when
+   needed.
+
+   A voice pickle can be converted with:
+
+       python -m ttslab.voicecontainer voice.pickle voice.d
+
+   and is loaded with ttslab.fromfile("voice.d").
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import os
+import json
+import codecs
+import fnmatch
+import threading
+try:
+    import cPickle as pickle #Py2
+except ImportError:
+    import pickle
+
+import ttslab
+import ttslab.serialization
+from ttslab.uttprocessor import UttProcessor
+from ttslab.morphparser import Morphparse
+
+CONTAINER_FORMAT = "ttslab-voice-container"
+CONTAINER_VERSION = 1
+MANIFEST_FN = "manifest.json"
+ROOT_FN = "voice.pickle"
+SECTIONS_DIR = "sections"
+DEFAULT_PRELOAD = ["synthesizer", "pronun/main/*"]
+RESOURCE_TYPES = (UttProcessor, Morphparse)
+RESOURCE_ATTRIBUTES = ["morphparser"]
+
+def _identity(obj):
+    return obj
+
+
+class Container(object):
+    """Loads (once) and keeps sections of a container directory...
+    """
+    def __init__(self, dirname):
+        self.dirname = os.path.abspath(dirname)
+        with codecs.open(os.path.join(self.dirname, MANIFEST_FN), encoding="utf-8") as infh:
+            self.manifest = json.load(infh)
+        if self.manifest.get("format") != CONTAINER_FORMAT or self.manifest.get("version") != CONTAINER_VERSION:
+            raise ValueError("Not a voice container (version %s): %s" % (CONTAINER_VERSION, self.dirname))
+        self.sections = {}
+        self._lock = threading.Lock()
+
+    def load(self, name):
+        section = self.sections.get(name)
+        if section is None:
+            with self._lock:
+                section = self.sections.get(name)
+                if section is None:
+                    with ttslab.loading_from(self.dirname): #relative paths are relative to the container
+                        section = ttslab.fromfile(os.path.join(self.dirname, self.manifest["sections"][name]["file"]))
+                    self.sections[name] = section
+        return section
+
+    def load_root(self):
+        with open(os.path.join(self.dirname, self.manifest["root"]), "rb") as infh:
+            unpickler = pickle.Unpickler(infh)
+            unpickler.persistent_load = lambda name: LazySection(self, name)
+            return unpickler.load()
+
+
+class LazySection(object):
+    """Placeholder for a section that has not been loaded. Pickling
+       it pickles the loaded section (e.g. with ttslab.tofile)...
+    """
+    __slots__ = ["container", "name"]
+
+    def __init__(self, container, name):
+        self.container = container
+        self.name = name
+
+    def load(self):
+        return self.container.load(self.name)
+
+    def __reduce__(self):
+        return (_identity, (self.load(),))
+
+    def __repr__(self):
+        return "<LazySection %s in %s>" % (self.name, self.container.dirname)
+
+
+class LazyDict(dict):
+    """Dict in which LazySection values are loaded (and replaced) when
+       accessed...
+    """
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if type(value) is LazySection:
+            value = value.load()
+            dict.__setitem__(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def itervalues(self):
+        for key in self:
+            yield self[key]
+
+    def iteritems(self):
+        for key in self:
+            yield key, self[key]
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def copy(self):
+        return LazyDict(dict.items(self))
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        return dict.pop(self, key, *default)
+
+    def is_loaded(self, key):
+        return type(dict.__getitem__(self, key)) is not LazySection
+
+
+def _sections(voice):
+    """Section name for each resource object of voice...
+    """
+    sections = []
+    state = voice.__dict__
+    for name in sorted(state):
+        if name == "pronun":
+            for lang in sorted(state[name]):
+                for key in sorted(state[name][lang]):
+                    if state[name][lang][key] is not None:
+                        sections.append(("/".join([name, lang, key]), state[name][lang][key]))
+        elif isinstance(state[name], RESOURCE_TYPES) or (name in RESOURCE_ATTRIBUTES and state[name] is not None):
+            sections.append((name, state[name]))
+    return sections
+
+def tocontainer(voice, dirname):
+    """Write voice as a container directory (see module doc)...
+    """
+    if not os.path.isdir(os.path.join(dirname, SECTIONS_DIR)):
+        os.makedirs(os.path.join(dirname, SECTIONS_DIR))
+    persistent_ids = {} #id(obj) -> section name
+    manifest = {"format": CONTAINER_FORMAT,
+                "version": CONTAINER_VERSION,
+                "root": ROOT_FN,
+                "sections": {}}
+    sections = _sections(voice)
+    for name, obj in sections:
+        if id(obj) in persistent_ids: #shared by several entries
+            continue
+        persistent_ids[id(obj)] = name
+        fn = os.path.join(SECTIONS_DIR, name.replace("/", "__") + ".pickle")
+        ttslab.serialization.dump(obj, os.path.join(dirname, fn)) #arrays are memory-mapped when loaded
+        manifest["sections"][name] = {"file": fn,
+                                      "class": "%s.%s" % (type(obj).__module__, type(obj).__name__),
+                                      "bytes": os.path.getsize(os.path.join(dirname, fn))}
+    #root: shallow copy of voice with LazyDicts for pronun resources
+    root = object.__new__(type(voice))
+    root.__dict__.update(voice.__dict__)
+    if "pronun" in root.__dict__:
+        root.__dict__["pronun"] = dict((lang, LazyDict(resources)) for lang, resources in voice.pronun.items())
+    with open(os.path.join(dirname, ROOT_FN), "wb") as outfh:
+        pickler = pickle.Pickler(outfh, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = lambda obj: persistent_ids.get(id(obj))
+        pickler.dump(root)
+    with codecs.open(os.path.join(dirname, MANIFEST_FN), "w", encoding="utf-8") as outfh:
+        outfh.write(json.dumps(manifest, indent=2, sort_keys=True))
+
+def iscontainer(dirname):
+    return os.path.isfile(os.path.join(dirname, MANIFEST_FN))
+
+def fromcontainer(dirname, preload=DEFAULT_PRELOAD):
+    """Load voice from container directory, sections with names
+       matching a pattern in "preload" are loaded immediately, the
+       rest on first access...
+    """
+    container = Container(dirname)
+    voice = container.load_root()
+    for name in sorted(container.manifest["sections"]):
+        if any(fnmatch.fnmatch(name, pattern) for pattern in preload):
+            path = name.split("/")
+            obj = getattr(voice, path[0])
+            for key in path[1:]:
+                obj = obj[key]
+    return voice
+
+
+if __name__ == "__main__":
+    import sys, argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('voicefn', metavar='VOICEFN', type=str, help="voice file")
+    parser.add_argument('containerdir', metavar='CONTAINERDIR', type=str, help="output container directory")
+    args = parser.parse_args()
+
+    tocontainer(ttslab.fromfile(args.voicefn), args.containerdir)
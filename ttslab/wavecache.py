@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""Content-addressed on-disk store of synthesized waveforms: the key is
+   a hash of the voice identity, the HTS label list (utt["hts_label"])
+   and synthesis parameters, each entry is a file holding the samples
+   and segment times. Least recently used entries (by file
+   modification time, updated on each hit) are removed when the total
+   size exceeds "maxbytes" (down to EVICT_LOWWATER of it). The
+   directory is only scanned when this process's estimate of the total
+   size exceeds "maxbytes" or after it has written 1/EVICT_INTERVAL of
+   "maxbytes" since the last scan (other processes may be writing).
+
+   Several processes may share a cache directory: entries are written
+   to temporary files and renamed into place (readers never see
+   partial files) and evictions are serialized with a lock file (a
+   process skips eviction while another is evicting).
+
+   The voice identity is a hash of the synthesizer's content: arrays
+   are hashed, not pickled, and file-backed parts (join caches,
+   residual frames and columnar unit catalogues, see
+   ttslab.synthesizers) by the content hash in the file header (or
+   path, size and modification time), so that rebuilding such a file
+   changes the identity.
+
+   Enable for a DefaultVoice instance with:
+
+       voice.wavecache = WaveformCache("/var/cache/ttslab", maxbytes=2**30)
+"""
+from __future__ import unicode_literals, division, print_function #Py2
+
+__author__ = "Daniel van Niekerk"
+__email__ = "dvn.demitasse@gmail.com"
+
+import os
+import errno
+import fcntl
+import hashlib
+import binascii
+import tempfile
+import weakref
+import threading
+try:
+    import cPickle as pickle #Py2
+except ImportError:
+    import pickle
+
+import numpy as np
+
+import ttslab.serialization as serialization
+from ttslab.waveform import Waveform
+from ttslab.frontendcache import synthparms_key
+
+ENTRY_EXT = ".wavc"
+LOCK_FN = "lock"
+EVICT_LOWWATER = 0.9
+EVICT_INTERVAL = 16
+
+def file_identity(fn):
+    """Content hash from the header of a file in ttslab.serialization
+       format, else its path, size and modification time...
+    """
+    with open(fn, "rb") as infh:
+        header = serialization.read_header(infh)
+    if header is not None:
+        return ("sha1", binascii.hexlify(header["sha1"]).decode("ascii"))
+    st = os.stat(fn)
+    return ("file", os.path.abspath(fn), st.st_size, st.st_mtime)
+
+
+class _Fingerprinter(object):
+    """File-like object hashing what is written to it, with the
+       persistent ids used to pickle the synthesizer: arrays are hashed
+       directly and file-backed objects (with a "load" method and an
+       existing file "fn") are identified by file_identity...
+    """
+    def __init__(self):
+        self.h = hashlib.sha1()
+
+    def write(self, data):
+        self.h.update(data)
+
+    def persistent_id(self, obj):
+        if type(obj) is np.ndarray and not obj.dtype.hasobject:
+            self.h.update(np.ascontiguousarray(obj).data)
+            return ("array", obj.dtype.str, obj.shape)
+        if not hasattr(type(obj), "load"):
+            return None
+        fn = getattr(obj, "__dict__", {}).get("fn")
+        if isinstance(fn, basestring) and os.path.isfile(fn): #Py2
+            return ("file",) + file_identity(fn)
+        return None
+
+
+def voice_fingerprint(voice):
+    """Hash of the voice type and the content of the synthesizer, the
+       same for copies of a voice loaded in different processes...
+    """
+    fingerprinter = _Fingerprinter()
+    fingerprinter.write(repr(type(voice)).encode("utf-8"))
+    pickler = pickle.Pickler(fingerprinter, 2)
+    try:
+        pickler.inst_persistent_id = fingerprinter.persistent_id #Py2: cPickle skips builtin types
+    except AttributeError:
+        pickler.persistent_id = fingerprinter.persistent_id
+    #Voice.__getattribute__ binds UttProcessors, we want the instance:
+    pickler.dump(object.__getattribute__(voice, "synthesizer"))
+    return fingerprinter.h.hexdigest()
+
+
+class WaveformCache(object):
+    """File-backed LRU store of waveforms and segment times...
+    """
+    def __init__(self, cachedir, maxbytes=2**30, voiceid=None):
+        """If "voiceid" is not given, it is determined with
+           voice_fingerprint (once per voice instance)...
+        """
+        self.cachedir = cachedir
+        self.maxbytes = maxbytes
+        self.voiceid = voiceid
+        self._init_cache()
+
+    def _init_cache(self):
+        if not os.path.isdir(self.cachedir):
+            try:
+                os.makedirs(self.cachedir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        self._voiceids = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._nbytes = None #total size at last scan
+        self._written = 0   #bytes written since last scan
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+        return {"cachedir": self.cachedir, "maxbytes": self.maxbytes, "voiceid": self.voiceid}
+
+    def __setstate__(self, state):
+        self.cachedir = state["cachedir"]
+        self.maxbytes = state["maxbytes"]
+        self.voiceid = state["voiceid"]
+        self._init_cache()
+
+    def voice_id(self, voice):
+        if self.voiceid is not None:
+            return self.voiceid
+        with self._lock:
+            voiceid = self._voiceids.get(voice)
+            if voiceid is None:
+                voiceid = voice_fingerprint(voice)
+                self._voiceids[voice] = voiceid
+        return voiceid
+
+    def key(self, voice, htslabel, synthparms=None):
+        h = hashlib.sha1()
+        h.update(self.voice_id(voice).encode("utf-8"))
+        h.update(b"\0")
+        h.update("\n".join(htslabel).encode("utf-8"))
+        h.update(b"\0")
+        h.update(repr(synthparms_key(synthparms)).encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cachedir, key + ENTRY_EXT)
+
+    def get(self, key):
+        """Returns the stored entry (dict with "samples", "samplerate",
+           "channels" and "segtimes") or None...
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as infh:
+                entry = pickle.load(infh)
+            os.utime(path, None) #mark as recently used
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        fd, tmppath = tempfile.mkstemp(suffix=".tmp", dir=self.cachedir)
+        try:
+            with os.fdopen(fd, "wb") as outfh:
+                pickle.dump(entry, outfh, protocol=2)
+                size = outfh.tell()
+            os.rename(tmppath, self._path(key))
+        except:
+            if os.path.exists(tmppath):
+                os.remove(tmppath)
+            raise
+        with self._lock:
+            self._written += size
+            due = (self._nbytes is None or self._nbytes + self._written > self.maxbytes or
+                   self._written * EVICT_INTERVAL > self.maxbytes)
+        if due:
+            self.evict(blocking=False)
+
+    def _entries(self):
+        """List of (mtime, size, path) of all entries...
+        """
+        entries = []
+        for fn in os.listdir(self.cachedir):
+            if not fn.endswith(ENTRY_EXT):
+                continue
+            path = os.path.join(self.cachedir, fn)
+            try:
+                st = os.stat(path)
+            except OSError: #removed by another process
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self, blocking=True):
+        """If the total size exceeds maxbytes, remove least recently
+           used entries until it is within EVICT_LOWWATER of maxbytes.
+           If not "blocking", returns without eviction if another
+           process is evicting...
+        """
+        with open(os.path.join(self.cachedir, LOCK_FN), "a") as lockfh:
+            try:
+                fcntl.flock(lockfh, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as e:
+                if e.errno in (errno.EAGAIN, errno.EACCES):
+                    return
+                raise
+            try:
+                with self._lock:
+                    written = self._written
+                entries = self._entries()
+                nbytes = sum(e[1] for e in entries)
+                entries.sort()
+                target = self.maxbytes * EVICT_LOWWATER if nbytes > self.maxbytes else self.maxbytes
+                for mtime, size, path in entries:
+                    if nbytes <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    nbytes -= size
+                    with self._lock:
+                        self.evictions += 1
+                with self._lock:
+                    self._nbytes = nbytes
+                    self._written -= written
+            finally:
+                fcntl.flock(lockfh, fcntl.LOCK_UN)
+
+    def clear(self):
+        for mtime, size, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._nbytes = None
+            self._written = 0
+
+    def stats(self):
+        entries = self._entries()
+        return {"size": len(entries),
+                "nbytes": sum(e[1] for e in entries),
+                "maxbytes": self.maxbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions}
+
+    #### Used by Voice.process:
+    def restore(self, voice, utt, synthparms=None):
+        """Set utt["waveform"] and Segment times from the store if
+           available, returns True on success...
+        """
+        if "hts_label" not in utt:
+            return False
+        entry = self.get(self.key(voice, utt["hts_label"], synthparms))
+        if entry is None:
+            return False
+        seg_rel = utt.get_relation("Segment")
+        if len(seg_rel) != len(entry["segtimes"]):
+            return False
+        waveform = Waveform()
+        waveform.samples = entry["samples"]
+        waveform.samplerate = entry["samplerate"]
+        waveform.channels = entry["channels"]
+        utt["waveform"] = waveform
+        for seg, segtimes in zip(seg_rel, entry["segtimes"]):
+            if segtimes is not None:
+                seg["start"], seg["end"] = segtimes
+        return True
+
+    def store(self, voice, utt, synthparms=None):
+        if "hts_label" not in utt or "waveform" not in utt:
+            return
+        segtimes = []
+        for seg in utt.get_relation("Segment"):
+            if "start" in seg and "end" in seg:
+                segtimes.append((seg["start"], seg["end"]))
+            else:
+                segtimes.append(None)
+        waveform = utt["waveform"]
+        self.put(self.key(voice, utt["hts_label"], synthparms),
+                 {"samples": waveform.samples,
+                  "samplerate": waveform.samplerate,
+                  "channels": waveform.channels,
+                  "segtimes": segtimes})